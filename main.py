@@ -82,6 +82,36 @@ async def run_both():
         raise
 
 
+async def run_worker():
+    """Запуск воркера фоновых оценок (можно запускать несколько экземпляров)"""
+    import signal
+    from src.container import get_ai_provider, get_answer_app_service, get_job_repo
+    from src.evaluation_jobs import EvaluationWorker, TelegramJobNotifier
+
+    await database.connect()
+    await database.create_tables()
+    notifier = TelegramJobNotifier() if settings.telegram_bot_token else None
+    worker = EvaluationWorker(get_job_repo(), get_answer_app_service(), notifier)
+
+    # SIGTERM/SIGINT: перестаём брать задания и дожидаемся текущих
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:  # Windows
+            pass
+
+    try:
+        await worker.run(stop)
+    finally:
+        if notifier:
+            await notifier.close()
+        await get_ai_provider().close()
+        await database.disconnect()
+        logger.info(f"Воркер остановлен: {worker.stats()}")
+
+
 def main():
     """Главная функция"""
     import argparse
@@ -89,9 +119,9 @@ def main():
     parser = argparse.ArgumentParser(description="Interview Helper Bot")
     parser.add_argument(
         "--mode",
-        choices=["bot", "api", "both"],
+        choices=["bot", "api", "both", "worker"],
         default="both",
-        help="Режим запуска: bot (только бот), api (только API), both (оба)"
+        help="Режим запуска: bot (только бот), api (только API), both (оба), worker (воркер очереди оценок)"
     )
     
     args = parser.parse_args()
@@ -101,6 +131,8 @@ def main():
             run_bot_sync()
         elif args.mode == "api":
             asyncio.run(run_api())
+        elif args.mode == "worker":
+            asyncio.run(run_worker())
         else:  # both
             asyncio.run(run_both())
             
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""Перенос старых ответов в помесячный сжатый архив и удаление просроченных месяцев.
+
+Запускайте по расписанию (например, раз в сутки из cron). Повторный запуск безопасен.
+
+    scripts/archive_answers.py
+    scripts/archive_answers.py --month 2026-01
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import sys
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src.answer_archive import answer_archive, zstandard
+from src.database import database
+
+
+async def main(args: argparse.Namespace) -> None:
+    await database.connect()
+    try:
+        await database.create_tables()
+        if args.month:
+            results = [await answer_archive.archive_month(datetime.strptime(args.month, "%Y-%m").date())]
+        else:
+            results = await answer_archive.archive_due()
+        dropped = [] if args.no_retention else await answer_archive.drop_expired()
+    finally:
+        await database.disconnect()
+
+    codec = "zstd" if zstandard is not None else "zlib"
+    for r in results:
+        print(f"{r.month:%Y-%m}: {r.moved} answers archived, {r.raw_bytes} -> {r.archived_bytes} bytes ({codec}, x{r.ratio:.1f})")
+    if not results:
+        print(f"Nothing to archive before {answer_archive.hot_start():%Y-%m}")
+    for month in dropped:
+        print(f"{month:%Y-%m}: dropped (retention)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive old answers by month and apply retention")
+    parser.add_argument("--month", help="archive only this month (YYYY-MM)")
+    parser.add_argument("--no-retention", action="store_true", help="do not drop expired archive months")
+    asyncio.run(main(parser.parse_args()))
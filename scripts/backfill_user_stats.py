@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""Пересборка user_stats_rollup из уже оценённых ответов.
+
+Нужна один раз после появления таблицы (ответы, записанные раньше, в ней не учтены)
+и после ручных правок answers. Повторный запуск безопасен.
+
+    scripts/backfill_user_stats.py --batch-size 1000
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src.database import database
+
+
+async def main(args: argparse.Namespace) -> None:
+    await database.connect()
+    try:
+        await database.create_tables()
+        started = time.monotonic()
+        rows = await database.rebuild_user_stats(batch_size=args.batch_size)
+    finally:
+        await database.disconnect()
+    print(f"Rebuilt {rows} user_stats_rollup rows in {time.monotonic() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild user_stats_rollup from answers")
+    parser.add_argument("--batch-size", type=int, default=1000, help="users per transaction")
+    asyncio.run(main(parser.parse_args()))
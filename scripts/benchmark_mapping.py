@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""Микробенчмарк чтения вопросов и пользователей: ORM → model_validate → entity против Row → from_db.
+
+Поднимает временную SQLite, заполняет её и для каждого варианта меряет время на запрос
+и пик памяти за запрос (tracemalloc, отдельным проходом). Сценарии: пользователь и вопрос
+(нажатие кнопки в боте на промахе кэша) и страница из 100 вопросов (поиск в админке,
+get_many_by_ids). Отдельно — преобразование одной уже прочитанной строки, без БД.
+
+    python scripts/benchmark_mapping.py
+    python scripts/benchmark_mapping.py --iterations 5000 --rows 1000
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from sqlalchemy import insert, select  # noqa: E402
+
+from src.config import settings  # noqa: E402
+from src.database import _USER_COLUMNS, Question as QuestionORM, User as UserORM, database  # noqa: E402
+from src.domain.entities import dto_to_question_entity, dto_to_user_entity  # noqa: E402
+from src.infrastructure.repositories import _QUESTION_COLUMNS  # noqa: E402
+from src.models import Question, User, from_db  # noqa: E402
+
+PAGE = 100
+
+
+async def seed(rows: int) -> None:
+    async with database.get_session() as session:
+        await session.execute(insert(UserORM), [
+            {"telegram_id": i, "username": f"user{i}", "level": "middle", "category": "databases", "score": i}
+            for i in range(1, rows + 1)
+        ])
+        await session.execute(insert(QuestionORM), [
+            {
+                "title": f"Вопрос {i}", "content": "Чем B-tree отличается от hash-индекса? " * 5,
+                "level": "middle", "category": "databases", "question_type": "text", "points": 10,
+                "correct_answer": "B-tree поддерживает диапазоны и сортировку. " * 5,
+                "hints": ["диапазоны", "сортировка"], "tags": ["индексы", "postgres"],
+            }
+            for i in range(1, rows + 1)
+        ])
+        await session.commit()
+
+
+async def orm_validate(row_id: int) -> None:
+    """Прежний путь: ORM-объекты, валидация DTO и entity, которая тут же отбрасывается"""
+    async with database.get_session() as session:
+        orm_user = (await session.scalars(select(UserORM).where(UserORM.telegram_id == row_id))).first()
+        orm_question = await session.get(QuestionORM, row_id)
+    user, question = User.model_validate(orm_user), Question.model_validate(orm_question)
+    _ = dto_to_user_entity(user)
+    _ = dto_to_question_entity(question)
+
+
+async def row_from_db(row_id: int) -> None:
+    """Новый путь: строки из столбцов DTO и DTO без валидации"""
+    async with database.get_session() as session:
+        user_row = (await session.execute(select(*_USER_COLUMNS).where(UserORM.telegram_id == row_id))).first()
+        question_row = (await session.execute(select(*_QUESTION_COLUMNS).where(QuestionORM.id == row_id))).first()
+    from_db(User, user_row), from_db(Question, question_row)
+
+
+async def orm_validate_page(first_id: int) -> None:
+    async with database.get_session() as session:
+        orm_questions = (await session.scalars(select(QuestionORM).where(QuestionORM.id >= first_id).limit(PAGE))).all()
+    [Question.model_validate(q) for q in orm_questions]
+
+
+async def row_from_db_page(first_id: int) -> None:
+    async with database.get_session() as session:
+        rows = (await session.execute(select(*_QUESTION_COLUMNS).where(QuestionORM.id >= first_id).limit(PAGE))).all()
+    [from_db(Question, row) for row in rows]
+
+
+SCENARIOS = {
+    "user + question": (orm_validate, row_from_db),
+    f"page of {PAGE} questions": (orm_validate_page, row_from_db_page),
+}
+
+
+def mapping_only(orm_question: Any, row: Any) -> Dict[str, Callable[[], Any]]:
+    """Только преобразование уже прочитанной строки, без запроса к БД"""
+    return {
+        "model_validate(orm)": lambda: Question.model_validate(orm_question),
+        "model_construct(row)": lambda: Question.model_construct(**row._mapping),
+        "from_db(row)": lambda: from_db(Question, row),
+    }
+
+
+async def measure(fn: Callable[[int], Awaitable[None]], ids: List[int], iterations: int) -> Dict[str, float]:
+    for i in ids[:50]:
+        await fn(i)  # прогрев
+    started = time.perf_counter()
+    for n in range(iterations):
+        await fn(ids[n % len(ids)])
+    elapsed = time.perf_counter() - started
+
+    # пик памяти сверх уже занятой за время одного запроса — временные объекты запроса
+    sample, peaks = min(iterations, 500), 0
+    tracemalloc.start()
+    for n in range(sample):
+        current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        await fn(ids[n % len(ids)])
+        peaks += tracemalloc.get_traced_memory()[1] - current
+    tracemalloc.stop()
+    return {"us": elapsed / iterations * 1e6, "peak_kib": peaks / sample / 1024}
+
+
+def measure_sync(fn: Callable[[], Any], iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+async def main(args: argparse.Namespace) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        settings.database_url = f"sqlite+aiosqlite:///{Path(tmp) / 'bench.db'}"
+        await database.connect()
+        try:
+            await database.create_tables()
+            await seed(args.rows)
+            ids = list(range(1, args.rows + 1))
+            random.Random(0).shuffle(ids)
+
+            results = {}
+            for scenario, variants in SCENARIOS.items():
+                iterations = args.iterations if scenario == "user + question" else max(args.iterations // 20, 10)
+                results[scenario] = [await measure(fn, ids, iterations) for fn in variants]
+
+            async with database.get_session() as session:
+                orm_question = await session.get(QuestionORM, ids[0])
+                row = (await session.execute(select(*_QUESTION_COLUMNS).where(QuestionORM.id == ids[0]))).first()
+        finally:
+            await database.disconnect()
+
+    for scenario, (old, new) in results.items():
+        print(f"Per request, {scenario} (SQLite):")
+        print(f"  {'orm + model_validate':<22} {old['us']:9.1f} us   {old['peak_kib']:7.1f} KiB peak")
+        print(f"  {'row + from_db':<22} {new['us']:9.1f} us   {new['peak_kib']:7.1f} KiB peak")
+        print(f"  time x{old['us'] / new['us']:.2f}, peak memory x{old['peak_kib'] / new['peak_kib']:.2f}")
+
+    print(f"Mapping one question ({args.iterations * 10} iterations, no DB):")
+    for name, fn in mapping_only(orm_question, row).items():
+        print(f"  {name:<22} {measure_sync(fn, args.iterations * 10):8.2f} us")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark ORM/DTO mapping on the read path")
+    parser.add_argument("--iterations", type=int, default=2000, help="requests per variant")
+    parser.add_argument("--rows", type=int, default=500, help="users and questions to seed")
+    asyncio.run(main(parser.parse_args()))
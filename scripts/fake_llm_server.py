@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""Локальный OpenAI/GigaChat-совместимый стенд для нагрузочного тестирования.
+
+Отвечает на chat/completions (в т.ч. stream=true), OAuth GigaChat, транскрипцию
+Whisper и скачивание голосовых Telegram. Латентность, доля 5xx и 429 настраиваются;
+ответы можно воспроизводить из кассеты (JSONL):
+
+    {"match": "B-tree", "content": "{\"score\": 8, ...}", "latency": 1.2}
+
+``match`` — подстрока ответа кандидата (необязательна), ``latency`` — переопределение
+задержки в секундах (необязательно). Без кассеты оценка детерминированно
+генерируется из текста ответа.
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import hashlib
+import itertools
+import json
+import math
+import random
+import re
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+_MAX_SCORE_RE = re.compile(r"Максимальный балл:\s*(\d+)")
+
+
+class LatencyModel:
+    """Распределение задержки ответа: fixed, uniform, exp или lognormal (параметры в секундах)"""
+
+    def __init__(self, dist: str = "lognormal", mean: float = 1.0, sigma: float = 0.5,
+                 low: float = 0.0, high: float = 2.0, rng: Optional[random.Random] = None) -> None:
+        self.dist = dist
+        self.mean = mean
+        self.sigma = sigma
+        self.low = low
+        self.high = high
+        self.rng = rng or random.Random()
+
+    def sample(self) -> float:
+        if self.dist == "fixed":
+            return self.mean
+        if self.dist == "uniform":
+            return self.rng.uniform(self.low, self.high)
+        if self.dist == "exp":
+            return self.rng.expovariate(1.0 / self.mean) if self.mean > 0 else 0.0
+        # lognormal с заданным средним: mu = ln(mean) - sigma^2 / 2
+        if self.mean <= 0:
+            return 0.0
+        mu = math.log(self.mean) - self.sigma ** 2 / 2
+        return self.rng.lognormvariate(mu, self.sigma)
+
+
+class Cassette:
+    """Записанные ответы модели; выбор по подстроке ответа, иначе по кругу"""
+
+    def __init__(self, entries: List[Dict[str, Any]]) -> None:
+        self.entries = entries
+        self._cycle = itertools.cycle(entries) if entries else None
+
+    @classmethod
+    def load(cls, path: str) -> "Cassette":
+        entries = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    entries.append(json.loads(line))
+        return cls(entries)
+
+    def pick(self, answer: str) -> Optional[Dict[str, Any]]:
+        for entry in self.entries:
+            if entry.get("match") and entry["match"] in answer:
+                return entry
+        return next(self._cycle) if self._cycle else None
+
+
+class FakeLLMServer:
+    def __init__(self, latency: LatencyModel, error_rate: float = 0.0, rate_limit_rate: float = 0.0,
+                 retry_after: float = 1.0, chunk_delay: float = 0.02, cassette: Optional[Cassette] = None,
+                 voice_file: Optional[str] = None, transcript: str = "Индекс ускоряет поиск по таблице",
+                 seed: Optional[int] = None) -> None:
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.chunk_delay = chunk_delay
+        self.cassette = cassette
+        self.voice_bytes = Path(voice_file).read_bytes() if voice_file else b"OggS"
+        self.transcript = transcript
+        self.rng = random.Random(seed)
+        self.counters: Counter = Counter()
+
+    def build_app(self) -> web.Application:
+        app = web.Application()
+        for prefix in ("", "/v1", "/api/v1"):
+            app.router.add_post(f"{prefix}/chat/completions", self.chat_completions)
+        app.router.add_post("/v1/audio/transcriptions", self.transcriptions)
+        app.router.add_post("/audio/transcriptions", self.transcriptions)
+        app.router.add_post("/api/v2/oauth", self.oauth)
+        app.router.add_post("/oauth", self.oauth)
+        app.router.add_get("/bot{token}/getFile", self.telegram_get_file)
+        app.router.add_get("/file/bot{token}/{path:.+}", self.telegram_file)
+        app.router.add_get("/stats", self.stats)
+        return app
+
+    async def _fault(self) -> Optional[web.Response]:
+        """Инъекция сбоев: 429 с Retry-After или 503"""
+        roll = self.rng.random()
+        if roll < self.rate_limit_rate:
+            self.counters["429"] += 1
+            return web.json_response(
+                {"error": {"message": "Rate limit exceeded", "type": "rate_limit_error"}},
+                status=429,
+                headers={"Retry-After": str(self.retry_after)},
+            )
+        if roll < self.rate_limit_rate + self.error_rate:
+            self.counters["5xx"] += 1
+            await asyncio.sleep(self.latency.sample() / 2)
+            return web.json_response({"error": {"message": "Service unavailable", "type": "server_error"}}, status=503)
+        return None
+
+    async def chat_completions(self, request: web.Request) -> web.StreamResponse:
+        self.counters["chat"] += 1
+        fault = await self._fault()
+        if fault is not None:
+            return fault
+        body = await request.json()
+        messages = body.get("messages") or []
+        system = next((m["content"] for m in messages if m.get("role") == "system"), "")
+        answer = messages[-1]["content"] if messages else ""
+
+        entry = self.cassette.pick(answer) if self.cassette else None
+        content = entry["content"] if entry else self._generate(system, answer)
+        latency = float(entry["latency"]) if entry and "latency" in entry else self.latency.sample()
+        prompt_tokens = sum(len(m.get("content", "")) for m in messages) // 3
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(content) // 3,
+            "total_tokens": prompt_tokens + len(content) // 3,
+            "prompt_tokens_details": {"cached_tokens": 0},
+        }
+        model = body.get("model", "fake")
+
+        if not body.get("stream"):
+            await asyncio.sleep(latency)
+            return web.json_response({
+                "id": f"chatcmpl-{self.counters['chat']}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+
+        self.counters["stream"] += 1
+        # до первого чанка — время "обдумывания", дальше токены идут равномерно
+        await asyncio.sleep(latency)
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        pieces = [content[i:i + 12] for i in range(0, len(content), 12)]
+        for piece in pieces:
+            chunk = {
+                "id": "chatcmpl-stream",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+            }
+            await response.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            await asyncio.sleep(self.chunk_delay)
+        final = {"id": "chatcmpl-stream", "object": "chat.completion.chunk", "created": int(time.time()),
+                 "model": model, "choices": [], "usage": usage}
+        await response.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+        await response.write_eof()
+        return response
+
+    @staticmethod
+    def _generate(system: str, answer: str) -> str:
+        m = _MAX_SCORE_RE.search(system)
+        max_score = int(m.group(1)) if m else 10
+        digest = int(hashlib.sha1(answer.encode("utf-8")).hexdigest(), 16)
+        score = digest % (max_score + 1)
+        return json.dumps({
+            "score": score,
+            "feedback": f"Автоматическая оценка стенда: {score}/{max_score}. " + "Разберите тему подробнее. " * 5,
+            "is_correct": score * 2 >= max_score,
+            "strengths": ["структура ответа"],
+            "improvements": ["примеры из практики"],
+        }, ensure_ascii=False)
+
+    async def transcriptions(self, request: web.Request) -> web.Response:
+        self.counters["transcriptions"] += 1
+        fault = await self._fault()
+        if fault is not None:
+            return fault
+        await request.read()
+        await asyncio.sleep(self.latency.sample())
+        return web.json_response({"text": self.transcript})
+
+    async def oauth(self, request: web.Request) -> web.Response:
+        self.counters["oauth"] += 1
+        return web.json_response({"access_token": "fake-token", "expires_in": 1800})
+
+    async def telegram_get_file(self, request: web.Request) -> web.Response:
+        file_id = request.query.get("file_id", "voice")
+        return web.json_response({"ok": True, "result": {"file_id": file_id, "file_path": f"voice/{file_id}.oga"}})
+
+    async def telegram_file(self, request: web.Request) -> web.Response:
+        return web.Response(body=self.voice_bytes, content_type="audio/ogg")
+
+    async def stats(self, request: web.Request) -> web.Response:
+        return web.json_response(dict(self.counters))
+
+
+def add_server_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--latency-dist", choices=["fixed", "uniform", "exp", "lognormal"], default="lognormal")
+    parser.add_argument("--latency-mean", type=float, default=1.0, help="Средняя задержка, сек")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="Sigma для lognormal")
+    parser.add_argument("--latency-low", type=float, default=0.2, help="Нижняя граница для uniform")
+    parser.add_argument("--latency-high", type=float, default=2.0, help="Верхняя граница для uniform")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Доля ответов 503")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Доля ответов 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After для 429, сек")
+    parser.add_argument("--chunk-delay", type=float, default=0.02, help="Пауза между чанками стрима, сек")
+    parser.add_argument("--cassette", help="JSONL с записанными ответами модели")
+    parser.add_argument("--voice-file", help="OGG-файл, отдаваемый как голосовое сообщение Telegram")
+    parser.add_argument("--seed", type=int, help="Seed генератора случайных чисел")
+
+
+def server_from_args(args: argparse.Namespace) -> FakeLLMServer:
+    latency = LatencyModel(args.latency_dist, args.latency_mean, args.latency_sigma,
+                           args.latency_low, args.latency_high, random.Random(args.seed))
+    return FakeLLMServer(
+        latency,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+        chunk_delay=args.chunk_delay,
+        cassette=Cassette.load(args.cassette) if args.cassette else None,
+        voice_file=args.voice_file,
+        seed=args.seed,
+    )
+
+
+async def start_server(server: FakeLLMServer, host: str, port: int) -> web.AppRunner:
+    runner = web.AppRunner(server.build_app())
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fake OpenAI/GigaChat server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    add_server_arguments(parser)
+    args = parser.parse_args()
+    server = server_from_args(args)
+    print(f"Fake LLM server on http://{args.host}:{args.port}")
+    print(f"  OPENAI_BASE_URL=http://{args.host}:{args.port}/v1")
+    print(f"  GIGACHAT_API_URL=http://{args.host}:{args.port}/api/v1")
+    print(f"  GIGACHAT_AUTH_URL=http://{args.host}:{args.port}/api/v2/oauth")
+    print(f"  TELEGRAM_API_URL=http://{args.host}:{args.port}")
+    web.run_app(server.build_app(), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
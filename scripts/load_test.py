@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""Нагрузочный прогон конвейера ответов против локального стенда LLM.
+
+По умолчанию поднимает scripts/fake_llm_server.py в том же процессе, направляет на
+него OpenAI/GigaChat/Telegram, запускает FastAPI-приложение in-process (httpx ASGI)
+на временной SQLite и гоняет /answers/text, /answers/text/stream и /answers/voice.
+Итог (p50/p95/p99, пропускная способность, доля ошибок) пишется в JSON-baseline;
+с ``--compare`` прогон сравнивается с прошлым baseline и падает при регрессии.
+
+    python scripts/load_test.py --requests 500 --concurrency 32 --out baseline.json
+    python scripts/load_test.py --requests 500 --concurrency 32 --compare baseline.json
+
+Для голосовых ответов нужен ffmpeg и реальный OGG (``--voice-file``).
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from fake_llm_server import add_server_arguments, server_from_args, start_server  # noqa: E402
+
+ANSWERS = [
+    "Индекс — это структура данных, ускоряющая поиск строк по значению столбца.",
+    "B-tree хранит ключи в отсортированном виде, поиск идёт за логарифмическое время.",
+    "CAP-теорема: при сетевом разделе приходится выбирать между согласованностью и доступностью.",
+    "Транзакции обеспечивают атомарность, согласованность, изоляцию и долговечность изменений.",
+]
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * q
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    unknown = set(mix) - {"text", "stream", "voice"}
+    if unknown:
+        raise SystemExit(f"unknown endpoints in --mix: {', '.join(sorted(unknown))}")
+    return mix
+
+
+def configure_env(args: argparse.Namespace, llm_url: str, db_path: str) -> None:
+    """Настройки приложения задаются до импорта src (Settings читаются при импорте)"""
+    os.environ.update({
+        "AI_PROVIDER": args.provider,
+        "OPENAI_API_KEY": "fake-key",
+        "OPENAI_BASE_URL": f"{llm_url}/v1",
+        "GIGACHAT_CLIENT_ID": "fake",
+        "GIGACHAT_CLIENT_SECRET": "fake",
+        "GIGACHAT_API_URL": f"{llm_url}/api/v1",
+        "GIGACHAT_AUTH_URL": f"{llm_url}/api/v2/oauth",
+        "TELEGRAM_API_URL": llm_url,
+        "TELEGRAM_BOT_TOKEN": "fake",
+        "DAILY_LIMIT_PER_USER": str(10 ** 9),
+        "EVAL_CACHE_ENABLED": "true" if args.cache else "false",
+        "DATABASE_URL": args.database_url or f"sqlite+aiosqlite:///{db_path}",
+    })
+
+
+async def setup_fixtures(users: int, questions: int) -> Dict[str, List[int]]:
+    """Вопросы и пользователи создаются через сервисы приложения, как в seed_questions.py"""
+    from src.container import (
+        get_answer_app_service,
+        get_interview_app_service,
+        get_question_app_service,
+        get_user_app_service,
+    )
+    from src.domain.entities import QuestionEntity
+
+    # контейнер на lru_cache: прогреваем заранее, иначе первые параллельные запросы
+    # из пула потоков FastAPI создадут несколько экземпляров сервисов
+    get_interview_app_service()
+    get_answer_app_service()
+
+    qs = get_question_app_service()
+    question_ids = []
+    for i in range(questions):
+        q = QuestionEntity(
+            id=0,
+            title=f"Вопрос нагрузочного теста {i}",
+            content="Объясните, как работает индекс в реляционной БД.",
+            level="middle",
+            category="databases",
+            question_type="text",
+            points=10,
+            correct_answer="Индекс — отдельная структура (обычно B-tree) для быстрого поиска.",
+            explanation="Индекс ускоряет чтение ценой более медленной записи.",
+            hints=None,
+            tags=None,
+        )
+        q.validate()
+        created = await qs.create(q)
+        question_ids.append(created.id)
+
+    us = get_user_app_service()
+    user_ids = []
+    for i in range(users):
+        telegram_id = 900_000_000 + i
+        await us.get_or_create(telegram_id, f"load{i}", None, None)
+        user_ids.append(telegram_id)
+    return {"users": user_ids, "questions": question_ids}
+
+
+async def one_request(client, kind: str, user_id: int, question_id: int, rng: random.Random) -> int:
+    params = {"user_id": user_id, "question_id": question_id}
+    if kind == "voice":
+        r = await client.post("/answers/voice", params=params, json=f"load-voice-{rng.randrange(10 ** 6):06d}")
+        return r.status_code
+    answer = rng.choice(ANSWERS) + f" (вариант {rng.randrange(10 ** 6)})"
+    if kind == "stream":
+        async with client.stream("POST", "/answers/text/stream", params=params, json=answer) as r:
+            async for _ in r.aiter_raw():
+                pass
+            return r.status_code
+    r = await client.post("/answers/text", params=params, json=answer)
+    return r.status_code
+
+
+async def drive(client, fixtures: Dict[str, List[int]], args: argparse.Namespace) -> Dict[str, Any]:
+    mix = parse_mix(args.mix)
+    kinds, weights = list(mix), list(mix.values())
+    rng = random.Random(args.seed)
+    latencies: Dict[str, List[float]] = {k: [] for k in kinds}
+    statuses: Counter = Counter()
+    errors: Counter = Counter()
+    counter = iter(range(args.requests))
+    deadline = time.monotonic() + args.duration if args.duration else None
+
+    async def worker() -> None:
+        for _ in counter:
+            if deadline and time.monotonic() > deadline:
+                return
+            kind = rng.choices(kinds, weights)[0]
+            started = time.monotonic()
+            try:
+                status = await one_request(
+                    client, kind, rng.choice(fixtures["users"]), rng.choice(fixtures["questions"]), rng
+                )
+            except Exception as e:
+                status = 0
+                errors[f"{type(e).__name__}: {e}"[:120]] += 1
+            latencies[kind].append(time.monotonic() - started)
+            statuses[str(status)] += 1
+
+    started = time.monotonic()
+    await asyncio.gather(*[worker() for _ in range(args.concurrency)])
+    elapsed = time.monotonic() - started
+
+    total = sum(statuses.values())
+    failed = sum(n for code, n in statuses.items() if not code.startswith("2"))
+    all_latencies = [v for values in latencies.values() for v in values]
+    return {
+        "requests": total,
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 2) if elapsed else 0.0,
+        "error_rate": round(failed / total, 4) if total else 0.0,
+        "status_codes": dict(statuses),
+        "exceptions": dict(errors),
+        "latency": summarize(all_latencies),
+        "by_endpoint": {kind: summarize(values) for kind, values in latencies.items() if values},
+    }
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    return {
+        "count": len(values),
+        "p50": round(percentile(values, 0.50), 4),
+        "p95": round(percentile(values, 0.95), 4),
+        "p99": round(percentile(values, 0.99), 4),
+        "max": round(max(values), 4) if values else 0.0,
+    }
+
+
+def compare(result: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Регрессии: рост p95/p99 или доли ошибок, падение пропускной способности"""
+    problems = []
+    for q in ("p95", "p99"):
+        old, new = baseline["latency"][q], result["latency"][q]
+        if old and new > old * (1 + tolerance):
+            problems.append(f"latency {q}: {old:.3f}s -> {new:.3f}s")
+    old_rps, new_rps = baseline["throughput_rps"], result["throughput_rps"]
+    if old_rps and new_rps < old_rps * (1 - tolerance):
+        problems.append(f"throughput: {old_rps} -> {new_rps} rps")
+    if result["error_rate"] > baseline["error_rate"] + 0.01:
+        problems.append(f"error rate: {baseline['error_rate']} -> {result['error_rate']}")
+    return problems
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    runner = None
+    llm_url = args.llm_url
+    if not llm_url:
+        runner = await start_server(server_from_args(args), "127.0.0.1", args.fake_port)
+        llm_url = f"http://127.0.0.1:{args.fake_port}"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        configure_env(args, llm_url, os.path.join(tmp, "load.db"))
+        import httpx
+        from src.api import app
+        from src.container import get_ai_provider
+        from src.llm_limiter import llm_limiter
+        from src.evaluation_prompt import prompt_usage
+
+        try:
+            async with app.router.lifespan_context(app):
+                transport = httpx.ASGITransport(app=app)
+                async with httpx.AsyncClient(transport=transport, base_url="http://app", timeout=args.timeout) as client:
+                    fixtures = await setup_fixtures(args.users, args.questions)
+                    result = await drive(client, fixtures, args)
+                await get_ai_provider().close()
+        finally:
+            if runner is not None:
+                await runner.cleanup()
+
+    result["config"] = {
+        "provider": args.provider,
+        "concurrency": args.concurrency,
+        "mix": args.mix,
+        "cache": args.cache,
+        "fake_latency": None if args.llm_url else {
+            "dist": args.latency_dist, "mean": args.latency_mean, "sigma": args.latency_sigma,
+            "error_rate": args.error_rate, "rate_limit_rate": args.rate_limit_rate,
+        },
+    }
+    result["llm_limiter"] = llm_limiter.stats()
+    result["prompt_usage"] = {k: v for k, v in prompt_usage.stats().items()}
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load test for the answer pipeline")
+    parser.add_argument("--requests", type=int, default=200, help="Общее число запросов")
+    parser.add_argument("--duration", type=float, default=0.0, help="Ограничение по времени, сек (0 — без ограничения)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--questions", type=int, default=20)
+    parser.add_argument("--mix", default="text=1", help="Доли эндпоинтов, напр. text=0.7,stream=0.2,voice=0.1")
+    parser.add_argument("--provider", choices=["openai", "gigachat"], default="openai")
+    parser.add_argument("--cache", action="store_true", help="Не отключать кэш оценок")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--database-url", help="БД приложения (по умолчанию временная SQLite)")
+    parser.add_argument("--llm-url", help="Уже запущенный стенд LLM вместо встроенного")
+    parser.add_argument("--fake-port", type=int, default=8089)
+    parser.add_argument("--out", default="load_baseline.json", help="Куда записать результат")
+    parser.add_argument("--compare", help="Baseline для сравнения; при регрессии код выхода 1")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Допустимое ухудшение (доля)")
+    add_server_arguments(parser)
+    args = parser.parse_args()
+    if args.seed is None:
+        args.seed = 42
+
+    result = asyncio.run(run(args))
+    Path(args.out).write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+    lat = result["latency"]
+    print(
+        f"{result['requests']} requests in {result['elapsed_seconds']}s: "
+        f"{result['throughput_rps']} rps, p50={lat['p50']}s p95={lat['p95']}s p99={lat['p99']}s, "
+        f"errors={result['error_rate']:.2%} -> {args.out}"
+    )
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        problems = compare(result, baseline, args.tolerance)
+        for problem in problems:
+            print(f"REGRESSION {problem}")
+        if problems:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,51 +1,63 @@
 #!/usr/bin/env python3
+"""Импорт банка вопросов: YAML, JSON Lines или CSV.
+
+Файл читается потоково, вопросы пишутся пакетами (INSERT ... ON CONFLICT по content_hash),
+поэтому повторный запуск на том же файле не создаёт дубликатов.
+
+    scripts/seed_questions.py questions.example.yaml
+    scripts/seed_questions.py bank.jsonl --batch-size 1000
+"""
 from __future__ import annotations
+import argparse
 import asyncio
 import sys
 from pathlib import Path
-import yaml
 
 sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
 
 from src.container import get_question_app_service
-from src.domain.entities import QuestionEntity
 from src.database import database
+from src.question_import import DEFAULT_BATCH_SIZE, FORMATS, ImportStats, import_questions, iter_records
+
 
+def report_progress(stats: ImportStats) -> None:
+    print(f"  {stats.summary()}", file=sys.stderr, flush=True)
 
-async def main(yaml_path: str):
+
+async def main(args: argparse.Namespace) -> int:
     await database.connect()
-    await database.create_tables()
-
-    with open(yaml_path, "r", encoding="utf-8") as f:
-        data = yaml.safe_load(f)
-
-    qs = get_question_app_service()
-
-    count = 0
-    for item in data:
-        q = QuestionEntity(
-            id=0,
-            title=item["title"],
-            content=item["content"],
-            level=item["level"],
-            category=item["category"],
-            question_type=item.get("question_type", "text"),
-            points=int(item.get("points", 10)),
-            correct_answer=item["correct_answer"],
-            explanation=item.get("explanation"),
-            hints=item.get("hints"),
-            tags=item.get("tags"),
+    try:
+        await database.create_tables()
+        qs = get_question_app_service()
+        # вопросы, созданные до появления content_hash, получают его до импорта — иначе задублируются
+        filled = await qs.fill_content_hashes()
+        if filled:
+            print(f"Filled content_hash for {filled} existing questions", file=sys.stderr)
+
+        records = iter_records(args.path, args.format)
+        stats = await import_questions(
+            records, qs, batch_size=args.batch_size, on_batch=None if args.quiet else report_progress,
         )
-        q.validate()
-        await qs.create(q)
-        count += 1
+    finally:
+        await database.disconnect()
+
+    for error in stats.errors:
+        print(f"invalid {error}", file=sys.stderr)
+    print(f"Imported {args.path}: {stats.summary()}")
+    return 1 if stats.invalid else 0
+
 
-    print(f"Imported {count} questions from {yaml_path}")
-    await database.disconnect()
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Bulk idempotent import of interview questions")
+    parser.add_argument("path", help="questions file (.yaml/.yml, .jsonl/.ndjson, .csv)")
+    parser.add_argument("--format", choices=FORMATS, help="input format (by default — from the file extension)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="rows per INSERT and per transaction")
+    parser.add_argument("--quiet", action="store_true", help="no per-batch progress")
+    args = parser.parse_args()
+    if args.batch_size < 1:
+        parser.error("--batch-size must be positive")
+    return args
 
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: scripts/seed_questions.py path/to/questions.yaml")
-        sys.exit(1)
-    asyncio.run(main(sys.argv[1]))
+    sys.exit(asyncio.run(main(parse_args())))
@@ -0,0 +1,257 @@
+from __future__ import annotations
+import json
+import logging
+import re
+import zlib
+from dataclasses import dataclass
+from datetime import date, datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import Column, DateTime, Integer, LargeBinary, MetaData, String, Table, delete, func, insert, inspect, select, text
+
+from .config import settings
+from .database import Answer, database
+
+logger = logging.getLogger(__name__)
+
+try:
+    import zstandard
+except ImportError:  # необязательная зависимость: pip install '.[archive]'
+    zstandard = None
+
+ARCHIVE_TABLE = "answers_archive"
+_MONTH_TABLE_RE = re.compile(rf"^{ARCHIVE_TABLE}_(\d{{4}})_(\d{{2}})$")
+
+# Первый байт сжатого payload — кодек: архив читается при любой установке
+_ZSTD, _ZLIB = b"Z", b"D"
+_ZSTD_LEVEL = 10
+
+
+def compress_payload(answer_text: str, feedback: Optional[str]) -> bytes:
+    """Крупные текстовые поля ответа одним сжатым блоком (zstd, без него — zlib)"""
+    raw = json.dumps({"answer_text": answer_text, "feedback": feedback}, ensure_ascii=False).encode("utf-8")
+    if zstandard is not None:
+        return _ZSTD + zstandard.ZstdCompressor(level=_ZSTD_LEVEL).compress(raw)
+    return _ZLIB + zlib.compress(raw, 9)
+
+
+def decompress_payload(payload: bytes) -> Dict[str, Any]:
+    codec, body = payload[:1], payload[1:]
+    if codec == _ZSTD:
+        if zstandard is None:
+            raise RuntimeError("Archive is zstd-compressed, install zstandard to read it")
+        raw = zstandard.ZstdDecompressor().decompress(body)
+    elif codec == _ZLIB:
+        raw = zlib.decompress(body)
+    else:
+        raise ValueError(f"Unknown archive codec {codec!r}")
+    return json.loads(raw)
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def add_months(month: date, n: int) -> date:
+    index = month.year * 12 + month.month - 1 + n
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_bounds(month: date) -> Tuple[datetime, datetime]:
+    start = datetime(month.year, month.month, 1, tzinfo=timezone.utc)
+    end_month = add_months(month, 1)
+    return start, datetime(end_month.year, end_month.month, 1, tzinfo=timezone.utc)
+
+
+def month_table_name(month: date) -> str:
+    return f"{ARCHIVE_TABLE}_{month.year:04d}_{month.month:02d}"
+
+
+_metadata = MetaData()
+
+
+def month_table(month: date) -> Table:
+    """Таблица месяца: в Postgres — секция answers_archive, в SQLite — отдельная таблица"""
+    name = month_table_name(month)
+    if name in _metadata.tables:
+        return _metadata.tables[name]
+    return Table(
+        name, _metadata,
+        Column("id", Integer, primary_key=True),  # id исходного ответа
+        Column("user_id", Integer, nullable=False, index=True),
+        Column("question_id", Integer, nullable=False),
+        Column("answer_type", String(20), nullable=False),
+        Column("score", Integer, nullable=True),
+        Column("voice_file_id", String(255), nullable=True),
+        Column("created_at", DateTime(timezone=True), nullable=False),
+        Column("payload", LargeBinary, nullable=False),  # answer_text и feedback, сжатые
+    )
+
+
+_PG_PARENT_DDL = (
+    f"""CREATE TABLE IF NOT EXISTS {ARCHIVE_TABLE} (
+        id integer NOT NULL,
+        user_id integer NOT NULL,
+        question_id integer NOT NULL,
+        answer_type varchar(20) NOT NULL,
+        score integer,
+        voice_file_id varchar(255),
+        created_at timestamptz NOT NULL,
+        payload bytea NOT NULL,
+        PRIMARY KEY (id, created_at)
+    ) PARTITION BY RANGE (created_at)""",
+    f"CREATE INDEX IF NOT EXISTS ix_{ARCHIVE_TABLE}_user_id ON {ARCHIVE_TABLE} (user_id)",
+)
+
+
+@dataclass
+class ArchiveResult:
+    month: date
+    moved: int = 0
+    raw_bytes: int = 0
+    archived_bytes: int = 0
+
+    @property
+    def ratio(self) -> float:
+        return self.raw_bytes / self.archived_bytes if self.archived_bytes else 0.0
+
+
+class AnswerArchive:
+    """Помесячный архив ответов.
+
+    В ``answers`` остаются последние ``answer_hot_months`` месяцев — горячая часть,
+    которую читают и пишут бот и API. Более старые месяцы переносятся в таблицы
+    ``answers_archive_ГГГГ_ММ`` (в Postgres — секции answers_archive, PARTITION BY RANGE),
+    где answer_text и feedback хранятся одним сжатым блоком. Месяцы старше
+    ``answer_archive_retention_months`` удаляются целиком (DROP секции); итоги по ним
+    остаются в user_stats_rollup.
+    """
+
+    def hot_start(self, today: Optional[date] = None) -> date:
+        """Первый день самого старого месяца, который остаётся в answers"""
+        today = today or datetime.now(timezone.utc).date()
+        return add_months(month_start(today), -(max(settings.answer_hot_months, 1) - 1))
+
+    async def months(self) -> List[date]:
+        """Месяцы, уже лежащие в архиве"""
+        async with database.engine.connect() as conn:
+            names = await conn.run_sync(lambda sync_conn: inspect(sync_conn).get_table_names())
+        months = []
+        for name in names:
+            match = _MONTH_TABLE_RE.match(name)
+            if match:
+                months.append(date(int(match.group(1)), int(match.group(2)), 1))
+        return sorted(months)
+
+    async def archived_until(self) -> Optional[date]:
+        """Первый день после последнего архивного месяца: раньше него answers уже не полны"""
+        months = await self.months()
+        return add_months(months[-1], 1) if months else None
+
+    async def _ensure_month_table(self, month: date) -> Table:
+        table = month_table(month)
+        async with database.engine.begin() as conn:
+            if database.engine.dialect.name == "postgresql":
+                for ddl in _PG_PARENT_DDL:
+                    await conn.execute(text(ddl))
+                start, end = month_bounds(month)
+                await conn.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {table.name} PARTITION OF {ARCHIVE_TABLE} "
+                    f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+                ))
+            else:
+                await conn.run_sync(lambda sync_conn: table.create(sync_conn, checkfirst=True))
+        return table
+
+    async def archive_month(self, month: date, batch_size: Optional[int] = None) -> ArchiveResult:
+        """Перенос ответов месяца в архив порциями; порция — одна транзакция (вставка и удаление)"""
+        batch_size = batch_size or settings.answer_archive_batch_size
+        month = month_start(month)
+        if month >= self.hot_start():
+            raise ValueError(f"{month:%Y-%m} is still hot, keep it in answers")
+        start, end = month_bounds(month)
+        result = ArchiveResult(month)
+        async with database.get_session() as session:
+            if await session.scalar(select(Answer.id).where(Answer.created_at >= start, Answer.created_at < end).limit(1)) is None:
+                return result  # пустой месяц — без таблицы
+        table = await self._ensure_month_table(month)
+        while True:
+            async with database.get_session() as session:
+                answers = (await session.scalars(
+                    select(Answer)
+                    .where(Answer.created_at >= start, Answer.created_at < end)
+                    .order_by(Answer.id)
+                    .limit(batch_size)
+                )).all()
+                if not answers:
+                    break
+                rows = []
+                for a in answers:
+                    payload = compress_payload(a.answer_text, a.feedback)
+                    result.raw_bytes += len(a.answer_text.encode("utf-8")) + len((a.feedback or "").encode("utf-8"))
+                    result.archived_bytes += len(payload)
+                    rows.append({
+                        "id": a.id, "user_id": a.user_id, "question_id": a.question_id,
+                        "answer_type": a.answer_type, "score": a.score, "voice_file_id": a.voice_file_id,
+                        "created_at": a.created_at, "payload": payload,
+                    })
+                await session.execute(insert(table), rows)
+                await session.execute(delete(Answer).where(Answer.id.in_([a.id for a in answers])))
+                await session.commit()
+                result.moved += len(rows)
+        logger.info(f"Archived {result.moved} answers of {month:%Y-%m} (x{result.ratio:.1f})")
+        return result
+
+    async def archive_due(self) -> List[ArchiveResult]:
+        """Архивирует все месяцы старше горячей части, в которых ещё есть ответы"""
+        hot_start = self.hot_start()
+        async with database.get_session() as session:
+            oldest = await session.scalar(
+                select(func.min(Answer.created_at)).where(Answer.created_at < month_bounds(hot_start)[0])
+            )
+        results = []
+        if oldest is None:
+            return results
+        month = month_start(oldest.date() if isinstance(oldest, datetime) else oldest)
+        while month < hot_start:
+            result = await self.archive_month(month)
+            if result.moved:
+                results.append(result)
+            month = add_months(month, 1)
+        return results
+
+    async def drop_expired(self) -> List[date]:
+        """Удаляет архивные месяцы старше срока хранения; 0 — хранить всегда"""
+        retention = settings.answer_archive_retention_months
+        if retention <= 0:
+            return []
+        cutoff = add_months(self.hot_start(), -retention)
+        expired = [m for m in await self.months() if m < cutoff]
+        async with database.engine.begin() as conn:
+            for month in expired:
+                await conn.execute(text(f"DROP TABLE IF EXISTS {month_table_name(month)}"))
+        for month in expired:
+            _metadata.remove(month_table(month))
+        if expired:
+            logger.info(f"Dropped archived answers for {', '.join(f'{m:%Y-%m}' for m in expired)}")
+        return expired
+
+    async def read(self, month: date, user_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Ответы архивного месяца с распакованными answer_text и feedback"""
+        month = month_start(month)
+        if month not in await self.months():
+            return []
+        table = month_table(month)
+        stmt = select(table).order_by(table.c.id)
+        if user_id is not None:
+            stmt = stmt.where(table.c.user_id == user_id)
+        async with database.get_session() as session:
+            rows = (await session.execute(stmt)).mappings().all()
+        return [
+            {**{k: v for k, v in row.items() if k != "payload"}, **decompress_payload(row["payload"])}
+            for row in rows
+        ]
+
+
+# Архив ответов процесса (scripts/archive_answers.py)
+answer_archive = AnswerArchive()
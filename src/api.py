@@ -1,6 +1,8 @@
-from fastapi import FastAPI, HTTPException, Depends, Body
+from fastapi import FastAPI, HTTPException, Depends, Body, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from contextlib import asynccontextmanager
+import json
 import logging
 
 from .config import settings, AppConstants
@@ -9,8 +11,8 @@ from .database import database
 from .models import (
     User, UserCreate, UserUpdate, UserStats,
     Question, QuestionCreate, QuestionUpdate, QuestionRequest,
-    Answer, AnswerCreate, AnswerEvaluation,
-    TelegramWebhook
+    Answer, AnswerCreate, AnswerEvaluation, AnswerBatchRequest,
+    EvaluationJob, LeaderboardPage, TelegramWebhook
 )
  
 from .container import get_interview_app_service
@@ -20,8 +22,23 @@ from .container import (
     get_question_app_service,
     get_answer_app_service,
     get_tutor_app_service,
+    get_ai_provider,
+    get_evaluation_job_app_service,
+    get_leaderboard_app_service,
+    get_job_repo,
+    get_seen_store,
 )
 from .rate_limit import limiter
+from .pagination import InvalidCursor
+from .evaluation_cache import evaluation_cache
+from .evaluation_prompt import prompt_builder, prompt_usage
+from .llm_limiter import llm_limiter
+from .evaluation_parser import parse_stats
+from .question_pool import question_pool
+from .leaderboard import leaderboard
+from .infrastructure.question_search import question_search
+from .infrastructure.repositories import question_cache
+from .user_sessions import user_sessions
 from .domain.entities import QuestionEntity
 
 # Настройка логирования
@@ -35,6 +52,7 @@ async def lifespan(app: FastAPI):
     # Подключение к базе данных при запуске
     await database.connect()
     await database.create_tables()
+    await question_pool.ensure_loaded()
     logger.info("База данных подключена и таблицы созданы")
     
     yield
@@ -106,6 +124,29 @@ async def get_user_stats(telegram_id: int, users=Depends(get_user_app_service)):
     return stats
 
 
+@app.get("/leaderboard", response_model=LeaderboardPage)
+async def get_leaderboard(
+    category: str | None = None,
+    window: str = "all",
+    limit: int = Query(default=10, ge=1),
+    telegram_id: int | None = None,
+    board=Depends(get_leaderboard_app_service),
+):
+    """Топ игроков (общий или по категории, за всё время или за неделю) и место telegram_id"""
+    try:
+        return await board.top(min(limit, settings.leaderboard_max_limit), category, window, telegram_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.delete("/users/{telegram_id}/seen-questions")
+async def reset_seen_questions(telegram_id: int, category: str | None = None, qs=Depends(get_question_app_service)):
+    """Сброс пройденных вопросов: по категории или по всем (без category)"""
+    if not await qs.reset_seen(telegram_id, category):
+        raise HTTPException(status_code=404, detail="Пользователь не найден")
+    return {"status": "reset", "telegram_id": telegram_id, "category": category}
+
+
 # Эндпоинты для вопросов
 @app.get("/questions/{question_id}", response_model=Question)
 async def get_question(question_id: int, qs=Depends(get_question_app_service)):
@@ -153,7 +194,11 @@ async def admin_create_question(question_data: QuestionCreate, x_admin_token: st
         hints=question_data.hints,
         tags=question_data.tags
     )
-    created = await qs.create(question)
+    try:
+        created = await qs.create(question)
+    except ValueError as e:
+        # такой вопрос уже есть (совпадает content_hash)
+        raise HTTPException(status_code=409, detail=str(e))
     return created
 
 
@@ -162,7 +207,10 @@ async def admin_update_question(question_id: int, question_data: QuestionUpdate,
     if not _get_admin_token() or x_admin_token != _get_admin_token():
         raise HTTPException(status_code=401, detail="unauthorized")
     # Простая реализация: создаём как новый объект c тем же id (для MVP)
-    updated = await qs.update(question_id, question_data.model_dump(exclude_unset=True))
+    try:
+        updated = await qs.update(question_id, question_data.model_dump(exclude_unset=True))
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     return updated
 
 
@@ -176,26 +224,65 @@ async def admin_delete_question(question_id: int, x_admin_token: str | None = He
 
 
 @app.get("/admin/questions")
-async def admin_search_questions(level: str | None = None, category: str | None = None, q: str | None = None, limit: int = 20, offset: int = 0, x_admin_token: str | None = Header(default=None), qs=Depends(get_question_app_service)):
+async def admin_search_questions(level: str | None = None, category: str | None = None, q: str | None = None, limit: int = Query(default=20, ge=1, le=100), cursor: str | None = None, with_total: bool = False, x_admin_token: str | None = Header(default=None), qs=Depends(get_question_app_service)):
     if not _get_admin_token() or x_admin_token != _get_admin_token():
         raise HTTPException(status_code=401, detail="unauthorized")
-    res = await qs.search(level, category, q, limit, offset)
-    # Возвращаем items + total для UI пагинации
-    return res
+    try:
+        # Возвращаем items + next_cursor (и total по запросу) для UI пагинации
+        return await qs.search(level, category, q, limit, cursor, with_total)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/admin/metrics")
+async def admin_metrics(x_admin_token: str | None = Header(default=None)):
+    if not _get_admin_token() or x_admin_token != _get_admin_token():
+        raise HTTPException(status_code=401, detail="unauthorized")
+    return {
+        "evaluation_cache": evaluation_cache.stats(),
+        "prompt_prefix_cache": prompt_builder.stats(),
+        "prompt_usage": prompt_usage.stats(),
+        "llm_limiter": llm_limiter.stats(),
+        "ai_router": get_ai_provider().stats(),
+        "evaluation_parser": parse_stats.stats(),
+        "evaluation_jobs": await get_job_repo().count_by_status(),
+        "question_pool": question_pool.stats(),
+        "question_cache": question_cache.stats(),
+        "user_sessions": user_sessions.stats(),
+        "leaderboard": leaderboard.stats(),
+        "seen_questions": get_seen_store().stats(),
+        "units_of_work": database.uow_stats.snapshot(),
+        "db_pool": database.pool_stats(),
+        "db_replicas": database.replica_stats(),
+        "question_search": question_search.stats(),
+    }
+
+
+def _job_accepted(job: EvaluationJob) -> JSONResponse:
+    """202 Accepted: оценку выполнит воркер, статус — GET /jobs/{id}"""
+    return JSONResponse(
+        status_code=202,
+        content={"job_id": job.id, "status": job.status, "status_url": f"/jobs/{job.id}"},
+        headers={"Location": f"/jobs/{job.id}"},
+    )
 
 
 # Эндпоинты для ответов
-@app.post("/answers/text", response_model=AnswerEvaluation)
+@app.post("/answers/text", response_model=AnswerEvaluation, responses={202: {"description": "Оценка поставлена в очередь"}})
 async def submit_text_answer(
     user_id: int,
     question_id: int,
     answer_text: str = Body(..., min_length=3),
+    background: bool = False,
     app_service=Depends(get_interview_app_service),
+    jobs=Depends(get_evaluation_job_app_service),
 ):
-    """Отправка текстового ответа"""
+    """Отправка текстового ответа; с background=true — постановка оценки в очередь"""
     try:
         if not limiter.allow(user_id):
             raise HTTPException(status_code=429, detail="Daily limit exceeded")
+        if background:
+            return _job_accepted(await jobs.submit_text(user_id, question_id, answer_text))
         answer, evaluation = await app_service.answer_text(user_id, question_id, answer_text)
         return {"answer_id": answer.id, **evaluation}
     except ValueError as e:
@@ -208,17 +295,90 @@ async def submit_text_answer(
         raise HTTPException(status_code=500, detail="Внутренняя ошибка сервера")
 
 
-@app.post("/answers/voice", response_model=AnswerEvaluation)
+def _sse(event: dict) -> str:
+    return f"event: {event.get('type', 'message')}\ndata: {json.dumps(event, ensure_ascii=False, default=str)}\n\n"
+
+
+@app.post("/answers/text/stream")
+async def submit_text_answer_stream(
+    user_id: int,
+    question_id: int,
+    answer_text: str = Body(..., min_length=3),
+    app_answers=Depends(get_answer_app_service),
+):
+    """Потоковая оценка текстового ответа (Server-Sent Events)"""
+    if not limiter.allow(user_id):
+        raise HTTPException(status_code=429, detail="Daily limit exceeded")
+    events = app_answers.answer_text_stream(user_id, question_id, answer_text)
+    # Первое событие читаем до начала ответа, чтобы ошибки валидации вернулись как 4xx
+    try:
+        first = await events.__anext__()
+    except StopAsyncIteration:
+        raise HTTPException(status_code=500, detail="Внутренняя ошибка сервера")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Ошибка при потоковой оценке ответа: {e}")
+        raise HTTPException(status_code=500, detail="Внутренняя ошибка сервера")
+
+    async def stream():
+        yield _sse(first)
+        try:
+            async for event in events:
+                yield _sse(event)
+        except Exception as e:
+            logger.error(f"Ошибка при потоковой оценке ответа: {e}")
+            yield _sse({"type": "error", "detail": "Внутренняя ошибка сервера"})
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/answers/batch")
+async def submit_answers_batch(
+    request: AnswerBatchRequest,
+    app_answers=Depends(get_answer_app_service),
+):
+    """Пакетная оценка текстовых ответов; результаты стримятся в NDJSON по мере готовности"""
+    if len(request.items) > settings.batch_max_items:
+        raise HTTPException(status_code=413, detail=f"Too many items (max {settings.batch_max_items})")
+
+    # Дневной лимит списывается за каждый элемент, у которого нашлись пользователь и вопрос
+    items = [(item.user_id, item.question_id, item.answer_text) for item in request.items]
+
+    async def stream():
+        try:
+            async for row in app_answers.answer_batch(items, settings.batch_eval_concurrency, limiter.allow):
+                yield json.dumps(row, ensure_ascii=False, default=str) + "\n"
+        except Exception as e:
+            logger.error(f"Ошибка при пакетной оценке ответов: {e}")
+            yield json.dumps({"error": "Внутренняя ошибка сервера"}, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@app.post("/answers/voice", response_model=AnswerEvaluation, responses={202: {"description": "Оценка поставлена в очередь"}})
 async def submit_voice_answer(
     user_id: int,
     question_id: int,
     voice_file_id: str = Body(..., min_length=10),
+    background: bool = False,
     app_answers=Depends(get_answer_app_service),
+    jobs=Depends(get_evaluation_job_app_service),
 ):
-    """Отправка голосового ответа"""
+    """Отправка голосового ответа; с background=true — постановка оценки в очередь"""
     try:
         if not limiter.allow(user_id):
             raise HTTPException(status_code=429, detail="Daily limit exceeded")
+        if background:
+            try:
+                job = await jobs.submit_voice(user_id, question_id, voice_file_id)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            return _job_accepted(job)
         answer, evaluation = await app_answers.answer_voice(
             user_id, question_id, voice_file_id, settings.telegram_bot_token
         )
@@ -231,6 +391,15 @@ async def submit_voice_answer(
         raise HTTPException(status_code=500, detail="Внутренняя ошибка сервера")
 
 
+@app.get("/jobs/{job_id}", response_model=EvaluationJob, response_model_exclude={"payload", "notify"})
+async def get_job(job_id: int, jobs=Depends(get_evaluation_job_app_service)):
+    """Статус фоновой оценки; в статусе done поле result содержит AnswerEvaluation"""
+    job = await jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Задание не найдено")
+    return job
+
+
 # Эндпоинт для Telegram webhook
 @app.post("/webhook/telegram")
 async def telegram_webhook(webhook_data: TelegramWebhook):
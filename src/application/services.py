@@ -1,58 +1,70 @@
 from __future__ import annotations
 from typing import Optional, Tuple
 
-from ..domain.ports import UserRepository, QuestionRepository, AnswerRepository, AIProvider, DocsProvider
+from ..domain.ports import UserRepository, QuestionRepository, AnswerRepository, AIProvider, DocsProvider, UnitOfWorkFactory, null_unit_of_work
 from ..domain.entities import (
     dto_to_user_entity,
     dto_to_question_entity,
-    dto_to_answer_entity,
 )
 from ..interview_service import InterviewService
+from ..leaderboard import leaderboard
 from ..models import Answer, Question
+from ..seen_questions import SeenQuestionsStore
 
 
 class InterviewAppService:
-    def __init__(self, users: UserRepository, questions: QuestionRepository, answers: AnswerRepository, ai: AIProvider, docs: DocsProvider | None = None) -> None:
+    def __init__(self, users: UserRepository, questions: QuestionRepository, answers: AnswerRepository, ai: AIProvider, docs: DocsProvider | None = None, seen: SeenQuestionsStore | None = None, uow: UnitOfWorkFactory = null_unit_of_work) -> None:
         self.users = users
         self.questions = questions
         self.answers = answers
         self.ai = ai
         self.docs = docs
+        self.seen = seen
+        self.uow = uow
 
     async def next_question(self, telegram_id: int, level: str, category: str) -> Optional[Question]:
+        async with self.uow("interview.next_question"):
+            return await self._next_question(telegram_id, level, category)
+
+    async def _next_question(self, telegram_id: int, level: str, category: str) -> Optional[Question]:
         user_dto = await self.users.get_by_telegram_id(telegram_id)
         if not user_dto:
             raise ValueError("User not found")
-        _user = dto_to_user_entity(user_dto)
+        if self.seen:
+            q_dto, seen_blob = await self.seen.next_unseen(self.questions, telegram_id, level, category)
+            if q_dto:
+                await self.users.update_by_telegram_id(telegram_id, current_question_id=q_dto.id, seen_questions=seen_blob)
+            return q_dto
         q_dto = await self.questions.get_random(level, category, [])
         if q_dto:
             await self.users.update_by_telegram_id(telegram_id, current_question_id=q_dto.id)
         return q_dto
 
     async def answer_text(self, telegram_id: int, question_id: int, text: str) -> Tuple[Answer, dict]:
-        user_dto = await self.users.get_by_telegram_id(telegram_id)
-        if not user_dto:
-            raise ValueError("User not found")
-        q_dto = await self.questions.get_by_id(question_id)
-        if not q_dto:
-            raise ValueError("Question not found")
+        async with self.uow("interview.load"):
+            user_dto = await self.users.get_by_telegram_id(telegram_id)
+            if not user_dto:
+                raise ValueError("User not found")
+            q_dto = await self.questions.get_by_id(question_id)
+            if not q_dto:
+                raise ValueError("Question not found")
         user_ent = dto_to_user_entity(user_dto)
         q_ent = dto_to_question_entity(q_dto)
-        ans_dto = await self.answers.create(user_ent.id, question_id, text, "text")
-        _ans = dto_to_answer_entity(ans_dto)
         notes = await InterviewService.prepare_expert_notes(q_ent.category, user_ent.telegram_id, user_ent.level or "", q_ent.title)
         # Context7 docs: опционально добавим выдержку для backend категорий
         docs_text = ""
-        if self.docs and q.category in {"backend", "databases", "networking", "security"}:
+        if self.docs and q_ent.category in {"backend", "databases", "networking", "security"}:
             # пример маппинга: backend -> /python-telegram-bot/python-telegram-bot или /tiangolo/fastapi
-            lib = "/tiangolo/fastapi" if q.category == "backend" else "/sqlalchemy/sqlalchemy"
-            docs_text = await self.docs.get_docs(library_id=lib, topic=q.title, tokens=1000) or ""
+            lib = "/tiangolo/fastapi" if q_ent.category == "backend" else "/sqlalchemy/sqlalchemy"
+            docs_text = await self.docs.get_docs(library_id=lib, topic=q_ent.title, tokens=1000) or ""
         merged_notes = (notes + "\n\nДокументация:\n" + docs_text) if docs_text else notes
         eval_dict = await self.ai.evaluate(q_dto, text, "text", merged_notes or None)
-        await self.answers.set_score(ans_dto.id, eval_dict["score"], eval_dict["feedback"])
-        await self.users.update_by_telegram_id(
-            telegram_id,
-            score=user_ent.score + eval_dict["score"],
-            questions_answered=user_ent.questions_answered + 1,
-        )
+        # запись только после оценки: соединение не удерживается на время вызова LLM
+        async with self.uow("interview.record"):
+            ans_dto = await self.answers.create(
+                user_ent.id, question_id, text, "text", score=eval_dict["score"], feedback=eval_dict["feedback"]
+            )
+            await self.users.increment_progress(telegram_id, eval_dict["score"])
+            await self.users.add_answer_stats(user_ent.id, q_ent.category, q_ent.level, eval_dict["score"])
+        leaderboard.record(telegram_id, q_ent.category, eval_dict["score"])
         return ans_dto, eval_dict
@@ -1,14 +1,23 @@
 from __future__ import annotations
-from typing import Optional, Tuple
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
 
-from ..domain.ports import UserRepository, QuestionRepository, AnswerRepository, AIProvider, VoiceStorage, CodeExecutor, Orchestrator
-from ..models import User, Question, Answer
+from ..domain.ports import UserRepository, QuestionRepository, AnswerRepository, AIProvider, VoiceStorage, CodeExecutor, Orchestrator, JobRepository, UnitOfWorkFactory, null_unit_of_work
+from ..models import User, Question, QuestionPage, QuestionUpsertResult, Answer, EvaluationJob, LeaderboardEntry, LeaderboardPage, LeaderboardRank
+from ..evaluation_cache import evaluation_cache
+from ..evaluation_prompt import prompt_builder
+from ..services import EVALUATION_ERROR_FEEDBACK
+from ..leaderboard import Leaderboard, leaderboard
+from ..provider_errors import ProviderError
+from ..seen_questions import SeenQuestionsStore
 from ..domain.entities import (
+    QuestionEntity,
     dto_to_user_entity,
-    dto_to_question_entity,
-    dto_to_answer_entity,
 )
 
+logger = logging.getLogger(__name__)
+
 
 class UserAppService:
     def __init__(self, users: UserRepository) -> None:
@@ -18,7 +27,6 @@ class UserAppService:
         user_dto = await self.users.get_by_telegram_id(telegram_id)
         if not user_dto:
             user_dto = await self.users.create(telegram_id, username, first_name, last_name)
-        _ = dto_to_user_entity(user_dto)
         return user_dto
 
     async def update_level(self, telegram_id: int, level: str) -> Optional[User]:
@@ -35,83 +43,180 @@ class UserAppService:
         user_id = getattr(user_dto, 'id', None) or (user_dto.get('id') if isinstance(user_dto, dict) else None)
         if not user_id:
             return {}
-        _ = dto_to_user_entity(user_dto) if user_dto else None
         return await self.users.get_stats(user_id)
 
 
 class QuestionAppService:
-    def __init__(self, users: UserRepository, questions: QuestionRepository) -> None:
+    def __init__(self, users: UserRepository, questions: QuestionRepository, seen: SeenQuestionsStore | None = None, uow: UnitOfWorkFactory = null_unit_of_work) -> None:
         self.users = users
         self.questions = questions
+        self.seen = seen
+        self.uow = uow
 
     async def get(self, question_id: int) -> Optional[Question]:
         q_dto = await self.questions.get_by_id(question_id)
-        _ = dto_to_question_entity(q_dto) if q_dto else None
         return q_dto
 
     async def random_for_user(self, telegram_id: int, level: str, category: str) -> Optional[Question]:
+        async with self.uow("question.random_for_user"):
+            return await self._random_for_user(telegram_id, level, category)
+
+    async def _random_for_user(self, telegram_id: int, level: str, category: str) -> Optional[Question]:
         user_dto = await self.users.get_by_telegram_id(telegram_id)
         if not user_dto:
             return None
-        _ = dto_to_user_entity(user_dto)
+        if self.seen:
+            # пройденные вопросы пропускаются; отметка пишется тем же UPDATE, что и текущий вопрос
+            q_dto, seen_blob = await self.seen.next_unseen(self.questions, telegram_id, level, category)
+            if q_dto:
+                await self.users.update_by_telegram_id(telegram_id, current_question_id=q_dto.id, seen_questions=seen_blob)
+            return q_dto
         q_dto = await self.questions.get_random(level, category, [])
         if q_dto:
             # Защита от случая, когда q_dto может быть int или неполным объектом
             q_id = getattr(q_dto, 'id', None) or (q_dto.get('id') if isinstance(q_dto, dict) else q_dto if isinstance(q_dto, int) else None)
             if q_id:
                 await self.users.update_by_telegram_id(telegram_id, current_question_id=q_id)
-        _ = dto_to_question_entity(q_dto) if q_dto else None
         return q_dto
 
+    async def reset_seen(self, telegram_id: int, category: Optional[str] = None) -> bool:
+        """Сброс пройденных вопросов по категории (None — по всем); False — нет пользователя"""
+        if not self.seen:
+            return False
+        async with self.uow("question.reset_seen"):
+            if not await self.users.get_by_telegram_id(telegram_id):
+                return False
+            seen_blob = await self.seen.reset(telegram_id, category)
+            await self.users.update_by_telegram_id(telegram_id, seen_questions=seen_blob)
+        return True
+
     async def create(self, question: Question) -> Question:
         # допускаем вход как DTO, валидируем на уровне репозитория при необходимости
         return await self.questions.create(question)
 
-    async def search(self, level: str | None, category: str | None, q: str | None, limit: int = 20, offset: int = 0):
-        items = await self.questions.search(level=level, category=category, q=q, limit=limit, offset=offset)
-        total = await self.questions.count(level=level, category=category, q=q)
-        return {"items": items, "total": total, "limit": limit, "offset": offset}
+    async def search(self, level: str | None, category: str | None, q: str | None, limit: int = 20, cursor: str | None = None, with_total: bool = False) -> QuestionPage:
+        # total — по запросу: отдельный COUNT на каждой странице больше не выполняется
+        return await self.questions.search_page(level=level, category=category, q=q, limit=limit, cursor=cursor, with_total=with_total)
 
     async def update(self, question_id: int, data: dict) -> Question | None:
-        return await self.questions.update(question_id, data)
+        updated = await self.questions.update(question_id, data)
+        prompt_builder.invalidate(question_id)
+        await evaluation_cache.invalidate_question(question_id)
+        return updated
 
     async def delete(self, question_id: int) -> bool:
-        return await self.questions.delete(question_id)
+        ok = await self.questions.delete(question_id)
+        prompt_builder.invalidate(question_id)
+        await evaluation_cache.invalidate_question(question_id)
+        return ok
+
+    async def import_batch(self, questions: List[QuestionEntity]) -> QuestionUpsertResult:
+        """Пакет импорта — одна транзакция; у обновлённых вопросов сбрасываются кэши оценок"""
+        result = await self.questions.upsert_many(questions)
+        for question_id in result.updated_ids:
+            prompt_builder.invalidate(question_id)
+            await evaluation_cache.invalidate_question(question_id)
+        return result
+
+    async def fill_content_hashes(self) -> int:
+        return await self.questions.fill_content_hashes()
 
 
 class AnswerAppService:
-    def __init__(self, users: UserRepository, questions: QuestionRepository, answers: AnswerRepository, ai: AIProvider, voice: VoiceStorage, orch: Orchestrator) -> None:
+    """Оценка ответов.
+
+    Обращения к БД собраны в две короткие единицы работы: чтение пользователя и вопроса
+    до оценки и запись оценённого ответа вместе с приращением счёта после неё. Между ними
+    идут вызовы LLM, на время которых соединение с БД не удерживается.
+    """
+
+    def __init__(self, users: UserRepository, questions: QuestionRepository, answers: AnswerRepository, ai: AIProvider, voice: VoiceStorage, orch: Orchestrator, uow: UnitOfWorkFactory = null_unit_of_work) -> None:
         self.users = users
         self.questions = questions
         self.answers = answers
         self.ai = ai
         self.voice = voice
         self.orch = orch
+        self.uow = uow
 
-    async def answer_text(self, telegram_id: int, question_id: int, text: str) -> Tuple[Answer, dict]:
-        user_dto = await self.users.get_by_telegram_id(telegram_id)
-        if not user_dto:
-            raise ValueError("User not found")
-        q_dto = await self.questions.get_by_id(question_id)
-        if not q_dto:
-            raise ValueError("Question not found")
+    async def answer_text(self, telegram_id: int, question_id: int, text: str, job_id: Optional[int] = None) -> Tuple[Answer, dict]:
+        """job_id — ответ из очереди заданий (см. _record_job)"""
+        user_dto, q_dto = await self._load(telegram_id, question_id)
         user_ent = dto_to_user_entity(user_dto)
-        q_ent = dto_to_question_entity(q_dto)
-        ans_dto = await self.answers.create(user_ent.id, question_id, text, "text")
-        _ = dto_to_answer_entity(ans_dto)
-        notes = await self.orch.prepare_notes(q_ent.category, user_ent.telegram_id, user_ent.level or "", q_ent.title)
-        eval_dict = await self.ai.evaluate(q_dto, text, "text", notes or None)
-        await self.answers.set_score(ans_dto.id, eval_dict["score"], eval_dict["feedback"])
-        await self.users.update_by_telegram_id(telegram_id, score=user_ent.score + eval_dict["score"], questions_answered=user_ent.questions_answered + 1)
+        eval_dict = await self._evaluate(user_ent, q_dto, text, "text")
+        ans_dto = await self._record(user_ent, q_dto, text, "text", eval_dict, job_id=job_id)
         return ans_dto, eval_dict
 
-    async def answer_voice(self, telegram_id: int, question_id: int, voice_file_id: str, bot_token: str) -> Tuple[Answer, dict]:
-        user_dto = await self.users.get_by_telegram_id(telegram_id)
-        if not user_dto:
-            raise ValueError("User not found")
-        q_dto = await self.questions.get_by_id(question_id)
-        if not q_dto:
-            raise ValueError("Question not found")
+    async def answer_voice(self, telegram_id: int, question_id: int, voice_file_id: str, bot_token: str,
+                           job_id: Optional[int] = None) -> Tuple[Answer, dict]:
+        user_dto, q_dto = await self._load(telegram_id, question_id)
+        text = await self._transcribe(voice_file_id, bot_token)
+        user_ent = dto_to_user_entity(user_dto)
+        eval_dict = await self._evaluate(user_ent, q_dto, text, "voice")
+        ans_dto = await self._record(user_ent, q_dto, text, "voice", eval_dict, voice_file_id, job_id=job_id)
+        return ans_dto, eval_dict
+
+    async def recorded(self, job_id: int) -> Optional[Answer]:
+        """Ответ, уже записанный заданием очереди: повтор задания не оценивает его заново"""
+        return await self.answers.get_by_job_id(job_id)
+
+    async def answer_text_stream(self, telegram_id: int, question_id: int, text: str) -> AsyncIterator[Dict[str, Any]]:
+        """Потоковая оценка текстового ответа: события по мере генерации, последним — result."""
+        user_dto, q_dto = await self._load(telegram_id, question_id)
+        async for event in self._stream_and_record(user_dto, q_dto, text, "text"):
+            yield event
+
+    async def answer_voice_stream(self, telegram_id: int, question_id: int, voice_file_id: str, bot_token: str) -> AsyncIterator[Dict[str, Any]]:
+        """Потоковая оценка голосового ответа; первым событием отдаётся распознанный текст."""
+        user_dto, q_dto = await self._load(telegram_id, question_id)
+        text = await self._transcribe(voice_file_id, bot_token)
+        yield {"type": "transcript", "text": text}
+        async for event in self._stream_and_record(user_dto, q_dto, text, "voice", voice_file_id):
+            yield event
+
+    async def _load(self, telegram_id: int, question_id: int) -> Tuple[User, Question]:
+        async with self.uow("answer.load"):
+            user_dto = await self.users.get_by_telegram_id(telegram_id)
+            if not user_dto:
+                raise ValueError("User not found")
+            q_dto = await self.questions.get_by_id(question_id)
+            if not q_dto:
+                raise ValueError("Question not found")
+        return user_dto, q_dto
+
+    async def _record(self, user_ent, q_dto: Question, text: str, answer_type: str, eval_dict: dict,
+                      voice_file_id: Optional[str] = None, job_id: Optional[int] = None) -> Answer:
+        """Оценённый ответ и приращение счёта — одна транзакция.
+
+        Ответ вставляется только после оценки: сбой LLM или отмена не оставляют строк без score.
+        Для задания очереди недоступность LLM (нулевая оценка-заглушка) — ошибка, а не
+        результат: задание уйдёт на повтор. Второй ответ того же задания отклонит
+        уникальный answers.job_id, и транзакция откатится целиком вместе со счётом.
+        """
+        if job_id is not None and eval_dict["feedback"] == EVALUATION_ERROR_FEEDBACK:
+            raise ProviderError("Evaluation unavailable", retryable=True)
+        async with self.uow("answer.record"):
+            ans_dto = await self.answers.create(
+                user_ent.id, q_dto.id, text, answer_type, voice_file_id,
+                score=eval_dict["score"], feedback=eval_dict["feedback"], job_id=job_id,
+            )
+            await self.users.increment_progress(user_ent.telegram_id, eval_dict["score"])
+            await self.users.add_answer_stats(user_ent.id, q_dto.category, q_dto.level, eval_dict["score"])
+        leaderboard.record(user_ent.telegram_id, q_dto.category, eval_dict["score"])
+        return ans_dto
+
+    async def _stream_and_record(self, user_dto: User, q_dto: Question, text: str, answer_type: str,
+                                 voice_file_id: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        user_ent = dto_to_user_entity(user_dto)
+        notes = await self.orch.prepare_notes(q_dto.category, user_ent.telegram_id, user_ent.level or "", q_dto.title)
+        async for event in self.ai.evaluate_stream(q_dto, text, answer_type, notes or None):
+            if event["type"] != "result":
+                yield event
+                continue
+            ans_dto = await self._record(user_ent, q_dto, text, answer_type, event, voice_file_id)
+            yield {**event, "answer_id": ans_dto.id}
+
+    async def _transcribe(self, voice_file_id: str, bot_token: str) -> str:
         ogg_path = f"temp/{voice_file_id}.ogg"
         wav_path = f"temp/{voice_file_id}.wav"
         ok = await self.voice.download_voice(voice_file_id, bot_token, ogg_path)
@@ -121,21 +226,124 @@ class AnswerAppService:
         if not ok:
             await self.voice.cleanup(ogg_path)
             raise ValueError("Failed to convert voice")
-        from ..infrastructure.ai import DefaultAIProvider
-        transcriber = DefaultAIProvider()
-        text = await transcriber.transcribe(wav_path)
+        text = await self.ai.transcribe(wav_path)
         await self.voice.cleanup(ogg_path, wav_path)
         if not text:
             raise ValueError("Transcription failed")
-        user_ent = dto_to_user_entity(user_dto)
-        q_ent = dto_to_question_entity(q_dto)
-        ans_dto = await self.answers.create(user_ent.id, question_id, text, "voice", voice_file_id)
-        _ = dto_to_answer_entity(ans_dto)
-        notes = await self.orch.prepare_notes(q_ent.category, user_ent.telegram_id, user_ent.level or "", q_ent.title)
-        eval_dict = await self.ai.evaluate(q_dto, text, "voice", notes or None)
-        await self.answers.set_score(ans_dto.id, eval_dict["score"], eval_dict["feedback"])
-        await self.users.update_by_telegram_id(telegram_id, score=user_ent.score + eval_dict["score"], questions_answered=user_ent.questions_answered + 1)
-        return ans_dto, eval_dict
+        return text
+
+    async def answer_batch(self, items: List[Tuple[int, int, str]], concurrency: int = 4,
+                           allow: Optional[Callable[[int], bool]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Пакетная оценка ответов: результаты отдаются по мере готовности.
+
+        Пользователи и вопросы читаются одним запросом каждый, оценки выполняются параллельно
+        не более чем в ``concurrency`` потоков. Ответ пишется вместе с оценкой (_record):
+        при ошибке элемента или обрыве соединения строк без score не остаётся.
+        allow(telegram_id) — дневной лимит; списывается только за элементы, прошедшие проверку.
+        """
+        users = await self.users.get_many_by_telegram_ids([tid for tid, _, _ in items])
+        questions = await self.questions.get_many_by_ids([qid for _, qid, _ in items])
+
+        accepted: List[int] = []
+        for index, (telegram_id, question_id, _) in enumerate(items):
+            if telegram_id not in users:
+                yield {"index": index, "error": "User not found"}
+            elif question_id not in questions:
+                yield {"index": index, "error": "Question not found"}
+            elif allow is not None and not allow(telegram_id):
+                yield {"index": index, "error": "Daily limit exceeded"}
+            else:
+                accepted.append(index)
+        if not accepted:
+            return
+
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def run(index: int) -> Dict[str, Any]:
+            telegram_id, question_id, text = items[index]
+            try:
+                async with semaphore:
+                    user_ent = dto_to_user_entity(users[telegram_id])
+                    eval_dict = await self._evaluate(user_ent, questions[question_id], text, "text")
+                # приращение атомарно в БД, блокировки по пользователю не нужны
+                ans_dto = await self._record(user_ent, questions[question_id], text, "text", eval_dict)
+                return {"index": index, "answer_id": ans_dto.id, **eval_dict}
+            except Exception as e:
+                logger.error(f"Batch item {index} failed: {e}")
+                return {"index": index, "error": "Evaluation failed"}
+
+        tasks = [asyncio.ensure_future(run(i)) for i in accepted]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _evaluate(self, user_ent, q_dto: Question, text: str, answer_type: str) -> dict:
+        notes = await self.orch.prepare_notes(q_dto.category, user_ent.telegram_id, user_ent.level or "", q_dto.title)
+        return await self.ai.evaluate(q_dto, text, answer_type, notes or None)
+
+
+class LeaderboardAppService:
+    """Рейтинг игроков поверх досок leaderboard (обновляются AnswerAppService)"""
+
+    def __init__(self, users: UserRepository, board: Leaderboard = leaderboard) -> None:
+        self.users = users
+        self.board = board
+
+    async def top(self, limit: int = 10, category: Optional[str] = None, window: str = "all",
+                  telegram_id: Optional[int] = None) -> LeaderboardPage:
+        """ValueError — неизвестное окно"""
+        self.board.board_name(category, window)
+        await self.board.ensure_loaded()
+        top = self.board.top(limit, category, window)
+        users = await self.users.get_many_by_telegram_ids([tid for _, tid, _ in top]) if top else {}
+        entries = [
+            LeaderboardEntry(
+                rank=rank, telegram_id=tid, score=score,
+                username=getattr(users.get(tid), "username", None),
+                first_name=getattr(users.get(tid), "first_name", None),
+            )
+            for rank, tid, score in top
+        ]
+        me = self.board.rank(telegram_id, category, window) if telegram_id is not None else None
+        return LeaderboardPage(
+            category=category,
+            window=window,
+            week=self.board.week if window == "week" else None,
+            total=self.board.size(category, window),
+            entries=entries,
+            me=LeaderboardRank(rank=me[0], score=me[1], percentile=me[2]) if me else None,
+        )
+
+
+class EvaluationJobAppService:
+    """Фоновая оценка ответов: API и бот ставят задания, выполняет их EvaluationWorker (main.py --mode worker)."""
+
+    def __init__(self, users: UserRepository, questions: QuestionRepository, jobs: JobRepository, max_attempts: int = 3) -> None:
+        self.users = users
+        self.questions = questions
+        self.jobs = jobs
+        self.max_attempts = max_attempts
+
+    async def submit_text(self, telegram_id: int, question_id: int, text: str, notify: Optional[Dict[str, Any]] = None) -> EvaluationJob:
+        await self._validate(telegram_id, question_id)
+        return await self.jobs.enqueue("text", telegram_id, question_id, {"answer_text": text}, notify, self.max_attempts)
+
+    async def submit_voice(self, telegram_id: int, question_id: int, voice_file_id: str, notify: Optional[Dict[str, Any]] = None) -> EvaluationJob:
+        await self._validate(telegram_id, question_id)
+        return await self.jobs.enqueue("voice", telegram_id, question_id, {"voice_file_id": voice_file_id}, notify, self.max_attempts)
+
+    async def get(self, job_id: int) -> Optional[EvaluationJob]:
+        return await self.jobs.get(job_id)
+
+    async def _validate(self, telegram_id: int, question_id: int) -> None:
+        # Проверяем синхронно, чтобы клиент получил 400 сразу, а не failed-задание
+        if not await self.users.get_by_telegram_id(telegram_id):
+            raise ValueError("User not found")
+        if not await self.questions.get_by_id(question_id):
+            raise ValueError("Question not found")
 
 
 class TutorAppService:
@@ -0,0 +1,76 @@
+from __future__ import annotations
+from collections import OrderedDict
+from time import monotonic
+from typing import Any, Dict, Generic, Hashable, Optional, Tuple, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class LRUCache(Generic[K, V]):
+    """Ограниченный in-process LRU-кэш с опциональным TTL и счётчиками попаданий.
+
+    ``sliding=True`` — TTL отсчитывается от последнего обращения (вытеснение простаивающих).
+    """
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None, sliding: bool = False) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.sliding = sliding
+        self._data: "OrderedDict[K, Tuple[float, V]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: K) -> Optional[V]:
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        stored_at, value = item
+        now = monotonic()
+        if self.ttl is not None and now - stored_at > self.ttl:
+            del self._data[key]
+            self.misses += 1
+            return None
+        if self.sliding:
+            self._data[key] = (now, value)
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: K, value: V) -> None:
+        if self.maxsize <= 0:
+            return
+        self._data[key] = (monotonic(), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: K) -> Optional[V]:
+        item = self._data.pop(key, None)
+        return item[1] if item else None
+
+    def items(self):
+        return [(k, v) for k, (_, v) in self._data.items()]
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._data
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+        }
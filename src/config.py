@@ -1,4 +1,4 @@
-from typing import Dict, Literal
+from typing import Dict, Literal, Optional
 from pydantic import Field
 from pydantic_settings import BaseSettings
 
@@ -14,6 +14,9 @@ class Settings(BaseSettings):
     
     # OpenAI API Key
     openai_api_key: str = Field(default="", description="OpenAI API Key")
+    openai_model: str = Field(default="gpt-4", description="Модель OpenAI для оценки ответов")
+    openai_base_url: str = Field(default="", description="Базовый URL OpenAI-совместимого API (пусто — api.openai.com)")
+    openai_json_mode: Optional[bool] = Field(default=None, description="JSON mode (response_format); по умолчанию — по модели")
     
     # GigaChat Settings
     gigachat_client_id: str = Field(default="", description="GigaChat Client ID")
@@ -21,6 +24,9 @@ class Settings(BaseSettings):
     gigachat_auth_url: str = Field(default="https://ngw.devices.sberbank.ru:9443/api/v2/oauth", description="GigaChat Auth URL")
     gigachat_api_url: str = Field(default="https://gigachat.devices.sberbank.ru/api/v1", description="GigaChat API URL")
     
+    # Telegram Bot API (переопределяется для локального стенда)
+    telegram_api_url: str = Field(default="https://api.telegram.org", description="Базовый URL Telegram Bot API")
+
     # Настройки бота
     bot_name: str = Field(default="Interview Helper Bot", description="Название бота")
     
@@ -29,6 +35,16 @@ class Settings(BaseSettings):
         default="sqlite+aiosqlite:///./interview_bot.db",
         description="URL базы данных"
     )
+    db_pool_size: int = Field(default=10, description="Постоянных соединений в пуле на процесс")
+    db_max_overflow: int = Field(default=20, description="Сколько соединений сверх pool_size открывать под пиковую нагрузку")
+    db_pool_timeout: float = Field(default=30.0, description="Сколько ждать свободного соединения из пула, сек")
+    db_pool_recycle: int = Field(default=1800, description="Переоткрывать соединения старше стольких секунд; -1 — никогда")
+    db_pool_pre_ping: str = Field(default="idle", description="Проверка соединения при выдаче из пула: always, idle (только простаивавших) или never")
+    db_pool_pre_ping_idle_seconds: float = Field(default=60.0, description="Простой соединения, после которого idle-политика его пингует, сек")
+    database_replica_urls: str = Field(default="", description="URL реплик для чтения через запятую (поиск, статистика, вопросы)")
+    replica_max_lag_seconds: float = Field(default=5.0, description="Реплика, отстающая сильнее, не используется — читаем с primary, сек")
+    replica_lag_check_interval: float = Field(default=10.0, description="Как часто перемерять отставание реплик, сек")
+    db_statement_cache_size: int = Field(default=100, description="Кэш подготовленных выражений asyncpg на соединение; 0 — для PgBouncer (transaction)")
     
     # Настройки сервера
     host: str = Field(default="0.0.0.0", description="Хост для FastAPI сервера")
@@ -43,6 +59,83 @@ class Settings(BaseSettings):
     # Лимиты
     daily_limit_per_user: int = Field(default=50, description="Дневной лимит оценок ответов на пользователя")
 
+    # Адаптивный (AIMD) ограничитель параллельных вызовов LLM
+    llm_limiter_initial: int = Field(default=8, description="Начальное окно параллельных вызовов LLM")
+    llm_limiter_min: int = Field(default=1, description="Минимальное окно параллельных вызовов LLM")
+    llm_limiter_max: int = Field(default=64, description="Максимальное окно параллельных вызовов LLM")
+    llm_limiter_max_wait: float = Field(default=10.0, description="Максимальное ожидание слота в очереди, сек")
+    llm_limiter_max_queue: int = Field(default=256, description="Максимальная длина очереди ожидающих вызовов")
+
+    # Отказоустойчивость AI провайдеров: ретраи, circuit breaker, failover и hedging
+    ai_max_attempts: int = Field(default=3, description="Максимум попыток оценки одного ответа (включая failover)")
+    ai_retry_base_delay: float = Field(default=0.5, description="Базовая задержка экспоненциального backoff, сек")
+    ai_retry_max_delay: float = Field(default=8.0, description="Потолок задержки backoff, сек")
+    ai_retry_after_max: float = Field(default=30.0, description="Максимум, сколько соблюдаем Retry-After провайдера, сек")
+    ai_failover_enabled: bool = Field(default=True, description="Переключаться на второй настроенный провайдер при сбоях")
+    ai_breaker_failure_threshold: int = Field(default=5, description="Подряд идущих сбоев до размыкания circuit breaker")
+    ai_breaker_reset_timeout: float = Field(default=30.0, description="Через сколько секунд разомкнутый breaker пробует провайдер снова")
+    ai_hedge_enabled: bool = Field(default=False, description="Hedged-запросы: дублировать вызов во второй провайдер после p95")
+    ai_hedge_delay_default: float = Field(default=8.0, description="Задержка hedge, пока не накоплена статистика латентности, сек")
+    ai_hedge_min_delay: float = Field(default=1.0, description="Минимальная задержка перед hedge-запросом, сек")
+
+    # Потоковая оценка в Telegram: минимальный интервал между правками сообщения
+    telegram_stream_edit_interval: float = Field(default=1.5, description="Интервал между правками сообщения при стриминге, сек")
+
+    # Пакетная оценка ответов
+    batch_eval_concurrency: int = Field(default=4, description="Максимум параллельных LLM-оценок в одном пакете")
+    batch_max_items: int = Field(default=200, description="Максимум ответов в одном пакетном запросе")
+
+    # Пул id вопросов для случайного выбора
+    question_pool_refresh_seconds: int = Field(default=300, description="Период перестройки пула вопросов (правки из других процессов), сек; 0 — не перестраивать")
+
+    # Кэш пользователей бота (уровень, категория, текущий вопрос)
+    user_session_cache_size: int = Field(default=10000, description="Сколько пользователей держать в кэше процесса; 0 — без кэша")
+    user_session_idle_seconds: int = Field(default=900, description="Вытеснение пользователя из кэша после простоя, сек")
+    user_session_notify: bool = Field(default=True, description="Сброс кэша в других процессах через Postgres LISTEN/NOTIFY (asyncpg)")
+
+    # Кэш вопросов по id (get_by_id)
+    question_cache_size: int = Field(default=2048, description="Сколько вопросов держать в кэше процесса; 0 — без кэша")
+    question_cache_ttl_seconds: int = Field(default=300, description="Сколько хранить вопрос в кэше (правки из других процессов), сек")
+
+    # Поиск вопросов в админке
+    question_search_backend: str = Field(default="auto", description="auto — полнотекстовый поиск БД (Postgres tsvector, SQLite FTS5); like — ILIKE по подстроке")
+    question_search_config: str = Field(default="russian", description="Конфигурация текстового поиска Postgres (russian, english, simple)")
+    question_count_cache_ttl_seconds: int = Field(default=60, description="Сколько хранить итог поиска по фильтру (total для постраничного вывода), сек")
+
+    # Архив ответов (scripts/archive_answers.py)
+    answer_hot_months: int = Field(default=3, description="Сколько последних месяцев (включая текущий) ответы лежат в answers")
+    answer_archive_retention_months: int = Field(default=0, description="Сколько месяцев хранить архив после горячей части; 0 — всегда")
+    answer_archive_batch_size: int = Field(default=1000, description="Ответов на транзакцию при переносе в архив")
+
+    # Рейтинг игроков (/leaderboard, /top)
+    leaderboard_refresh_seconds: int = Field(default=30, description="Как часто подхватывать очки из других процессов, сек; 0 — только при старте")
+    leaderboard_snapshot_seconds: int = Field(default=300, description="Как часто сохранять доски в leaderboard_snapshots, сек; 0 — не сохранять")
+    leaderboard_max_limit: int = Field(default=100, description="Максимум строк рейтинга в одном ответе")
+
+    # Пройденные вопросы пользователей (без повторов до конца категории)
+    seen_cache_size: int = Field(default=10000, description="Сколько пользователей держать в кэше пройденных вопросов")
+    seen_cache_ttl_seconds: int = Field(default=600, description="Время жизни записи кэша пройденных вопросов, сек")
+
+    # Очередь фоновых оценок (main.py --mode worker)
+    eval_worker_concurrency: int = Field(default=4, description="Сколько заданий воркер оценивает параллельно")
+    eval_worker_poll_interval: float = Field(default=1.0, description="Пауза между опросами пустой очереди, сек")
+    eval_job_lease_seconds: int = Field(default=300, description="Через сколько секунд задание пропавшего воркера вернётся в очередь")
+    eval_job_max_attempts: int = Field(default=3, description="Максимум попыток выполнить задание")
+    bot_use_job_queue: bool = Field(default=False, description="Бот ставит оценки в очередь вместо ожидания в обработчике")
+
+    # Бюджет токенов промпта оценки
+    eval_prompt_token_budget: int = Field(default=6000, description="Бюджет токенов промпта оценки (без ответа модели)")
+    eval_answer_min_tokens: int = Field(default=1500, description="Токены, гарантированно оставляемые под ответ кандидата")
+    eval_completion_tokens_base: int = Field(default=300, description="Базовый max_tokens ответа модели")
+    eval_completion_tokens_per_point: int = Field(default=40, description="Прибавка max_tokens за каждый балл вопроса")
+    eval_completion_tokens_min: int = Field(default=300, description="Нижняя граница max_tokens ответа модели")
+    eval_completion_tokens_max: int = Field(default=1000, description="Верхняя граница max_tokens ответа модели")
+
+    # Кэш оценок ответов
+    eval_cache_enabled: bool = Field(default=True, description="Кэшировать результаты AI-оценки")
+    eval_cache_size: int = Field(default=2048, description="Размер in-process LRU кэша оценок")
+    eval_cache_ttl_seconds: int = Field(default=7 * 24 * 3600, description="Время жизни закэшированной оценки, сек")
+
     # Context7
     context7_api_base: str = Field(default="", description="Базовый URL Context7 API")
     context7_api_token: str = Field(default="", description="API токен Context7")
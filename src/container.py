@@ -5,6 +5,7 @@ from .infrastructure.repositories import (
     SqlAlchemyUserRepository,
     SqlAlchemyQuestionRepository,
     SqlAlchemyAnswerRepository,
+    SqlAlchemyJobRepository,
 )
 from .infrastructure.ai import DefaultAIProvider
 from .infrastructure.executor import PistonExecutor
@@ -12,7 +13,10 @@ from .infrastructure.voice import TelegramVoiceStorage
 from .infrastructure.orchestrator import DefaultOrchestrator
 from .infrastructure.docs import Context7DocsProvider
 from .application.services import InterviewAppService
-from .application.user_services import UserAppService, QuestionAppService, AnswerAppService, TutorAppService
+from .application.user_services import UserAppService, QuestionAppService, AnswerAppService, TutorAppService, EvaluationJobAppService, LeaderboardAppService
+from .config import settings
+from .database import database
+from .seen_questions import SeenQuestionsStore
 
 
 @lru_cache(maxsize=1)
@@ -30,6 +34,16 @@ def get_answer_repo() -> SqlAlchemyAnswerRepository:
     return SqlAlchemyAnswerRepository()
 
 
+@lru_cache(maxsize=1)
+def get_job_repo() -> SqlAlchemyJobRepository:
+    return SqlAlchemyJobRepository()
+
+
+@lru_cache(maxsize=1)
+def get_seen_store() -> SeenQuestionsStore:
+    return SeenQuestionsStore(get_user_repo())
+
+
 @lru_cache(maxsize=1)
 def get_ai_provider() -> DefaultAIProvider:
     return DefaultAIProvider()
@@ -48,6 +62,8 @@ def get_interview_app_service() -> InterviewAppService:
         answers=get_answer_repo(),
         ai=get_ai_provider(),
         docs=Context7DocsProvider(),
+        seen=get_seen_store(),
+        uow=database.unit_of_work,
     )
 
 
@@ -56,9 +72,14 @@ def get_user_app_service() -> UserAppService:
     return UserAppService(get_user_repo())
 
 
+@lru_cache(maxsize=1)
+def get_leaderboard_app_service() -> LeaderboardAppService:
+    return LeaderboardAppService(get_user_repo())
+
+
 @lru_cache(maxsize=1)
 def get_question_app_service() -> QuestionAppService:
-    return QuestionAppService(get_user_repo(), get_question_repo())
+    return QuestionAppService(get_user_repo(), get_question_repo(), get_seen_store(), uow=database.unit_of_work)
 
 
 @lru_cache(maxsize=1)
@@ -70,6 +91,17 @@ def get_answer_app_service() -> AnswerAppService:
         ai=get_ai_provider(),
         voice=TelegramVoiceStorage(),
         orch=DefaultOrchestrator(),
+        uow=database.unit_of_work,
+    )
+
+
+@lru_cache(maxsize=1)
+def get_evaluation_job_app_service() -> EvaluationJobAppService:
+    return EvaluationJobAppService(
+        users=get_user_repo(),
+        questions=get_question_repo(),
+        jobs=get_job_repo(),
+        max_attempts=settings.eval_job_max_attempts,
     )
 
 
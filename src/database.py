@@ -1,12 +1,40 @@
-from datetime import datetime
-from typing import List, Optional, Dict, Any
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, JSON, text
+import asyncio
+import itertools
+import logging
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from datetime import date, datetime, timedelta, timezone
+from typing import AsyncIterator, Callable, List, Optional, Dict, Any
+from sqlalchemy import Column, Date, Integer, String, Text, DateTime, Boolean, ForeignKey, JSON, LargeBinary, text
+from sqlalchemy import delete as sa_delete, event, insert, select, update as sa_update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
 from .config import settings
+from .db_pool import PoolMetrics, engine_options, instrument_engine
+from .models import User as UserDTO
+from .user_sessions import NOTIFY_CHANNEL, user_sessions
+
+logger = logging.getLogger(__name__)
+
+# Сколько последних дней статистика показывает по дням
+STATS_RECENT_DAYS = 14
+
+
+def dialect_insert(dialect: str):
+    """insert() с ON CONFLICT: он есть только в диалектных конструкциях"""
+    if dialect == "postgresql":
+        return postgresql.insert
+    if dialect == "sqlite":
+        return sqlite.insert
+    raise NotImplementedError(f"Upsert is not supported for {dialect}")
+
 
 # Создаем базовый класс для моделей
 Base = declarative_base()
@@ -26,6 +54,7 @@ class User(Base):
     current_question_id = Column(Integer, ForeignKey("questions.id"), nullable=True)
     score = Column(Integer, default=0)
     questions_answered = Column(Integer, default=0)
+    seen_questions = Column(LargeBinary, nullable=True)  # пройденные вопросы по (уровню, категории) (см. seen_questions.py)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
@@ -34,6 +63,16 @@ class User(Base):
     current_question = relationship("Question", foreign_keys=[current_question_id])
 
 
+# Поля, которые можно менять через Database.update_user
+_USER_UPDATABLE_FIELDS = {
+    "username", "first_name", "last_name", "level", "category", "current_question_id",
+    "score", "questions_answered", "seen_questions",
+}
+
+# Чтение пользователя — строкой из полей DTO, без ORM-объекта и blob seen_questions
+_USER_COLUMNS = tuple(getattr(User, name) for name in UserDTO.model_fields)
+
+
 class Question(Base):
     """Модель вопроса в базе данных"""
     __tablename__ = "questions"
@@ -49,6 +88,8 @@ class Question(Base):
     explanation = Column(Text, nullable=True)
     hints = Column(JSON, nullable=True)  # Список подсказок
     tags = Column(JSON, nullable=True)   # Список тегов
+    # sha256 заголовка, текста, уровня и категории — ключ upsert при импорте (domain.entities.question_content_hash)
+    content_hash = Column(String(64), nullable=True, unique=True, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
@@ -68,6 +109,8 @@ class Answer(Base):
     score = Column(Integer, nullable=True)
     feedback = Column(Text, nullable=True)
     voice_file_id = Column(String(255), nullable=True)
+    # задание очереди, записавшее ответ: повторный запуск задания не запишет его второй раз
+    job_id = Column(Integer, nullable=True, unique=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # Отношения
@@ -75,64 +118,438 @@ class Answer(Base):
     question = relationship("Question", back_populates="answers")
 
 
+class UserStatsRollup(Base):
+    """Итоги ответов пользователя по категории, уровню и дню (UTC).
+
+    Пишется в той же транзакции, что и оценённый ответ; статистика читает её вместо
+    агрегатов по answers. Пересобрать из answers: scripts/backfill_user_stats.py.
+    """
+    __tablename__ = "user_stats_rollup"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    category = Column(String(100), primary_key=True)
+    level = Column(String(50), primary_key=True)
+    day = Column(Date, primary_key=True)
+    answered = Column(Integer, nullable=False, default=0)
+    total_score = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class LeaderboardSnapshot(Base):
+    """Снимок досок рейтинга (leaderboard.py): с него стартуют процессы вместо агрегата по rollup"""
+    __tablename__ = "leaderboard_snapshots"
+
+    board = Column(String(160), primary_key=True)  # «global:all», «databases:2026-W42»
+    telegram_id = Column(Integer, primary_key=True)
+    score = Column(Integer, nullable=False)
+    taken_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+
+class EvaluationCacheEntry(Base):
+    """Персистентный кэш результатов AI-оценки (ключ — хэш содержимого запроса)"""
+    __tablename__ = "evaluation_cache"
+
+    key = Column(String(64), primary_key=True)
+    question_id = Column(Integer, index=True, nullable=False)
+    result = Column(JSON, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class EvaluationJob(Base):
+    """Задание на фоновую оценку ответа (очередь для main.py --mode worker)"""
+    __tablename__ = "evaluation_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(20), nullable=False)  # text или voice
+    status = Column(String(20), nullable=False, default="queued", index=True)  # queued, running, done, failed
+    telegram_id = Column(Integer, nullable=False, index=True)
+    question_id = Column(Integer, nullable=False)
+    payload = Column(JSON, nullable=False)   # answer_text или voice_file_id
+    notify = Column(JSON, nullable=True)     # куда сообщить о результате (чат и сообщение бота)
+    result = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    run_after = Column(DateTime(timezone=True), nullable=False, index=True)
+    locked_by = Column(String(255), nullable=True)
+    locked_at = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class UnitOfWork:
+    """Одна сессия и одна транзакция на запрос API или апдейт бота (см. Database.unit_of_work)"""
+
+    def __init__(self, session_maker, name: str) -> None:
+        self._session_maker = session_maker
+        self.name = name
+        self.task = asyncio.current_task()
+        self.session: Optional[AsyncSession] = None
+        self.statements = 0  # запросы к БД внутри единицы работы — для отладки N+1
+        self.dirty = False   # были записи (commit() внутри единицы работы)
+        self.on_commit: List[Callable[[], None]] = []  # выполняются после COMMIT, при откате — нет
+
+    def get_session(self) -> AsyncSession:
+        if self.session is None:
+            self.session = self._session_maker()
+        return self.session
+
+
+class _UnitOfWorkSession:
+    """Сессия единицы работы для ``async with database.get_session()``.
+
+    Выход из блока не закрывает сессию, а commit() только отправляет изменения (flush):
+    фиксирует всё разом выход из unit_of_work. rollback() откатывает всю единицу работы.
+    """
+
+    def __init__(self, uow: UnitOfWork) -> None:
+        self._uow = uow
+        self._session = uow.get_session()
+
+    async def __aenter__(self) -> "_UnitOfWorkSession":
+        return self
+
+    async def __aexit__(self, *exc_info) -> bool:
+        return False
+
+    async def commit(self) -> None:
+        await self._session.flush()
+        self._uow.dirty = True
+
+    def __getattr__(self, name: str):
+        return getattr(self._session, name)
+
+
+_current_uow: ContextVar[Optional[UnitOfWork]] = ContextVar("unit_of_work", default=None)
+
+
+def _active_uow() -> Optional[UnitOfWork]:
+    uow = _current_uow.get()
+    if uow is None or uow.task is not asyncio.current_task():
+        return None
+    return uow
+
+
+def _count_statement(conn, cursor, statement, parameters, context, executemany) -> None:
+    # Событие синхронного движка; greenlet SQLAlchemy переносит contextvars вызывающей задачи
+    uow = _current_uow.get()
+    if uow is not None:
+        uow.statements += 1
+
+
+class UnitOfWorkStats:
+    """Сколько запросов к БД делает каждая единица работы (по имени)"""
+
+    def __init__(self) -> None:
+        self._by_name: Dict[str, Dict[str, int]] = {}
+
+    def record(self, uow: UnitOfWork) -> None:
+        entry = self._by_name.setdefault(uow.name, {"count": 0, "statements": 0, "max_statements": 0, "last_statements": 0})
+        entry["count"] += 1
+        entry["statements"] += uow.statements
+        entry["max_statements"] = max(entry["max_statements"], uow.statements)
+        entry["last_statements"] = uow.statements
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            name: {**entry, "avg_statements": round(entry["statements"] / entry["count"], 2)}
+            for name, entry in sorted(self._by_name.items())
+        }
+
+
+# Отставание реплики Postgres, сек. Простаивающий primary не считается отставанием:
+# если всё полученное WAL уже применено, реплика актуальна.
+_PG_REPLICA_LAG_SQL = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+
+def _to_async_url(url: str) -> str:
+    # Только если URL начинается именно с sqlite:// (без драйвера);
+    # если уже есть драйвер или другая БД, используем как есть
+    if url.startswith("sqlite://"):
+        return url.replace("sqlite://", "sqlite+aiosqlite://")
+    return url
+
+
+class Replica:
+    """Реплика для чтения: свой движок и пул, последнее измеренное отставание"""
+
+    def __init__(self, url: str, pool_metrics: PoolMetrics) -> None:
+        self.url = url
+        self.name = make_url(url).render_as_string(hide_password=True)
+        self.pool_metrics = pool_metrics
+        self.engine = create_async_engine(url, **engine_options(url, pool_metrics))
+        instrument_engine(self.engine.sync_engine, pool_metrics)
+        event.listen(self.engine.sync_engine, "before_cursor_execute", _count_statement)
+        self.session_maker = async_sessionmaker(self.engine, class_=AsyncSession, expire_on_commit=False)
+        self.lag: Optional[float] = None
+        self.healthy = True
+        self.error: Optional[str] = None
+        self.checked_at: Optional[float] = None
+        self.checking = False
+        self.reads = 0
+
+    def usable(self) -> bool:
+        return self.healthy and self.lag is not None and self.lag <= settings.replica_max_lag_seconds
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "healthy": self.healthy,
+            "lag_seconds": self.lag,
+            "error": self.error,
+            "reads": self.reads,
+            "pool": self.pool_metrics.snapshot(self.engine.pool),
+        }
+
+
 class Database:
     """Класс для работы с базой данных"""
     
     def __init__(self):
         self.engine = None
         self.session_maker = None
+        self.uow_stats = UnitOfWorkStats()
+        self.pool_metrics = PoolMetrics()
+        self.replicas: List[Replica] = []
+        self._replica_rr = itertools.count()
+        self.replica_fallbacks = 0   # реплики есть, но все отстают или недоступны
+        self.read_your_writes = 0    # чтение ушло на primary: единица работы уже писала
     
     async def connect(self):
         """Подключение к базе данных"""
         # Конвертируем URL для async
-        if settings.database_url.startswith("sqlite://"):
-            # Только если URL начинается именно с sqlite:// (без драйвера)
-            async_url = settings.database_url.replace("sqlite://", "sqlite+aiosqlite://")
-        else:
-            # Если уже есть драйвер или другая БД, используем как есть
-            async_url = settings.database_url
-        
-        self.engine = create_async_engine(
-            async_url,
-            echo=False,
-            pool_pre_ping=True
-        )
+        async_url = _to_async_url(settings.database_url)
+        self.engine = create_async_engine(async_url, **engine_options(async_url, self.pool_metrics))
+        instrument_engine(self.engine.sync_engine, self.pool_metrics)
         
         self.session_maker = async_sessionmaker(
             self.engine,
             class_=AsyncSession,
             expire_on_commit=False
         )
+        event.listen(self.engine.sync_engine, "before_cursor_execute", _count_statement)
+        self.replicas = [
+            Replica(_to_async_url(url.strip()), PoolMetrics())
+            for url in settings.database_replica_urls.split(",")
+            if url.strip()
+        ]
+        await user_sessions.attach(self.engine)
     
     async def disconnect(self):
         """Отключение от базы данных"""
+        await user_sessions.detach()
         if self.engine:
             await self.engine.dispose()
+        for replica in self.replicas:
+            await replica.engine.dispose()
     
     async def create_tables(self):
         """Создание таблиц"""
         async with self.engine.begin() as conn:
             await conn.run_sync(Base.metadata.create_all)
+        from .infrastructure.question_search import question_search
+        await question_search.setup(self.engine)
     
+    def pool_stats(self) -> Dict[str, Any]:
+        """Заняты/свободны/overflow и гистограмма ожидания соединения"""
+        return self.pool_metrics.snapshot(self.engine.pool if self.engine else None)
+
     def get_session(self) -> AsyncSession:
-        """Получение сессии базы данных (async session factory)"""
+        """Получение сессии базы данных (async session factory).
+
+        Внутри unit_of_work возвращает общую сессию единицы работы.
+        """
         if not self.session_maker:
             raise RuntimeError("База данных не подключена")
+        uow = _active_uow()
+        if uow is not None:
+            return _UnitOfWorkSession(uow)
         return self.session_maker()
+
+    @asynccontextmanager
+    async def read_session(self) -> AsyncIterator[AsyncSession]:
+        """Сессия для чтения, допускающего отставание: реплика, если она достаточно свежая.
+
+        Внутри единицы работы, которая уже писала, читаем с primary через её сессию
+        (read-your-writes). Нет реплик или все отстают больше ``REPLICA_MAX_LAG_SECONDS`` —
+        тоже primary.
+        """
+        uow = _active_uow()
+        replica = None
+        if uow is not None and uow.dirty:
+            if self.replicas:
+                self.read_your_writes += 1
+        else:
+            replica = await self._pick_replica()
+        if replica is None:
+            async with self.get_session() as session:
+                yield session
+            return
+        replica.reads += 1
+        async with replica.session_maker() as session:
+            yield session
+
+    async def _pick_replica(self) -> Optional[Replica]:
+        """Следующая по кругу свежая реплика; отставание перемеряется не чаще REPLICA_LAG_CHECK_INTERVAL"""
+        if not self.replicas:
+            return None
+        start = next(self._replica_rr)
+        for i in range(len(self.replicas)):
+            replica = self.replicas[(start + i) % len(self.replicas)]
+            stale = replica.checked_at is None or time.monotonic() - replica.checked_at >= settings.replica_lag_check_interval
+            if stale and not replica.checking:
+                await self.check_replica(replica)
+            if replica.usable():
+                return replica
+        self.replica_fallbacks += 1
+        return None
+
+    async def check_replica(self, replica: Replica) -> None:
+        """Измеряет отставание реплики; недоступная реплика исключается до следующей проверки"""
+        replica.checking = True
+        try:
+            async with replica.engine.connect() as conn:
+                if replica.engine.dialect.name == "postgresql":
+                    lag = await conn.scalar(_PG_REPLICA_LAG_SQL)
+                else:
+                    # у SQLite нет репликации: отдельный файл считаем актуальной копией
+                    await conn.execute(text("SELECT 1"))
+                    lag = 0
+            replica.lag = float(lag or 0)
+            replica.healthy, replica.error = True, None
+        except Exception as e:
+            if replica.healthy:
+                logger.warning(f"Replica {replica.name} is unavailable, reading from primary: {e}")
+            replica.healthy, replica.error = False, str(e)
+        finally:
+            replica.checked_at = time.monotonic()
+            replica.checking = False
+
+    def replica_stats(self) -> Dict[str, Any]:
+        return {
+            "replicas": [replica.stats() for replica in self.replicas],
+            "max_lag_seconds": settings.replica_max_lag_seconds,
+            "fallbacks_to_primary": self.replica_fallbacks,
+            "read_your_writes": self.read_your_writes,
+        }
+
+    @asynccontextmanager
+    async def unit_of_work(self, name: str = "default") -> AsyncIterator[UnitOfWork]:
+        """Единица работы: все обращения к БД внутри блока идут через одну сессию и соединение,
+        записи фиксируются одним COMMIT на выходе (при исключении — откат).
+
+        Вложенный unit_of_work присоединяется к внешнему. Задачи, запущенные внутри блока
+        (asyncio.gather и т.п.), наследуют contextvar, но получают собственные сессии:
+        AsyncSession нельзя использовать из нескольких задач одновременно.
+        Блок не должен охватывать вызовы LLM — иначе соединение простаивает в транзакции.
+        """
+        current = _active_uow()
+        if current is not None:
+            yield current
+            return
+        if not self.session_maker:
+            raise RuntimeError("База данных не подключена")
+        uow = UnitOfWork(self.session_maker, name)
+        token = _current_uow.set(uow)
+        try:
+            yield uow
+            if uow.session is not None:
+                await uow.session.commit()
+            for callback in uow.on_commit:
+                callback()
+        except BaseException:
+            if uow.session is not None:
+                await uow.session.rollback()
+            raise
+        finally:
+            _current_uow.reset(token)
+            if uow.session is not None:
+                await uow.session.close()
+            self.uow_stats.record(uow)
+            logger.debug(f"Unit of work {name}: {uow.statements} statements")
     
+    def after_commit(self, callback: Callable[[], None]) -> None:
+        """Действие после фиксации записи: в unit_of_work — после его COMMIT, иначе сразу"""
+        uow = _active_uow()
+        if uow is not None:
+            uow.on_commit.append(callback)
+        else:
+            callback()
+
+    def _fill_user(self, row, generation: int) -> Any:
+        """Прочитанный пользователь; незафиксированные записи единицы работы в кэш не попадают.
+
+        generation — поколение ключа в кэше сессий, снятое до SELECT.
+        """
+        uow = _active_uow()
+        if uow is not None and uow.dirty:
+            from .models import User as UserModel, from_db
+            return from_db(UserModel, row)
+        return user_sessions.fill(row, generation)
+
+    async def _publish_user(self, session, orm_user) -> Any:
+        """Записанный пользователь для кэша сессий; вызывать до COMMIT, затем — _cache_user"""
+        from .models import User as UserModel, from_db
+        user = from_db(UserModel, orm_user)
+        # до COMMIT в кэше не должно остаться старой строки для чтений внутри этой же транзакции
+        user_sessions.invalidate(user.telegram_id)
+        if self.engine.dialect.name == "postgresql":
+            # NOTIFY транзакционный: другие процессы получат его только после COMMIT
+            await session.execute(
+                text("SELECT pg_notify(:channel, :payload)"),
+                {"channel": NOTIFY_CHANNEL, "payload": user_sessions.notify_payload(user.telegram_id)},
+            )
+        return user
+
+    def _cache_user(self, user: Any) -> None:
+        """После COMMIT записи: свой процесс сразу видит новую строку"""
+        self.after_commit(lambda: user_sessions.put(user))
+
     async def get_user_by_telegram_id(self, telegram_id: int) -> Optional[User]:
         """Получение пользователя по Telegram ID"""
+        cached = user_sessions.get(telegram_id)
+        if cached is not None:
+            return cached
+        generation = user_sessions.generation(telegram_id)
         async with self.get_session() as session:
-            from sqlalchemy import select
-            stmt = select(User).where(User.telegram_id == telegram_id)
-            result = await session.scalars(stmt)
-            orm_user = result.first()
-            if not orm_user:
+            row = (await session.execute(select(*_USER_COLUMNS).where(User.telegram_id == telegram_id))).first()
+            if not row:
                 return None
-            # Конвертируем ORM объект в Pydantic модель
-            from .models import User as UserModel
-            return UserModel.model_validate(orm_user)
+            return self._fill_user(row, generation)
     
+    async def get_users_by_telegram_ids(self, telegram_ids: List[int]) -> Dict[int, Any]:
+        """Получение пользователей по списку Telegram ID одним запросом"""
+        found: Dict[int, Any] = {}
+        missing = set()
+        for telegram_id in telegram_ids:
+            cached = user_sessions.get(telegram_id)
+            if cached is not None:
+                found[telegram_id] = cached
+            else:
+                missing.add(telegram_id)
+        if missing:
+            generations = {telegram_id: user_sessions.generation(telegram_id) for telegram_id in missing}
+            async with self.get_session() as session:
+                result = await session.execute(select(*_USER_COLUMNS).where(User.telegram_id.in_(missing)))
+                found.update({
+                    row.telegram_id: self._fill_user(row, generations[row.telegram_id]) for row in result.all()
+                })
+        return found
+
+    async def get_user_seen_questions(self, telegram_id: int, for_update: bool = False) -> Optional[bytes]:
+        """Blob пройденных вопросов пользователя; for_update — с блокировкой строки (SQLite её не знает)"""
+        async with self.get_session() as session:
+            stmt = select(User.seen_questions).where(User.telegram_id == telegram_id)
+            if for_update:
+                stmt = stmt.with_for_update()
+            return await session.scalar(stmt)
+
     async def create_user(self, telegram_id: int, username: str = None, 
                          first_name: str = None, last_name: str = None) -> User:
         """Создание нового пользователя"""
@@ -144,28 +561,81 @@ class Database:
                 last_name=last_name
             )
             session.add(orm_user)
-            await session.commit()
+            await session.flush()
             await session.refresh(orm_user)
-            # Конвертируем ORM объект в Pydantic модель
-            from .models import User as UserModel
-            return UserModel.model_validate(orm_user)
+            user = await self._publish_user(session, orm_user)
+            await session.commit()
+            self._cache_user(user)
+            return user
     
     async def update_user(self, telegram_id: int, **kwargs) -> Optional[User]:
         """Обновление пользователя"""
-        async with self.get_session() as session:
-            result = await session.execute(
-                text(
-                    "UPDATE users SET updated_at = :updated_at, "
-                    + ", ".join([f"{k} = :{k}" for k in kwargs.keys()])
-                    + " WHERE telegram_id = :telegram_id"
-                ),
-                {"telegram_id": telegram_id, "updated_at": datetime.now(), **kwargs},
+        unknown = set(kwargs) - _USER_UPDATABLE_FIELDS
+        if unknown:
+            raise ValueError(f"Unknown user fields: {', '.join(sorted(unknown))}")
+        stmt = (
+            sa_update(User)
+            .where(User.telegram_id == telegram_id)
+            .values(updated_at=func.now(), **kwargs)
+        )
+        return await self._update_user_returning(stmt, telegram_id)
+
+    async def increment_user_progress(self, telegram_id: int, score_delta: int, answered: int = 1) -> Optional[User]:
+        """Атомарное приращение счёта и числа ответов (без чтения перед записью)"""
+        stmt = (
+            sa_update(User)
+            .where(User.telegram_id == telegram_id)
+            .values(
+                score=func.coalesce(User.score, 0) + score_delta,
+                questions_answered=func.coalesce(User.questions_answered, 0) + answered,
+                updated_at=func.now(),
             )
+        )
+        return await self._update_user_returning(stmt, telegram_id)
+
+    async def add_user_stats(self, user_id: int, category: str, level: str, score: int,
+                             answered: int = 1, day: Optional[date] = None) -> None:
+        """Приращение строки user_stats_rollup одним upsert.
+
+        Вызывается в единице работы записи ответа — итоги меняются в той же транзакции,
+        что и оценка, и не расходятся с answers.
+        """
+        stmt = dialect_insert(self.engine.dialect.name)(UserStatsRollup).values(
+            user_id=user_id, category=category, level=level,
+            day=day or datetime.now(timezone.utc).date(),
+            answered=answered, total_score=score,
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[UserStatsRollup.user_id, UserStatsRollup.category, UserStatsRollup.level, UserStatsRollup.day],
+            set_={
+                "answered": UserStatsRollup.answered + stmt.excluded.answered,
+                "total_score": UserStatsRollup.total_score + stmt.excluded.total_score,
+                "updated_at": func.now(),
+            },
+        )
+        async with self.get_session() as session:
+            await session.execute(stmt)
             await session.commit()
-            
-            if result.rowcount > 0:
-                return await self.get_user_by_telegram_id(telegram_id)
-            return None
+
+    async def _update_user_returning(self, stmt, telegram_id: int) -> Optional[User]:
+        """UPDATE ... RETURNING одним запросом; без поддержки RETURNING — перечитываем в той же транзакции"""
+        stmt = stmt.execution_options(synchronize_session=False)
+        async with self.get_session() as session:
+            if self.engine.dialect.update_returning:
+                orm_user = (await session.scalars(stmt.returning(User))).first()
+            else:
+                result = await session.execute(stmt)
+                orm_user = None
+                if result.rowcount:
+                    # populate_existing: внутри unit_of_work объект уже может быть в identity map
+                    orm_user = await session.scalar(
+                        select(User).where(User.telegram_id == telegram_id).execution_options(populate_existing=True)
+                    )
+            user = await self._publish_user(session, orm_user) if orm_user else None
+            await session.commit()
+            if user is not None:
+                self._cache_user(user)
+            return user
     
     async def get_question_by_id(self, question_id: int) -> Optional[Question]:
         """Получение вопроса по ID"""
@@ -178,32 +648,34 @@ class Database:
     
     async def get_random_question(self, level: str, category: str, 
                                  exclude_ids: List[int] = None) -> Optional[Question]:
-        """Получение случайного вопроса"""
-        async with self.get_session() as session:
-            query = (
-                "SELECT * FROM questions WHERE level = :level AND category = :category "
-                "ORDER BY RANDOM() LIMIT 1"
-            )
-            params = {"level": level, "category": category}
-            result = await session.execute(text(query), params)
-            return result.scalar_one_or_none()
+        """Получение случайного вопроса (через пул id, см. question_pool)"""
+        from .infrastructure.repositories import SqlAlchemyQuestionRepository
+        return await SqlAlchemyQuestionRepository().get_random(level, category, exclude_ids)
     
     async def create_answer(self, user_id: int, question_id: int, 
                            answer_text: str, answer_type: str, 
-                           voice_file_id: str = None) -> Answer:
-        """Создание ответа"""
+                           voice_file_id: str = None, score: Optional[int] = None,
+                           feedback: Optional[str] = None, job_id: Optional[int] = None) -> Answer:
+        """Создание ответа одним INSERT ... RETURNING (оценку можно записать сразу)"""
         async with self.get_session() as session:
-            answer = Answer(
+            stmt = insert(Answer).values(
                 user_id=user_id,
                 question_id=question_id,
                 answer_text=answer_text,
                 answer_type=answer_type,
-                voice_file_id=voice_file_id
-            )
-            session.add(answer)
+                voice_file_id=voice_file_id,
+                score=score,
+                feedback=feedback,
+                job_id=job_id,
+            ).returning(Answer)
+            answer = (await session.scalars(stmt)).one()
             await session.commit()
-            await session.refresh(answer)
             return answer
+
+    async def get_answer_by_job_id(self, job_id: int) -> Optional[Answer]:
+        """Ответ, записанный заданием очереди (если задание уже выполнялось)"""
+        async with self.get_session() as session:
+            return (await session.scalars(select(Answer).where(Answer.job_id == job_id))).first()
     
     async def update_answer_score(self, answer_id: int, score: int, 
                                  feedback: str) -> Optional[Answer]:
@@ -224,8 +696,8 @@ class Database:
             return None
     
     async def get_user_stats(self, user_id: int) -> Dict[str, Any]:
-        """Получение статистики пользователя"""
-        async with self.get_session() as session:
+        """Получение статистики пользователя (с реплики, если она есть)"""
+        async with self.read_session() as session:
             result = await session.execute(
                 text(
                     """
@@ -248,17 +720,121 @@ class Database:
             )
             
             row = result.fetchone()
-            if row:
-                return {
-                    "user_id": user_id,
-                    "total_score": row.total_score,
-                    "questions_answered": row.questions_answered,
-                    "average_score": row.average_score,
-                    "level": row.level,
-                    "category": row.category,
-                    "last_activity": row.last_activity
+            if not row:
+                return {}
+            return {
+                "user_id": user_id,
+                "total_score": row.total_score,
+                "questions_answered": row.questions_answered,
+                "average_score": row.average_score,
+                "level": row.level,
+                "category": row.category,
+                "last_activity": row.last_activity,
+                **await self._user_stats_breakdown(session, user_id),
+            }
+
+    async def _user_stats_breakdown(self, session: AsyncSession, user_id: int) -> Dict[str, Any]:
+        """Разбивка по категориям и последним дням из user_stats_rollup, без агрегатов по answers"""
+        rollup = UserStatsRollup
+        answered = func.sum(rollup.answered).label("answered")
+        total_score = func.sum(rollup.total_score).label("total_score")
+        by_category = await session.execute(
+            select(rollup.category, rollup.level, answered, total_score)
+            .where(rollup.user_id == user_id)
+            .group_by(rollup.category, rollup.level)
+            .order_by(rollup.category, rollup.level)
+        )
+        since = datetime.now(timezone.utc).date() - timedelta(days=STATS_RECENT_DAYS - 1)
+        by_day = await session.execute(
+            select(rollup.day, answered, total_score)
+            .where(rollup.user_id == user_id, rollup.day >= since)
+            .group_by(rollup.day)
+            .order_by(rollup.day)
+        )
+        return {
+            "categories": [
+                {
+                    "category": r.category,
+                    "level": r.level,
+                    "answered": r.answered,
+                    "total_score": r.total_score,
+                    "average_score": r.total_score / r.answered if r.answered else 0.0,
                 }
-            return {}
+                for r in by_category
+            ],
+            "recent_days": [{"day": r.day, "answered": r.answered, "total_score": r.total_score} for r in by_day],
+        }
+
+    async def rebuild_user_stats(self, batch_size: int = 1000) -> int:
+        """Пересборка user_stats_rollup из оценённых answers порциями пользователей.
+
+        Каждая порция — одна транзакция: строки её пользователей удаляются и собираются
+        заново INSERT ... SELECT, поэтому повторный запуск безопасен. Дни, ответы которых
+        уже перенесены в архив (answer_archive), не трогаются. Возвращает число строк.
+        """
+        from .answer_archive import answer_archive
+
+        rollup = UserStatsRollup
+        day = func.date(Answer.created_at)
+        since = await answer_archive.archived_until()
+        written, last_id = 0, 0
+        while True:
+            async with self.get_session() as session:
+                user_ids = (await session.scalars(
+                    select(User.id).where(User.id > last_id).order_by(User.id).limit(batch_size)
+                )).all()
+                if not user_ids:
+                    return written
+                first_id, last_id = user_ids[0], user_ids[-1]
+                stale = sa_delete(rollup).where(rollup.user_id.between(first_id, last_id))
+                totals = (
+                    select(Answer.user_id, Question.category, Question.level, day, func.count(), func.sum(Answer.score))
+                    .join(Question, Question.id == Answer.question_id)
+                    .where(Answer.user_id.between(first_id, last_id), Answer.score.is_not(None))
+                    .group_by(Answer.user_id, Question.category, Question.level, day)
+                )
+                if since is not None:
+                    stale = stale.where(rollup.day >= since)
+                    totals = totals.where(Answer.created_at >= datetime(since.year, since.month, since.day, tzinfo=timezone.utc))
+                await session.execute(stale)
+                result = await session.execute(
+                    insert(rollup).from_select(["user_id", "category", "level", "day", "answered", "total_score"], totals)
+                )
+                await session.commit()
+                written += max(result.rowcount or 0, 0)
+
+    async def get_cached_evaluation(self, key: str, max_age_seconds: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Получение закэшированной оценки по ключу"""
+        async with self.get_session() as session:
+            entry = await session.get(EvaluationCacheEntry, key)
+            if not entry:
+                return None
+            if max_age_seconds and entry.created_at:
+                created_at = entry.created_at
+                if created_at.tzinfo is None:
+                    created_at = created_at.replace(tzinfo=timezone.utc)
+                if datetime.now(timezone.utc) - created_at > timedelta(seconds=max_age_seconds):
+                    return None
+            return dict(entry.result)
+
+    async def put_cached_evaluation(self, key: str, question_id: int, result: Dict[str, Any]) -> None:
+        """Сохранение оценки в персистентный кэш"""
+        async with self.get_session() as session:
+            session.add(EvaluationCacheEntry(key=key, question_id=question_id, result=result))
+            try:
+                await session.commit()
+            except IntegrityError:
+                # параллельный процесс уже записал тот же ключ
+                await session.rollback()
+
+    async def delete_cached_evaluations(self, question_id: int) -> int:
+        """Удаление закэшированных оценок для вопроса"""
+        async with self.get_session() as session:
+            result = await session.execute(
+                sa_delete(EvaluationCacheEntry).where(EvaluationCacheEntry.question_id == question_id)
+            )
+            await session.commit()
+            return result.rowcount or 0
 
 
 # Глобальный экземпляр базы данных
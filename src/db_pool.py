@@ -0,0 +1,189 @@
+from __future__ import annotations
+import logging
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Dict, Optional, Tuple, Type
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+PRE_PING_POLICIES = ("always", "idle", "never")
+
+# Границы корзин гистограммы ожидания соединения, сек
+WAIT_BUCKETS: Tuple[float, ...] = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class WaitHistogram:
+    """Гистограмма времени ожидания соединения из пула (накопительная, как в Prometheus)"""
+
+    def __init__(self, buckets: Tuple[float, ...] = WAIT_BUCKETS) -> None:
+        self.buckets = buckets
+        self._counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self._counts[bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        cumulative: Dict[str, int] = {}
+        running = 0
+        for bound, n in zip(self.buckets, self._counts):
+            running += n
+            cumulative[f"le_{bound:g}"] = running
+        cumulative["le_inf"] = self.count
+        return {
+            "count": self.count,
+            "sum_seconds": round(self.total, 6),
+            "max_seconds": round(self.max, 6),
+            "buckets": cumulative,
+        }
+
+
+class PoolMetrics:
+    """Счётчики пула соединений одного движка.
+
+    Ожидание измеряется внутри Pool._do_get (см. instrumented_pool_class): это ровно то
+    время, которое запрос простоял в очереди за свободным соединением. Состояние под
+    threading.Lock — в режиме ``both`` бот и API живут в разных потоках.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.wait = WaitHistogram()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.pings = 0
+        self.ping_failures = 0
+
+    def record_wait(self, seconds: float, timed_out: bool = False) -> None:
+        with self._lock:
+            self.wait.observe(seconds)
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+
+    def incr(self, name: str) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def snapshot(self, pool: Optional[Pool] = None) -> Dict[str, Any]:
+        live: Dict[str, Any] = {}
+        if pool is not None:
+            live["pool_class"] = type(pool).__name__
+            # у StaticPool/NullPool (SQLite в памяти) этих счётчиков нет
+            for key, method in (("size", "size"), ("checked_out", "checkedout"), ("idle", "checkedin"), ("overflow", "overflow")):
+                if hasattr(pool, method):
+                    live[key] = getattr(pool, method)()
+        with self._lock:
+            return {
+                **live,
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "connects": self.connects,
+                "invalidations": self.invalidations,
+                "pings": self.pings,
+                "ping_failures": self.ping_failures,
+                "checkout_wait": self.wait.snapshot(),
+            }
+
+
+def instrumented_pool_class(metrics: PoolMetrics) -> Type[AsyncAdaptedQueuePool]:
+    """Подкласс пула, замеряющий ожидание свободного соединения.
+
+    Метрики привязаны к классу, а не к экземпляру: engine.dispose() пересоздаёт пул
+    через type(pool), и счётчики переживают пересоздание.
+    """
+
+    class InstrumentedAsyncAdaptedQueuePool(AsyncAdaptedQueuePool):
+        _metrics = metrics
+
+        def _do_get(self):
+            started = time.perf_counter()
+            try:
+                connection = super()._do_get()
+            except exc.TimeoutError:
+                self._metrics.record_wait(time.perf_counter() - started, timed_out=True)
+                raise
+            self._metrics.record_wait(time.perf_counter() - started)
+            return connection
+
+    return InstrumentedAsyncAdaptedQueuePool
+
+
+def engine_options(async_url: str, metrics: PoolMetrics) -> Dict[str, Any]:
+    """Параметры create_async_engine из настроек DB_POOL_* и DB_STATEMENT_CACHE_SIZE"""
+    policy = settings.db_pool_pre_ping
+    if policy not in PRE_PING_POLICIES:
+        raise ValueError(f"DB_POOL_PRE_PING must be one of {', '.join(PRE_PING_POLICIES)}, got {policy!r}")
+    options: Dict[str, Any] = {"echo": False, "pool_pre_ping": policy == "always"}
+    url = make_url(async_url)
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        # SQLite в памяти живёт в одном соединении (StaticPool): размеры пула не применимы
+        return options
+    options.update(
+        poolclass=instrumented_pool_class(metrics),
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+    )
+    if url.get_driver_name() == "asyncpg":
+        # 0 — для PgBouncer в режиме transaction, где подготовленные выражения не переживают транзакцию
+        options["connect_args"] = {
+            "statement_cache_size": settings.db_statement_cache_size,
+            "prepared_statement_cache_size": settings.db_statement_cache_size,
+        }
+    return options
+
+
+def instrument_engine(sync_engine, metrics: PoolMetrics) -> None:
+    """Подписывает метрики на события пула и включает pre-ping простаивавших соединений"""
+    idle_threshold = settings.db_pool_pre_ping_idle_seconds
+    ping_idle = settings.db_pool_pre_ping == "idle"
+
+    @event.listens_for(sync_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record) -> None:
+        metrics.incr("connects")
+        connection_record.info["checked_in_at"] = time.monotonic()
+
+    @event.listens_for(sync_engine, "checkin")
+    def _on_checkin(dbapi_connection, connection_record) -> None:
+        connection_record.info["checked_in_at"] = time.monotonic()
+
+    @event.listens_for(sync_engine, "invalidate")
+    def _on_invalidate(dbapi_connection, connection_record, exception) -> None:
+        metrics.incr("invalidations")
+
+    if not ping_idle:
+        return
+
+    @event.listens_for(sync_engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy) -> None:
+        # Пингуем только соединения, простоявшие дольше порога: под нагрузкой соединения
+        # оборачиваются быстро, и лишний round trip на каждый checkout не нужен
+        checked_in_at = connection_record.info.get("checked_in_at")
+        if checked_in_at is None or time.monotonic() - checked_in_at < idle_threshold:
+            return
+        metrics.incr("pings")
+        try:
+            sync_engine.dialect.do_ping(dbapi_connection)
+        except Exception as e:
+            if not sync_engine.dialect.is_disconnect(e, dbapi_connection, None):
+                raise
+            metrics.incr("ping_failures")
+            # пул выбросит соединение и повторит checkout с новым
+            raise exc.DisconnectionError("idle connection failed pre-ping") from e
@@ -1,4 +1,5 @@
 from __future__ import annotations
+import hashlib
 from dataclasses import dataclass, field
 from datetime import datetime
 from typing import List, Optional
@@ -83,6 +84,15 @@ class QuestionEntity:
         if self.points <= 0:
             raise ValueError("points must be > 0")
 
+    def content_hash(self) -> str:
+        return question_content_hash(self.title, self.content, self.level, self.category)
+
+
+def question_content_hash(title: str, content: str, level: str, category: str) -> str:
+    """Ключ идемпотентного импорта: один и тот же вопрос с точностью до пробелов даёт один хэш"""
+    parts = (" ".join((part or "").split()) for part in (title, content, level, category))
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
 
 def dto_to_question_entity(dto: DTOQuestion) -> QuestionEntity:
     # Безопасное извлечение атрибутов для случаев, когда dto может быть неполным объектом
@@ -1,8 +1,22 @@
 from __future__ import annotations
-from typing import Protocol, Optional, List, Dict, Any
+from contextlib import asynccontextmanager
+from typing import Protocol, Optional, List, Dict, Any, AsyncContextManager, AsyncIterator, Collection
 from datetime import datetime
 
-from ..models import User, Question, Answer
+from ..models import User, Question, QuestionPage, QuestionUpsertResult, Answer, EvaluationJob
+from .entities import QuestionEntity
+
+
+class UnitOfWorkFactory(Protocol):
+    def __call__(self, name: str = "default") -> AsyncContextManager[Any]:
+        """Блок, внутри которого репозитории делят одну сессию и фиксируют записи одним коммитом."""
+        ...
+
+
+@asynccontextmanager
+async def null_unit_of_work(name: str = "default") -> AsyncIterator[None]:
+    """Единица работы по умолчанию: каждый вызов репозитория — своя транзакция"""
+    yield None
 
 
 class UserRepository(Protocol):
@@ -15,7 +29,26 @@ class UserRepository(Protocol):
     async def update_by_telegram_id(self, telegram_id: int, **kwargs) -> Optional[User]:
         ...
 
+    async def increment_progress(self, telegram_id: int, score_delta: int, answered: int = 1) -> Optional[User]:
+        """score += score_delta, questions_answered += answered атомарно; возвращает обновлённого пользователя."""
+        ...
+
+    async def add_answer_stats(self, user_id: int, category: str, level: str, score: int) -> None:
+        """Учёт оценённого ответа в user_stats_rollup; вызывать в единице работы записи ответа."""
+        ...
+
     async def get_stats(self, user_id: int) -> Dict[str, Any]:
+        """Итоги пользователя и разбивка по категориям/дням (categories, recent_days)."""
+        ...
+
+    async def get_many_by_telegram_ids(self, telegram_ids: List[int]) -> Dict[int, User]:
+        ...
+
+    async def get_seen_questions(self, telegram_id: int, for_update: bool = False) -> Optional[bytes]:
+        """Сериализованные пройденные вопросы (seen_questions.encode_seen); None — ещё нет.
+
+        for_update — чтение перед записью blob: строка блокируется до конца транзакции.
+        """
         ...
 
 
@@ -23,7 +56,11 @@ class QuestionRepository(Protocol):
     async def get_by_id(self, question_id: int) -> Optional[Question]:
         ...
 
-    async def get_random(self, level: str, category: str, exclude_ids: Optional[List[int]] = None) -> Optional[Question]:
+    async def get_random(self, level: str, category: str, exclude_ids: Optional[Collection[int]] = None) -> Optional[Question]:
+        """exclude_ids — любой контейнер с быстрым ``in`` (set, RunBitmap), не только список."""
+        ...
+
+    async def get_many_by_ids(self, question_ids: List[int]) -> Dict[int, Question]:
         ...
 
     async def create(self, question: Question) -> Question:
@@ -53,12 +90,69 @@ class QuestionRepository(Protocol):
     ) -> int:
         ...
 
+    async def search_page(
+        self,
+        level: Optional[str] = None,
+        category: Optional[str] = None,
+        q: Optional[str] = None,
+        limit: int = 20,
+        cursor: Optional[str] = None,
+        with_total: bool = False,
+    ) -> QuestionPage:
+        """Страница поиска; cursor — next_cursor предыдущей страницы (pagination.InvalidCursor, если чужой)."""
+        ...
+
+    async def upsert_many(self, questions: List[QuestionEntity]) -> QuestionUpsertResult:
+        """Один многострочный INSERT ... ON CONFLICT (content_hash); вопросы уже провалидированы."""
+        ...
+
+    async def fill_content_hashes(self, batch_size: int = 1000) -> int:
+        """Проставляет content_hash вопросам, созданным до его появления; возвращает их число."""
+        ...
+
 
 class AnswerRepository(Protocol):
-    async def create(self, user_id: int, question_id: int, answer_text: str, answer_type: str, voice_file_id: Optional[str] = None) -> Answer:
+    async def create(self, user_id: int, question_id: int, answer_text: str, answer_type: str, voice_file_id: Optional[str] = None, score: Optional[int] = None, feedback: Optional[str] = None, job_id: Optional[int] = None) -> Answer:
+        """Оценённый ответ пишется одним INSERT, без последующего set_score.
+
+        job_id уникален: второй ответ того же задания очереди отклоняется БД.
+        """
+        ...
+
+    async def get_by_job_id(self, job_id: int) -> Optional[Answer]:
+        """Ответ, уже записанный заданием очереди."""
+        ...
+
+
+
+class JobRepository(Protocol):
+    async def enqueue(self, kind: str, telegram_id: int, question_id: int, payload: Dict[str, Any], notify: Optional[Dict[str, Any]] = None, max_attempts: int = 3) -> EvaluationJob:
+        ...
+
+    async def get(self, job_id: int) -> Optional[EvaluationJob]:
         ...
 
-    async def set_score(self, answer_id: int, score: int, feedback: str) -> Optional[Answer]:
+    async def claim(self, worker_id: str, limit: int = 1) -> List[EvaluationJob]:
+        """Забирает до limit готовых заданий в работу; одно задание не достаётся двум воркерам."""
+        ...
+
+    async def heartbeat(self, job_id: int, worker_id: str) -> bool:
+        """Продлевает lease задания; False — задание больше не принадлежит воркеру."""
+        ...
+
+    async def complete(self, job_id: int, result: Dict[str, Any], worker_id: Optional[str] = None) -> bool:
+        """worker_id — только если задание всё ещё у этого воркера; False — не записано."""
+        ...
+
+    async def fail(self, job_id: int, error: str, retry_at: Optional[datetime] = None, worker_id: Optional[str] = None) -> bool:
+        """retry_at — вернуть задание в очередь к этому времени, иначе пометить failed."""
+        ...
+
+    async def requeue_stale(self, lease_seconds: float) -> int:
+        """Возвращает в очередь задания, воркер которых пропал (lease истёк)."""
+        ...
+
+    async def count_by_status(self) -> Dict[str, int]:
         ...
 
 
@@ -66,6 +160,10 @@ class AIProvider(Protocol):
     async def evaluate(self, question: Question, user_answer: str, answer_type: str = "text", multi_agent_notes: Optional[str] = None) -> Dict[str, Any]:
         ...
 
+    def evaluate_stream(self, question: Question, user_answer: str, answer_type: str = "text", multi_agent_notes: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """События оценки по мере генерации: score / is_correct / feedback (delta), последним — result."""
+        ...
+
     async def transcribe(self, voice_file_path: str) -> str:
         ...
 
@@ -0,0 +1,185 @@
+from __future__ import annotations
+import asyncio
+import hashlib
+import logging
+import re
+import unicodedata
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from .cache_utils import LRUCache
+from .config import settings
+from .database import database
+from .models import Question
+from .prompt_context import build_prompt_context
+
+logger = logging.getLogger(__name__)
+
+_TRAILING_WS_RE = re.compile(r"[ \t\f\v]+$", re.MULTILINE)
+
+
+def normalize_answer(text: str) -> str:
+    """Нормализация ответа: переводы строк, юникод-форма (NFC) и пробелы в конце строк.
+
+    Регистр и отступы сохраняются: в коде и SQL они меняют смысл и оценку ответа.
+    """
+    text = unicodedata.normalize("NFC", text or "")
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return _TRAILING_WS_RE.sub("", text).rstrip("\n")
+
+
+def make_cache_key(question: Question, user_answer: str, answer_type: str, notes: Optional[str]) -> str:
+    """Content-addressed ключ: вопрос + его версия + ответ + тип + отпечаток рубрики/заметок"""
+    updated_at = getattr(question, "updated_at", None)
+    context_fp = hashlib.sha256(
+        build_prompt_context(question.category, notes).encode("utf-8")
+    ).hexdigest()
+    parts = [
+        str(question.id),
+        updated_at.isoformat() if updated_at else "",
+        normalize_answer(user_answer),
+        answer_type,
+        context_fp,
+    ]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class EvaluationCache:
+    """Двухуровневый кэш оценок (LRU в памяти + таблица в БД) с коалесцированием запросов"""
+
+    def __init__(self, maxsize: int, ttl_seconds: int, persistent: bool = True) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.persistent = persistent
+        self._memory: LRUCache[str, Tuple[int, Dict[str, Any]]] = LRUCache(maxsize, ttl=ttl_seconds)
+        # Future привязан к event loop, поэтому in-flight запросы разделяем по loop
+        self._inflight: Dict[Tuple[int, str], asyncio.Future] = {}
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def get_or_compute(
+        self,
+        question: Question,
+        user_answer: str,
+        answer_type: str,
+        notes: Optional[str],
+        compute: Callable[[], Awaitable[Dict[str, Any]]],
+        should_store: Callable[[Dict[str, Any]], bool] = lambda _: True,
+    ) -> Dict[str, Any]:
+        key = make_cache_key(question, user_answer, answer_type, notes)
+
+        cached = self._memory.get(key)
+        if cached is not None:
+            self.memory_hits += 1
+            return dict(cached[1])
+
+        inflight_key = (id(asyncio.get_running_loop()), key)
+        pending = self._inflight.get(inflight_key)
+        if pending is not None:
+            self.coalesced += 1
+            return dict(await asyncio.shield(pending))
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[inflight_key] = future
+        try:
+            result = await self._load_or_compute(key, question.id, compute, should_store)
+            future.set_result(result)
+            return dict(result)
+        except BaseException as e:
+            future.set_exception(e)
+            # исключение уже передано ожидающим; гасим предупреждение о "never retrieved"
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(inflight_key, None)
+
+    async def _load_or_compute(
+        self,
+        key: str,
+        question_id: int,
+        compute: Callable[[], Awaitable[Dict[str, Any]]],
+        should_store: Callable[[Dict[str, Any]], bool],
+    ) -> Dict[str, Any]:
+        stored = await self._load_persistent(key, question_id)
+        if stored is not None:
+            return stored
+
+        self.misses += 1
+        result = await compute()
+        if should_store(result):
+            await self._store(key, question_id, result)
+        return result
+
+    async def lookup(self, question: Question, user_answer: str, answer_type: str,
+                     notes: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Поиск готовой оценки без вычисления (для потокового режима)"""
+        key = make_cache_key(question, user_answer, answer_type, notes)
+        cached = self._memory.get(key)
+        if cached is not None:
+            self.memory_hits += 1
+            return dict(cached[1])
+        stored = await self._load_persistent(key, question.id)
+        if stored is None:
+            self.misses += 1
+            return None
+        return dict(stored)
+
+    async def store(self, question: Question, user_answer: str, answer_type: str,
+                    notes: Optional[str], result: Dict[str, Any]) -> None:
+        key = make_cache_key(question, user_answer, answer_type, notes)
+        await self._store(key, question.id, result)
+
+    async def _load_persistent(self, key: str, question_id: int) -> Optional[Dict[str, Any]]:
+        if not self._db_available():
+            return None
+        try:
+            stored = await database.get_cached_evaluation(key, self.ttl_seconds)
+        except Exception as e:
+            logger.warning(f"Evaluation cache read failed: {e}")
+            return None
+        if stored is not None:
+            self.db_hits += 1
+            self._memory.set(key, (question_id, stored))
+        return stored
+
+    async def _store(self, key: str, question_id: int, result: Dict[str, Any]) -> None:
+        self._memory.set(key, (question_id, dict(result)))
+        if self._db_available():
+            try:
+                await database.put_cached_evaluation(key, question_id, dict(result))
+            except Exception as e:
+                logger.warning(f"Evaluation cache write failed: {e}")
+
+    async def invalidate_question(self, question_id: int) -> None:
+        """Сброс всех оценок по вопросу (вызывается при правке/удалении через админку)"""
+        for key, (qid, _) in self._memory.items():
+            if qid == question_id:
+                self._memory.pop(key)
+        if self._db_available():
+            try:
+                await database.delete_cached_evaluations(question_id)
+            except Exception as e:
+                logger.warning(f"Evaluation cache invalidation failed: {e}")
+
+    def clear(self) -> None:
+        self._memory.clear()
+
+    def _db_available(self) -> bool:
+        return self.persistent and database.session_maker is not None
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.memory_hits + self.db_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_ratio": round((self.memory_hits + self.db_hits) / lookups, 4) if lookups else 0.0,
+            "memory": self._memory.stats(),
+        }
+
+
+evaluation_cache = EvaluationCache(
+    maxsize=settings.eval_cache_size,
+    ttl_seconds=settings.eval_cache_ttl_seconds,
+)
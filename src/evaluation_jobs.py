@@ -0,0 +1,247 @@
+from __future__ import annotations
+import asyncio
+import logging
+import os
+import socket
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional, Set
+
+import aiohttp
+
+from .config import settings
+from .domain.ports import JobRepository
+from .models import EvaluationJob
+from .provider_errors import backoff_delay
+
+logger = logging.getLogger(__name__)
+
+NEXT_QUESTION_KEYBOARD = {"inline_keyboard": [[{"text": "🎯 Следующий вопрос", "callback_data": "get_question"}]]}
+
+
+def format_points(evaluation: dict) -> str:
+    """Сильные стороны и зоны роста из оценки (если модель их вернула)"""
+    lines = []
+    if evaluation.get("strengths"):
+        lines.append("👍 Сильные стороны:\n" + "\n".join(f"• {s}" for s in evaluation["strengths"]))
+    if evaluation.get("improvements"):
+        lines.append("📈 Что улучшить:\n" + "\n".join(f"• {s}" for s in evaluation["improvements"]))
+    return "\n\n".join(lines) + "\n" if lines else ""
+
+
+def format_evaluation_message(evaluation: dict, points: int) -> str:
+    """Итоговое сообщение бота с оценкой; для голосового ответа — с распознанным текстом"""
+    transcript = ""
+    if evaluation.get("transcript") is not None:
+        transcript = f'🎤 Распознанный текст: "{evaluation["transcript"]}"\n\n'
+    # is_correct нет у результата, восстановленного из уже записанного ответа
+    correctness = ""
+    if evaluation.get("is_correct") is not None:
+        correctness = f"✅ Правильность: {'Да' if evaluation['is_correct'] else 'Нет'}\n"
+    return f"""
+📊 Результат оценки:
+
+{transcript}🏆 Получено баллов: {evaluation["score"]}/{points}
+{correctness}
+💬 Обратная связь:
+{evaluation["feedback"]}
+
+{format_points(evaluation)}🎯 Хотите еще один вопрос?
+            """
+
+
+class TelegramJobNotifier:
+    """Сообщает результат задания в чат: правит сообщение «ответ принят», которое оставил бот"""
+
+    def __init__(self, bot_token: Optional[str] = None, api_url: Optional[str] = None) -> None:
+        self.bot_token = bot_token or settings.telegram_bot_token
+        self.api_url = api_url or settings.telegram_api_url
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=15))
+        return self._session
+
+    async def notify(self, job: EvaluationJob) -> None:
+        target = job.notify or {}
+        if not target.get("chat_id"):
+            return
+        if job.status == "done":
+            text = format_evaluation_message(job.result or {}, target.get("points", 0))
+            markup: Optional[Dict[str, Any]] = NEXT_QUESTION_KEYBOARD
+        else:
+            text = "❌ Ошибка при обработке ответа"
+            markup = None
+        body: Dict[str, Any] = {"chat_id": target["chat_id"], "text": text[:4096]}
+        if markup:
+            body["reply_markup"] = markup
+        method = "sendMessage"
+        if target.get("message_id"):
+            method = "editMessageText"
+            body["message_id"] = target["message_id"]
+        async with self.session.post(f"{self.api_url}/bot{self.bot_token}/{method}", json=body) as response:
+            if response.status != 200:
+                logger.warning(f"Telegram {method} for job {job.id} failed: {response.status} {await response.text()}")
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+
+class EvaluationWorker:
+    """Забирает задания из очереди и выполняет их, не более concurrency одновременно.
+
+    Воркеров можно запускать сколько угодно: задание достаётся одному из них
+    (см. JobRepository.claim), а задания упавшего воркера возвращаются в очередь
+    по истечении lease. Пока задание выполняется, воркер продлевает lease; завершить
+    его может только текущий владелец. Ответ записывается с job_id, поэтому повтор
+    задания (backoff, истёкший lease, сбой complete) не оценивает и не засчитывает
+    ответ второй раз.
+    """
+
+    def __init__(self, jobs: JobRepository, answers, notifier: Optional[TelegramJobNotifier] = None,
+                 concurrency: Optional[int] = None, poll_interval: Optional[float] = None,
+                 lease_seconds: Optional[float] = None, worker_id: Optional[str] = None,
+                 bot_token: Optional[str] = None) -> None:
+        self.jobs = jobs
+        self.answers = answers  # AnswerAppService: тот же конвейер, что и у синхронных эндпоинтов
+        self.notifier = notifier
+        self.bot_token = bot_token if bot_token is not None else settings.telegram_bot_token
+        self.concurrency = max(1, concurrency or settings.eval_worker_concurrency)
+        self.poll_interval = poll_interval if poll_interval is not None else settings.eval_worker_poll_interval
+        self.lease_seconds = lease_seconds if lease_seconds is not None else settings.eval_job_lease_seconds
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self._tasks: Set[asyncio.Task] = set()
+        self._next_requeue_at = 0.0
+        self.processed = 0
+        self.failed = 0
+        self.retried = 0
+
+    async def run(self, stop: Optional[asyncio.Event] = None) -> None:
+        stop = stop or asyncio.Event()
+        logger.info(f"Evaluation worker {self.worker_id} started (concurrency={self.concurrency})")
+        try:
+            while not stop.is_set():
+                claimed = await self.poll()
+                if claimed:
+                    continue
+                # очередь пуста или все слоты заняты: ждём освобождения слота, новых заданий или остановки
+                waiters = [asyncio.ensure_future(stop.wait())]
+                waiters.extend(self._tasks)
+                await asyncio.wait(waiters, timeout=self.poll_interval, return_when=asyncio.FIRST_COMPLETED)
+                waiters[0].cancel()
+        finally:
+            if self._tasks:
+                logger.info(f"Evaluation worker {self.worker_id}: waiting for {len(self._tasks)} jobs")
+                await asyncio.gather(*self._tasks, return_exceptions=True)
+            logger.info(f"Evaluation worker {self.worker_id} stopped")
+
+    async def poll(self) -> int:
+        """Один шаг цикла: вернуть зависшие задания и забрать новые в свободные слоты"""
+        loop = asyncio.get_running_loop()
+        if loop.time() >= self._next_requeue_at:
+            self._next_requeue_at = loop.time() + max(self.lease_seconds / 4, self.poll_interval)
+            requeued = await self.jobs.requeue_stale(self.lease_seconds)
+            if requeued:
+                logger.warning(f"Requeued {requeued} jobs with expired lease")
+        free = self.concurrency - len(self._tasks)
+        if free <= 0:
+            return 0
+        jobs = await self.jobs.claim(self.worker_id, free)
+        for job in jobs:
+            task = asyncio.ensure_future(self.execute(job))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return len(jobs)
+
+    async def drain(self) -> None:
+        """Выполняет задания, пока очередь не опустеет (для тестов и разовых прогонов)"""
+        while await self.poll() or self._tasks:
+            if self._tasks:
+                await asyncio.wait(set(self._tasks), return_when=asyncio.FIRST_COMPLETED)
+
+    async def process(self, job: EvaluationJob) -> Dict[str, Any]:
+        answer = await self.answers.recorded(job.id)
+        if answer is not None:
+            # прошлая попытка записала ответ, но не успела завершить задание
+            logger.info(f"Job {job.id}: answer {answer.id} already recorded")
+            return {"answer_id": answer.id, "score": answer.score, "feedback": answer.feedback, "is_correct": None}
+        if job.kind == "voice":
+            answer, evaluation = await self.answers.answer_voice(
+                job.telegram_id, job.question_id, job.payload["voice_file_id"], self.bot_token, job_id=job.id
+            )
+        else:
+            answer, evaluation = await self.answers.answer_text(
+                job.telegram_id, job.question_id, job.payload["answer_text"], job_id=job.id
+            )
+        return {"answer_id": answer.id, **evaluation}
+
+    async def execute(self, job: EvaluationJob) -> None:
+        heartbeat = asyncio.ensure_future(self._heartbeat(job.id))
+        try:
+            result = await self.process(job)
+        except Exception as e:
+            heartbeat.cancel()
+            await self._handle_failure(job, e)
+            return
+        heartbeat.cancel()
+        try:
+            completed = await self.jobs.complete(job.id, result, worker_id=self.worker_id)
+        except Exception as e:
+            # ответ записан; задание вернётся в очередь по lease и завершится без новой оценки
+            logger.error(f"Job {job.id}: failed to mark done: {e}")
+            return
+        if not completed:
+            logger.warning(f"Job {job.id}: lease lost, result left to the new owner")
+            return
+        self.processed += 1
+        await self._notify(job.model_copy(update={"status": "done", "result": result}))
+
+    async def _heartbeat(self, job_id: int) -> None:
+        """Продлевает lease, пока задание выполняется (оценка может идти дольше lease)"""
+        while True:
+            await asyncio.sleep(max(self.lease_seconds / 3, 1.0))
+            try:
+                if not await self.jobs.heartbeat(job_id, self.worker_id):
+                    logger.warning(f"Job {job_id}: lease lost")
+                    return
+            except Exception as e:
+                logger.warning(f"Job {job_id}: heartbeat failed: {e}")
+
+    async def _handle_failure(self, job: EvaluationJob, error: Exception) -> None:
+        # ValueError — нет пользователя/вопроса или не удалось скачать голосовое: повтор не поможет
+        retry = not isinstance(error, ValueError) and job.attempts < job.max_attempts
+        logger.error(f"Job {job.id} attempt {job.attempts}/{job.max_attempts} failed: {error}")
+        try:
+            if retry:
+                retry_at = datetime.now(timezone.utc) + timedelta(seconds=backoff_delay(job.attempts))
+                if await self.jobs.fail(job.id, str(error), retry_at, worker_id=self.worker_id):
+                    self.retried += 1
+                return
+            if not await self.jobs.fail(job.id, str(error), worker_id=self.worker_id):
+                return
+        except Exception as e:
+            # задание вернётся в очередь по истечении lease
+            logger.error(f"Job {job.id}: failed to record failure: {e}")
+            return
+        self.failed += 1
+        await self._notify(job.model_copy(update={"status": "failed", "error": str(error)}))
+
+    async def _notify(self, job: EvaluationJob) -> None:
+        if self.notifier is None or not job.notify:
+            return
+        try:
+            await self.notifier.notify(job)
+        except Exception as e:
+            # результат уже сохранён и доступен через GET /jobs/{id}
+            logger.warning(f"Job {job.id} notification failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "worker_id": self.worker_id,
+            "in_flight": len(self._tasks),
+            "processed": self.processed,
+            "failed": self.failed,
+            "retried": self.retried,
+        }
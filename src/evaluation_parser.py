@@ -0,0 +1,211 @@
+from __future__ import annotations
+import json
+import re
+import threading
+from typing import Any, Dict, List, Optional
+
+_FENCE_RE = re.compile(r"```(?:json|JSON)?\s*")
+_TRAILING_COMMA_RE = re.compile(r",(\s*[}\]])")
+_PY_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_PY_LITERAL_RE = re.compile(r"\b(True|False|None)\b")
+_NUMBER_RE = re.compile(r"-?\d+(?:[.,]\d+)?")
+# типографские кавычки заменяем только на границах токенов: внутри текста отзыва они законны
+_SMART_OPEN_RE = re.compile(r'([{\[,:]\s*)[“”„]')
+_SMART_CLOSE_RE = re.compile(r'[“”](\s*[:,}\]])')
+
+_TRUE_WORDS = {"true", "yes", "да", "верно", "1"}
+
+
+class EvaluationParseError(ValueError):
+    """Ответ модели не удалось привести к оценке; повтор того же запроса не поможет"""
+
+
+def extract_json_object(text: str) -> str:
+    """Первый сбалансированный JSON-объект из ответа модели.
+
+    Markdown-ограждения и текст вокруг объекта отбрасываются. Если ответ обрезан
+    (закончились токены), недостающие кавычки и скобки дописываются.
+    """
+    text = _FENCE_RE.sub("", text or "")
+    start = text.find("{")
+    if start < 0:
+        raise EvaluationParseError("no JSON object in model output")
+
+    stack: List[str] = []
+    in_string = False
+    escaped = False
+    for pos in range(start, len(text)):
+        ch = text[pos]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]":
+            if stack:
+                stack.pop()
+            if not stack:
+                return text[start:pos + 1]
+
+    tail = text[start:].rstrip()
+    if escaped:
+        tail = tail[:-1]
+    if in_string:
+        tail += '"'
+    tail = tail.rstrip().rstrip(",:")
+    return tail + "".join(reversed(stack))
+
+
+def _split_strings(text: str) -> List[str]:
+    """Текст по частям: чётные — вне строк JSON, нечётные — строки вместе с кавычками"""
+    parts: List[str] = []
+    start = 0
+    in_string = False
+    escaped = False
+    for pos, ch in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                parts.append(text[start:pos + 1])
+                start = pos + 1
+                in_string = False
+        elif ch == '"':
+            parts.append(text[start:pos])
+            start = pos
+            in_string = True
+    parts.append(text[start:])
+    return parts
+
+
+def _repair_tokens(segment: str) -> str:
+    segment = _TRAILING_COMMA_RE.sub(r"\1", segment)
+    return _PY_LITERAL_RE.sub(lambda m: _PY_LITERALS[m.group(1)], segment)
+
+
+def repair_json(raw: str) -> str:
+    """Исправление типичных дефектов: типографские кавычки, висячие запятые, литералы Python.
+
+    Запятые и литералы правятся только вне строк: «вернёт None» в отзыве остаётся как есть.
+    """
+    repaired = _SMART_OPEN_RE.sub(r'\1"', raw)
+    repaired = _SMART_CLOSE_RE.sub(r'"\1', repaired)
+    parts = _split_strings(repaired)
+    return "".join(_repair_tokens(p) if i % 2 == 0 else p for i, p in enumerate(parts))
+
+
+class ParseStats:
+    """Счётчики разбора ответов модели (отдельно от сбоев транспорта)"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.parsed = 0
+        self.repaired = 0
+        self.clamped = 0
+        self.failures = 0
+
+    def add(self, field: str) -> None:
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "parsed": self.parsed,
+            "repaired": self.repaired,
+            "clamped": self.clamped,
+            "failures": self.failures,
+        }
+
+
+parse_stats = ParseStats()
+
+
+def parse_evaluation(text: str, max_score: Optional[int] = None) -> Dict[str, Any]:
+    """Разбор и валидация оценки: score, feedback, is_correct, strengths, improvements"""
+    try:
+        raw = extract_json_object(text)
+        try:
+            data = json.loads(raw)
+        except json.JSONDecodeError:
+            data = json.loads(repair_json(raw))
+            parse_stats.add("repaired")
+        if not isinstance(data, dict):
+            raise EvaluationParseError("model output is not a JSON object")
+        result = _validate(data, max_score)
+    except EvaluationParseError:
+        parse_stats.add("failures")
+        raise
+    except (json.JSONDecodeError, TypeError, ValueError) as e:
+        parse_stats.add("failures")
+        raise EvaluationParseError(f"invalid evaluation JSON: {e}") from e
+    parse_stats.add("parsed")
+    return result
+
+
+def _validate(data: Dict[str, Any], max_score: Optional[int]) -> Dict[str, Any]:
+    score = _coerce_score(data.get("score"))
+    if score is None:
+        raise EvaluationParseError("evaluation has no numeric score")
+    upper = max_score if max_score is not None and max_score >= 0 else None
+    clamped = max(0, score if upper is None else min(score, upper))
+    if clamped != score:
+        parse_stats.add("clamped")
+
+    feedback = data.get("feedback")
+    if not isinstance(feedback, str):
+        feedback = "" if feedback is None else str(feedback)
+
+    is_correct = _coerce_bool(data.get("is_correct"))
+    if is_correct is None:
+        # модель не указала вердикт — считаем верным ответ не ниже половины максимума
+        is_correct = upper is not None and upper > 0 and clamped * 2 >= upper
+
+    return {
+        "score": clamped,
+        "feedback": feedback.strip(),
+        "is_correct": is_correct,
+        "strengths": _coerce_list(data.get("strengths")),
+        "improvements": _coerce_list(data.get("improvements")),
+    }
+
+
+def _coerce_score(value: Any) -> Optional[int]:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return int(round(value))
+    if isinstance(value, str):
+        # "7", "7.5", "7/10", "7 баллов"
+        m = _NUMBER_RE.search(value)
+        if m:
+            return int(round(float(m.group(0).replace(",", "."))))
+    return None
+
+
+def _coerce_bool(value: Any) -> Optional[bool]:
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return bool(value)
+    if isinstance(value, str):
+        return value.strip().lower() in _TRUE_WORDS
+    return None
+
+
+def _coerce_list(value: Any) -> List[str]:
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = [value]
+    if not isinstance(value, list):
+        return []
+    return [str(item).strip() for item in value if str(item).strip()]
@@ -0,0 +1,196 @@
+from __future__ import annotations
+import hashlib
+import logging
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, List, Optional
+
+from .cache_utils import LRUCache
+from .config import settings
+from .domain.rubrics import build_rubric_text
+from .models import Question
+from .prompt_context import build_prompt_context
+from .token_budget import BudgetSection, completion_budget, count_tokens, fit_sections, truncate_to_tokens
+
+logger = logging.getLogger(__name__)
+
+
+# Статическая часть: одинакова для всех запросов и идёт первой,
+# чтобы кэш промптов у провайдера переиспользовал максимально длинный префикс.
+EVALUATION_INSTRUCTIONS = """Ты эксперт по техническим собеседованиям. Оцени ответ кандидата на вопрос.
+Ответ кандидата придёт отдельным сообщением пользователя после материалов вопроса.
+
+Верни JSON в формате:
+{
+    "score": число_баллов,
+    "feedback": "подробная обратная связь на русском языке",
+    "is_correct": true/false,
+    "strengths": ["сильные стороны ответа"],
+    "improvements": ["что можно улучшить"]
+}"""
+
+
+@dataclass(frozen=True)
+class EvaluationPrompt:
+    """Собранный промпт: стабильный system-префикс + ответ кандидата в конце"""
+    system: str
+    user: str
+    prefix_key: str
+    max_score: Optional[int] = None
+    max_tokens: int = 1000
+    estimated_tokens: int = 0
+
+    @property
+    def messages(self) -> List[Dict[str, str]]:
+        return [
+            {"role": "system", "content": self.system},
+            {"role": "user", "content": self.user},
+        ]
+
+
+def render_question_section(question: Question, notes: Optional[str],
+                            budget: Optional[int] = None) -> str:
+    """Материалы вопроса в фиксированном порядке: вопрос, эталон, объяснение, рубрика, заметки.
+
+    При заданном ``budget`` (токены) эталон, объяснение и заметки экспертов сокращаются
+    в порядке возрастания важности: сначала заметки, затем объяснение, затем эталон.
+    """
+    header = (
+        f"Вопрос: {question.title}\n"
+        f"Содержание: {question.content}\n"
+        f"Уровень сложности: {question.level}\n"
+        f"Категория: {question.category}\n"
+        f"Максимальный балл: {question.points}"
+    )
+    criteria = (
+        "Оцени ответ по следующим критериям:\n"
+        f"1. Точность и полнота ответа (0-{question.points // 2} баллов)\n"
+        f"2. Понимание концепций (0-{question.points // 4} баллов)\n"
+        f"3. Качество объяснения (0-{question.points // 4} баллов)"
+    )
+    reference = str(question.correct_answer or "")
+    explanation = question.explanation or "Нет объяснения"
+    if budget is not None:
+        fixed = count_tokens(header) + count_tokens(criteria) + count_tokens(build_rubric_text(question.category))
+        fitted = fit_sections(
+            [
+                BudgetSection("notes", notes or "", priority=0),
+                BudgetSection("explanation", explanation, priority=1, min_tokens=100),
+                BudgetSection("reference", reference, priority=2, min_tokens=300),
+            ],
+            budget - fixed,
+        )
+        reference, explanation, notes = fitted["reference"], fitted["explanation"], fitted["notes"] or None
+
+    parts = [header, f"Правильный ответ: {reference}", f"Объяснение: {explanation}"]
+    context = build_prompt_context(question.category, notes)
+    if context:
+        parts.append(context)
+    parts.append(criteria)
+    return "\n\n".join(parts)
+
+
+class EvaluationPromptBuilder:
+    """Сборка промптов оценки с кэшем отрендеренного префикса по вопросу"""
+
+    def __init__(self, maxsize: int = 1024) -> None:
+        self._prefixes: LRUCache[tuple, tuple[str, str, int]] = LRUCache(maxsize)
+        self.truncated_answers = 0
+
+    def build(self, question: Question, user_answer: str, answer_type: str = "text",
+              notes: Optional[str] = None) -> EvaluationPrompt:
+        system, prefix_key, prefix_tokens = self._prefix(question, notes)
+        # префикс не зависит от ответа (иначе сломается кэш промптов) — ответу достаётся остаток бюджета
+        answer_budget = max(settings.eval_answer_min_tokens, settings.eval_prompt_token_budget - prefix_tokens)
+        answer = truncate_to_tokens(user_answer, answer_budget, keep_tail=True)
+        if answer is not user_answer:
+            self.truncated_answers += 1
+        user = f"Тип ответа: {answer_type}\nОтвет кандидата:\n{answer}"
+        return EvaluationPrompt(
+            system=system,
+            user=user,
+            prefix_key=prefix_key,
+            max_score=question.points,
+            max_tokens=completion_budget(question.points),
+            estimated_tokens=prefix_tokens + count_tokens(user),
+        )
+
+    def _prefix(self, question: Question, notes: Optional[str]) -> tuple[str, str, int]:
+        updated_at = getattr(question, "updated_at", None)
+        notes_fp = hashlib.sha1((notes or "").encode("utf-8")).hexdigest()
+        cache_key = (question.id, updated_at.isoformat() if updated_at else "", notes_fp)
+        cached = self._prefixes.get(cache_key)
+        if cached is not None:
+            return cached
+        prefix_budget = settings.eval_prompt_token_budget - settings.eval_answer_min_tokens
+        system = EVALUATION_INSTRUCTIONS + "\n\n" + render_question_section(
+            question, notes, prefix_budget - count_tokens(EVALUATION_INSTRUCTIONS)
+        )
+        rendered = (system, hashlib.sha256(system.encode("utf-8")).hexdigest()[:32], count_tokens(system))
+        self._prefixes.set(cache_key, rendered)
+        return rendered
+
+    def invalidate(self, question_id: int) -> None:
+        for key, _ in self._prefixes.items():
+            if key[0] == question_id:
+                self._prefixes.pop(key)
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._prefixes.stats(), "truncated_answers": self.truncated_answers}
+
+
+class PromptUsageStats:
+    """Счётчики токенов промпта, в т.ч. закэшированных провайдером"""
+
+    def __init__(self, recent_size: int = 200) -> None:
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.cached_prompt_tokens = 0
+        self.completion_tokens = 0
+        self.total_latency = 0.0
+        self.max_prompt_tokens = 0
+        # последние вызовы: фактические токены против оценки бюджета
+        self.recent: Deque[Dict[str, Any]] = deque(maxlen=recent_size)
+
+    def record(self, provider: str, prompt_tokens: int, cached_tokens: int,
+               completion_tokens: int, latency: float, estimated_tokens: Optional[int] = None) -> None:
+        self.calls += 1
+        self.prompt_tokens += prompt_tokens
+        self.cached_prompt_tokens += cached_tokens
+        self.completion_tokens += completion_tokens
+        self.total_latency += latency
+        self.max_prompt_tokens = max(self.max_prompt_tokens, prompt_tokens)
+        self.recent.append({
+            "provider": provider,
+            "prompt_tokens": prompt_tokens,
+            "estimated_tokens": estimated_tokens,
+            "completion_tokens": completion_tokens,
+            "latency": round(latency, 3),
+        })
+        logger.debug(
+            f"{provider} usage: prompt={prompt_tokens} (estimated {estimated_tokens}) cached={cached_tokens} "
+            f"completion={completion_tokens} latency={latency:.2f}s"
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "prompt_tokens": self.prompt_tokens,
+            "cached_prompt_tokens": self.cached_prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cached_ratio": round(self.cached_prompt_tokens / self.prompt_tokens, 4) if self.prompt_tokens else 0.0,
+            "avg_latency": round(self.total_latency / self.calls, 3) if self.calls else 0.0,
+            "max_prompt_tokens": self.max_prompt_tokens,
+            "estimate_ratio": self._estimate_ratio(),
+        }
+
+    def _estimate_ratio(self) -> float:
+        """Во сколько раз оценка бюджета отличается от реального счёта провайдера"""
+        measured = [r for r in self.recent if r["estimated_tokens"] and r["prompt_tokens"]]
+        if not measured:
+            return 0.0
+        return round(sum(r["estimated_tokens"] for r in measured) / sum(r["prompt_tokens"] for r in measured), 3)
+
+
+prompt_builder = EvaluationPromptBuilder()
+prompt_usage = PromptUsageStats()
@@ -0,0 +1,106 @@
+from __future__ import annotations
+import re
+from typing import Any, Dict, List, Optional
+
+from .evaluation_parser import EvaluationParseError, parse_evaluation
+
+_SCORE_RE = re.compile(r'"score"\s*:\s*(-?\d+(?:\.\d+)?)\s*[,}\s]')
+_IS_CORRECT_RE = re.compile(r'"is_correct"\s*:\s*(true|false)')
+_FEEDBACK_RE = re.compile(r'"feedback"\s*:\s*"')
+
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class IncrementalEvaluationParser:
+    """Инкрементальный разбор JSON-оценки из потоковой генерации.
+
+    По мере поступления чанков отдаёт события ``score``, ``is_correct`` и приращения
+    ``feedback``, не дожидаясь конца JSON. Итоговый объект собирает ``finish()``.
+    max_score — баллы вопроса: событие ``score`` приводится к [0, max_score], как и итог.
+    """
+
+    def __init__(self, max_score: Optional[int] = None) -> None:
+        self.max_score = max_score
+        self.buffer = ""
+        self.score: Optional[int] = None
+        self.is_correct: Optional[bool] = None
+        self.feedback = ""
+        self._feedback_pos: Optional[int] = None
+        self._feedback_done = False
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        self.buffer += chunk
+        events: List[Dict[str, Any]] = []
+
+        if self.score is None:
+            m = _SCORE_RE.search(self.buffer)
+            if m:
+                self.score = self._clamp(int(float(m.group(1))))
+                events.append({"type": "score", "score": self.score})
+
+        if self.is_correct is None:
+            m = _IS_CORRECT_RE.search(self.buffer)
+            if m:
+                self.is_correct = m.group(1) == "true"
+                events.append({"type": "is_correct", "is_correct": self.is_correct})
+
+        if self._feedback_pos is None:
+            m = _FEEDBACK_RE.search(self.buffer)
+            if m:
+                self._feedback_pos = m.end()
+        if self._feedback_pos is not None and not self._feedback_done:
+            delta = self._consume_feedback()
+            if delta:
+                self.feedback += delta
+                events.append({"type": "feedback", "delta": delta})
+        return events
+
+    def _consume_feedback(self) -> str:
+        """Декодирует доступную часть JSON-строки feedback, не трогая незавершённые escape-последовательности"""
+        out: List[str] = []
+        pos = self._feedback_pos
+        buf = self.buffer
+        while pos < len(buf):
+            ch = buf[pos]
+            if ch == '"':
+                self._feedback_done = True
+                pos += 1
+                break
+            if ch == "\\":
+                if pos + 1 >= len(buf):
+                    break
+                esc = buf[pos + 1]
+                if esc == "u":
+                    if pos + 6 > len(buf):
+                        break
+                    try:
+                        out.append(chr(int(buf[pos + 2:pos + 6], 16)))
+                    except ValueError:
+                        pass
+                    pos += 6
+                    continue
+                out.append(_ESCAPES.get(esc, esc))
+                pos += 2
+                continue
+            out.append(ch)
+            pos += 1
+        self._feedback_pos = pos
+        return "".join(out)
+
+    def _clamp(self, score: int) -> int:
+        return max(0, score if self.max_score is None else min(score, self.max_score))
+
+    def finish(self) -> Dict[str, Any]:
+        """Полный разбор накопленного ответа; при неполном JSON — то, что удалось извлечь"""
+        try:
+            return parse_evaluation(self.buffer, self.max_score)
+        except EvaluationParseError:
+            if self.score is None:
+                raise
+        return {
+            "score": self.score,
+            "feedback": self.feedback,
+            "is_correct": bool(self.is_correct),
+            "strengths": [],
+            "improvements": [],
+        }
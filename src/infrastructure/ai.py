@@ -1,22 +1,78 @@
 from __future__ import annotations
-from typing import Optional, Dict, Any
+import logging
+from typing import Optional, Dict, Any, AsyncIterator
 
-from ..services import get_ai_service
+from ..config import settings
+from ..evaluation_cache import evaluation_cache
+from ..evaluation_stream import IncrementalEvaluationParser
+from ..services import get_ai_service, EVALUATION_ERROR_FEEDBACK
 from ..models import Question
 from ..domain.ports import AIProvider
 
+logger = logging.getLogger(__name__)
+
 
 class DefaultAIProvider(AIProvider):
     def __init__(self) -> None:
         self._svc = get_ai_service()
 
     async def evaluate(self, question: Question, user_answer: str, answer_type: str = "text", multi_agent_notes: Optional[str] = None) -> Dict[str, Any]:
+        if not settings.eval_cache_enabled:
+            return await self._evaluate(question, user_answer, answer_type, multi_agent_notes)
+        return await evaluation_cache.get_or_compute(
+            question,
+            user_answer,
+            answer_type,
+            multi_agent_notes,
+            lambda: self._evaluate(question, user_answer, answer_type, multi_agent_notes),
+            should_store=lambda result: result["feedback"] != EVALUATION_ERROR_FEEDBACK,
+        )
+
+    async def evaluate_stream(self, question: Question, user_answer: str, answer_type: str = "text", multi_agent_notes: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        if settings.eval_cache_enabled:
+            cached = await evaluation_cache.lookup(question, user_answer, answer_type, multi_agent_notes)
+            if cached is not None:
+                yield {"type": "result", **cached}
+                return
+
+        parser = IncrementalEvaluationParser(question.points)
+        emitted = False
+        try:
+            async for chunk in self._svc.stream_evaluation(question, user_answer, answer_type, multi_agent_notes):
+                for event in parser.feed(chunk):
+                    emitted = True
+                    yield event
+            result = parser.finish()
+        except Exception as e:
+            if parser.buffer:
+                logger.warning(f"Evaluation stream failed mid-way, falling back: {e}")
+            else:
+                logger.warning(f"Evaluation stream failed, falling back: {e}")
+            if emitted:
+                # частичные score/feedback не относятся к оценке, пришедшей без стрима
+                yield {"type": "reset"}
+            result = await self._evaluate(question, user_answer, answer_type, multi_agent_notes)
+
+        if settings.eval_cache_enabled and result["feedback"] != EVALUATION_ERROR_FEEDBACK:
+            await evaluation_cache.store(question, user_answer, answer_type, multi_agent_notes, result)
+        yield {"type": "result", **result}
+
+    async def _evaluate(self, question: Question, user_answer: str, answer_type: str, multi_agent_notes: Optional[str]) -> Dict[str, Any]:
         evaluation = await self._svc.evaluate_answer(question, user_answer, answer_type, multi_agent_notes)
         return {
             "score": evaluation.score,
             "feedback": evaluation.feedback,
             "is_correct": evaluation.is_correct,
+            "strengths": evaluation.strengths,
+            "improvements": evaluation.improvements,
         }
 
     async def transcribe(self, voice_file_path: str) -> str:
         return await self._svc.transcribe_voice(voice_file_path)
+
+    async def close(self) -> None:
+        await self._svc.close()
+
+    def stats(self) -> Dict[str, Any]:
+        stats = getattr(self._svc, "stats", None)
+        return stats() if callable(stats) else {}
@@ -0,0 +1,209 @@
+from __future__ import annotations
+import logging
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import column, func, literal_column, select, table, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.sql import ColumnElement, Select
+
+from ..config import settings
+from ..database import Question as QuestionORM
+
+logger = logging.getLogger(__name__)
+
+HIGHLIGHT_START = "<b>"
+HIGHLIGHT_STOP = "</b>"
+
+_TERM_RE = re.compile(r"\w+", re.UNICODE)
+_REGCONFIG_RE = re.compile(r"^[a-z_]+$")
+
+
+def search_terms(q: Optional[str]) -> List[str]:
+    """Слова запроса без операторов и кавычек: их безопасно подставлять в MATCH / to_tsquery"""
+    return _TERM_RE.findall((q or "").lower())
+
+
+class LikeSearchBackend:
+    """Подстрока в title/content через ILIKE: работает везде, но индексом не обслуживается"""
+
+    name = "like"
+    rank_descending = True  # больший ранг — лучше (для bm25 наоборот)
+
+    async def setup(self, conn) -> None:
+        return None
+
+    def match(self, stmt: Select, q: str) -> Select:
+        like = f"%{q}%"
+        return stmt.where(QuestionORM.title.ilike(like) | QuestionORM.content.ilike(like))
+
+    def rank(self, q: str) -> Optional[ColumnElement]:
+        """Выражение релевантности для сортировки; None — сортировка только по id"""
+        return None
+
+    def highlight(self, q: str) -> Optional[ColumnElement]:
+        return None
+
+
+class PostgresFullTextBackend(LikeSearchBackend):
+    """tsvector (title с весом A, content — B) в генерируемом столбце с GIN-индексом.
+
+    Каждое слово запроса ищется как префикс (``слово:*``), результаты ранжируются
+    ts_rank_cd, фрагмент с подсветкой строит ts_headline — только для строк страницы.
+    """
+
+    name = "postgres_fts"
+
+    def __init__(self, config: str) -> None:
+        if not _REGCONFIG_RE.match(config):
+            raise ValueError(f"Invalid text search config: {config!r}")
+        self.config = config
+        self._regconfig = literal_column(f"'{config}'::regconfig")
+        self._vector = literal_column("questions.search_vector")
+
+    async def setup(self, conn) -> None:
+        # Конфигурация зашита в выражение столбца: чтобы сменить её, столбец нужно удалить
+        await conn.execute(text(f"""
+            ALTER TABLE questions ADD COLUMN IF NOT EXISTS search_vector tsvector
+            GENERATED ALWAYS AS (
+                setweight(to_tsvector('{self.config}', coalesce(title, '')), 'A') ||
+                setweight(to_tsvector('{self.config}', coalesce(content, '')), 'B')
+            ) STORED
+        """))
+        await conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_questions_search_vector ON questions USING GIN (search_vector)"
+        ))
+
+    def _query(self, q: str) -> ColumnElement:
+        return func.to_tsquery(self._regconfig, " & ".join(f"{term}:*" for term in search_terms(q)))
+
+    def match(self, stmt: Select, q: str) -> Select:
+        if not search_terms(q):
+            return super().match(stmt, q)
+        return stmt.where(self._vector.op("@@")(self._query(q)))
+
+    def rank(self, q: str) -> Optional[ColumnElement]:
+        if not search_terms(q):
+            return None
+        return func.ts_rank_cd(self._vector, self._query(q))
+
+    def highlight(self, q: str) -> Optional[ColumnElement]:
+        if not search_terms(q):
+            return None
+        options = f"StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_STOP}, MaxFragments=2, MaxWords=20, MinWords=5"
+        return func.ts_headline(self._regconfig, QuestionORM.title + " " + QuestionORM.content, self._query(q), options)
+
+
+class SqliteFts5Backend(LikeSearchBackend):
+    """Теневая таблица FTS5 с внешним содержимым (content='questions'), синхронизируемая триггерами.
+
+    Слова запроса ищутся как префиксы, ранжирование — bm25 (совпадение в заголовке
+    весит больше), подсветка — snippet().
+    """
+
+    name = "sqlite_fts5"
+    rank_descending = False
+
+    _DDL = (
+        """CREATE VIRTUAL TABLE IF NOT EXISTS questions_fts USING fts5(
+            title, content, content='questions', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )""",
+        """CREATE TRIGGER IF NOT EXISTS questions_fts_ai AFTER INSERT ON questions BEGIN
+            INSERT INTO questions_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS questions_fts_ad AFTER DELETE ON questions BEGIN
+            INSERT INTO questions_fts(questions_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS questions_fts_au AFTER UPDATE OF title, content ON questions BEGIN
+            INSERT INTO questions_fts(questions_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+            INSERT INTO questions_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+        END""",
+    )
+
+    async def setup(self, conn) -> None:
+        existed = await conn.scalar(text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'questions_fts'"))
+        for ddl in self._DDL:
+            await conn.execute(text(ddl))
+        if not existed:
+            # индекс для уже существующих вопросов; дальше его ведут триггеры
+            await conn.execute(text("INSERT INTO questions_fts(questions_fts) VALUES ('rebuild')"))
+
+    def _query(self, q: str) -> str:
+        return " ".join(f'"{term}"*' for term in search_terms(q))
+
+    def match(self, stmt: Select, q: str) -> Select:
+        if not search_terms(q):
+            return super().match(stmt, q)
+        matches = _fts_matches(self._query(q))
+        return stmt.join(matches, matches.c.question_id == QuestionORM.id)
+
+    def rank(self, q: str) -> Optional[ColumnElement]:
+        if not search_terms(q):
+            return None
+        return _fts_matches(self._query(q)).c.rank
+
+    def highlight(self, q: str) -> Optional[ColumnElement]:
+        if not search_terms(q):
+            return None
+        return _fts_matches(self._query(q)).c.highlight
+
+
+@lru_cache(maxsize=64)
+def _fts_matches(match_query: str):
+    """Совпадения FTS5 с рангом и фрагментом — подзапросом.
+
+    bm25() и snippet() работают только в запросе, где questions_fts стоит с MATCH;
+    снаружи (окно count(*) OVER (), условие keyset-курсора) их значения берутся из
+    подзапроса. Один объект на запрос: match, rank и highlight должны ссылаться на него.
+    """
+    fts = table("questions_fts", column("rowid"))
+    fts_ref = literal_column("questions_fts")
+    return (
+        select(
+            fts.c.rowid.label("question_id"),
+            # bm25 тем лучше, чем меньше; вес title — 10, content — 1
+            func.bm25(fts_ref, 10.0, 1.0).label("rank"),
+            func.snippet(fts_ref, -1, HIGHLIGHT_START, HIGHLIGHT_STOP, "…", 16).label("highlight"),
+        )
+        .where(fts_ref.op("MATCH")(match_query))
+        .subquery("fts_matches")
+    )
+
+
+class QuestionSearch:
+    """Выбор поискового бэкенда под диалект БД; настраивается в Database.create_tables"""
+
+    def __init__(self) -> None:
+        self.backend: LikeSearchBackend = LikeSearchBackend()
+
+    async def setup(self, engine) -> None:
+        backend = self._for_dialect(engine.dialect.name)
+        try:
+            # отдельная транзакция: сбой DDL поиска не должен откатить create_all
+            async with engine.begin() as conn:
+                await backend.setup(conn)
+        except DBAPIError as e:
+            # например, SQLite собран без FTS5 или Postgres старше 12 — остаёмся на ILIKE
+            logger.warning(f"Full-text search backend {backend.name} unavailable, using LIKE: {e}")
+            backend = LikeSearchBackend()
+        self.backend = backend
+        logger.info(f"Question search backend: {backend.name}")
+
+    @staticmethod
+    def _for_dialect(dialect: str) -> LikeSearchBackend:
+        if settings.question_search_backend == "like":
+            return LikeSearchBackend()
+        if dialect == "postgresql":
+            return PostgresFullTextBackend(settings.question_search_config)
+        if dialect == "sqlite":
+            return SqliteFts5Backend()
+        return LikeSearchBackend()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.backend.name}
+
+
+# Глобальный выбор поискового бэкенда процесса
+question_search = QuestionSearch()
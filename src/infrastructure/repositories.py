@@ -1,12 +1,49 @@
 from __future__ import annotations
-from typing import Optional, List, Dict, Any
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Optional, List, Dict, Any, Collection
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from sqlalchemy import select, update as sa_update, delete as sa_delete, func
-from ..database import database, User as UserORM, Question as QuestionORM, Answer as AnswerORM
-from ..models import User, Question, Answer
-from ..domain.entities import QuestionEntity, entity_to_dto_question
-from ..domain.ports import UserRepository, QuestionRepository, AnswerRepository
+from sqlalchemy import JSON, Text, and_, bindparam, cast, or_, select, text, update as sa_update, delete as sa_delete, func
+from sqlalchemy.exc import IntegrityError
+from ..database import database, dialect_insert, User as UserORM, Question as QuestionORM, Answer as AnswerORM, EvaluationJob as JobORM
+from ..models import User, Question, CachedQuestion, from_db, QuestionPage, QuestionSearchHit, QuestionUpsertResult, Answer, EvaluationJob
+from ..domain.entities import QuestionEntity, entity_to_dto_question, question_content_hash
+from ..domain.ports import UserRepository, QuestionRepository, AnswerRepository, JobRepository
+from ..cache_utils import LRUCache
+from ..config import settings
+from ..pagination import decode_cursor, encode_cursor, filter_fingerprint
+from ..question_pool import question_pool
+from .question_search import question_search
+
+# Без фильтров на большой таблице Postgres итог берётся из оценки планировщика
+ESTIMATED_COUNT_MIN_ROWS = 10_000
+
+# Итоги поиска по отпечатку фильтра; сбрасываются при любой правке вопросов
+_question_counts: LRUCache[str, int] = LRUCache(256, settings.question_count_cache_ttl_seconds)
+
+# Вопросы по id: правки этого процесса обновляют кэш сразу, других процессов — через TTL
+question_cache: LRUCache[int, CachedQuestion] = LRUCache(settings.question_cache_size, settings.question_cache_ttl_seconds)
+
+
+# Чтение вопросов — строками из этих столбцов, без ORM-объектов (и без search_vector)
+_QUESTION_COLUMNS = tuple(getattr(QuestionORM, name) for name in Question.model_fields)
+
+
+def _cache_question(row: Any) -> CachedQuestion:
+    question = from_db(CachedQuestion, row)
+    question_cache.set(question.id, question)
+    return question
+
+# Из этих полей складывается content_hash: при совпадении хэша они совпадают и сами
+_HASHED_FIELDS = ("title", "content", "level", "category")
+# Остальное содержимое вопроса — его upsert обновляет, если оно изменилось
+_UPSERT_FIELDS = ("question_type", "points", "correct_answer", "explanation", "hints", "tags")
+
+
+def _comparable(column):
+    # у json в Postgres нет оператора равенства — сравниваем текст; SQL NULL и JSON null равны
+    return func.coalesce(cast(column, Text), "null") if isinstance(column.type, JSON) else column
 
 
 class SqlAlchemyUserRepository(UserRepository):
@@ -19,34 +56,95 @@ class SqlAlchemyUserRepository(UserRepository):
     async def update_by_telegram_id(self, telegram_id: int, **kwargs) -> Optional[User]:
         return await database.update_user(telegram_id, **kwargs)
 
+    async def increment_progress(self, telegram_id: int, score_delta: int, answered: int = 1) -> Optional[User]:
+        return await database.increment_user_progress(telegram_id, score_delta, answered)
+
+    async def add_answer_stats(self, user_id: int, category: str, level: str, score: int) -> None:
+        await database.add_user_stats(user_id, category, level, score)
+
     async def get_stats(self, user_id: int) -> Dict[str, Any]:
         return await database.get_user_stats(user_id)
 
+    async def get_many_by_telegram_ids(self, telegram_ids: List[int]) -> Dict[int, User]:
+        return await database.get_users_by_telegram_ids(telegram_ids)
+
+    async def get_seen_questions(self, telegram_id: int, for_update: bool = False) -> Optional[bytes]:
+        return await database.get_user_seen_questions(telegram_id, for_update)
+
 
 class SqlAlchemyQuestionRepository(QuestionRepository):
     async def get_by_id(self, question_id: int) -> Optional[Question]:
-        async with database.get_session() as session:
-            orm_question = await session.get(QuestionORM, question_id)
-            if not orm_question:
-                return None
-            # Конвертируем ORM объект в Pydantic модель
-            return Question.model_validate(orm_question)
+        cached = question_cache.get(question_id)
+        if cached is not None:
+            return cached
+        stmt = select(*_QUESTION_COLUMNS).where(QuestionORM.id == question_id)
+        async with database.read_session() as session:
+            row = (await session.execute(stmt)).first()
+        if not row and database.replicas:
+            # только что созданный вопрос мог ещё не доехать до реплики
+            async with database.get_session() as session:
+                row = (await session.execute(stmt)).first()
+        if not row:
+            return None
+        return _cache_question(row)
+
+    async def get_many_by_ids(self, question_ids: List[int]) -> Dict[int, Question]:
+        found: Dict[int, Question] = {}
+        missing = set()
+        for question_id in question_ids:
+            cached = question_cache.get(question_id)
+            if cached is not None:
+                found[question_id] = cached
+            else:
+                missing.add(question_id)
+        if missing:
+            async with database.get_session() as session:
+                result = await session.execute(select(*_QUESTION_COLUMNS).where(QuestionORM.id.in_(missing)))
+                found.update({row.id: _cache_question(row) for row in result.all()})
+        return found
+
+    async def get_random(self, level: str, category: str, exclude_ids: Optional[Collection[int]] = None) -> Optional[Question]:
+        exclude = set(exclude_ids) if isinstance(exclude_ids, list) else exclude_ids or None
+        # пустой пул проверяем запросом: вопросы могли добавить из другого процесса (seed-скрипт)
+        if await question_pool.ensure_loaded() and question_pool.size(level, category):
+            async with database.get_session() as session:
+                # пул мог отстать от таблицы (вопрос удалён в другом процессе) — пробуем ещё раз
+                for _ in range(3):
+                    question_id = question_pool.pick(level, category, exclude)
+                    if question_id is None:
+                        return None
+                    cached = question_cache.get(question_id)
+                    if cached is not None:
+                        return cached
+                    row = (await session.execute(
+                        select(*_QUESTION_COLUMNS).where(QuestionORM.id == question_id)
+                    )).first()
+                    if row:
+                        return _cache_question(row)
+                    question_pool.remove(question_id)
 
-    async def get_random(self, level: str, category: str, exclude_ids: Optional[List[int]] = None) -> Optional[Question]:
         async with database.get_session() as session:
-            stmt = select(QuestionORM).where(
-                QuestionORM.level == level,
-                QuestionORM.category == category,
-            )
-            if exclude_ids:
-                stmt = stmt.where(~QuestionORM.id.in_(exclude_ids))
-            stmt = stmt.order_by(QuestionORM.id.desc()).limit(1)
-            result = await session.scalars(stmt)
-            orm_question = result.first()
-            if not orm_question:
+            if exclude:
+                # без NOT IN: исключения бывают на тысячи id, фильтруем id категории в памяти
+                ids = await session.scalars(
+                    select(QuestionORM.id).where(QuestionORM.level == level, QuestionORM.category == category)
+                )
+                candidates = [i for i in ids.all() if i not in exclude]
+                if not candidates:
+                    return None
+                stmt = select(*_QUESTION_COLUMNS).where(QuestionORM.id == random.choice(candidates))
+            else:
+                stmt = select(*_QUESTION_COLUMNS).where(
+                    QuestionORM.level == level,
+                    QuestionORM.category == category,
+                )
+                stmt = stmt.order_by(func.random()).limit(1)
+            row = (await session.execute(stmt)).first()
+            if not row:
                 return None
-            # Конвертируем ORM объект в Pydantic модель
-            return Question.model_validate(orm_question)
+            if question_pool.loaded and not question_pool.size(level, category):
+                question_pool.invalidate()
+            return _cache_question(row)
 
     async def create(self, question: Question | QuestionEntity) -> Question:
         if isinstance(question, QuestionEntity):
@@ -56,70 +154,388 @@ class SqlAlchemyQuestionRepository(QuestionRepository):
             dto = question
         
         # Создаем ORM объект из Pydantic модели
-        orm_question = QuestionORM(**dto.model_dump(exclude={'id'}))
+        orm_question = QuestionORM(
+            **dto.model_dump(exclude={'id'}),
+            content_hash=question_content_hash(dto.title, dto.content, dto.level, dto.category),
+        )
         
         async with database.get_session() as session:
             session.add(orm_question)
-            await session.commit()
+            try:
+                await session.commit()
+            except IntegrityError:
+                raise ValueError("duplicate question")
             await session.refresh(orm_question)
-            # Возвращаем Pydantic модель
-            return Question.model_validate(orm_question)
+            question_pool.add(orm_question.id, orm_question.level, orm_question.category)
+            _question_counts.clear()
+            return _cache_question(orm_question)
 
     async def search(self, level: Optional[str] = None, category: Optional[str] = None, q: Optional[str] = None, limit: int = 20, offset: int = 0) -> List[Question]:
-        async with database.get_session() as session:
-            stmt = select(QuestionORM)
-            if level:
-                stmt = stmt.where(QuestionORM.level == level)
-            if category:
-                stmt = stmt.where(QuestionORM.category == category)
-            if q:
-                like = f"%{q}%"
-                stmt = stmt.where((QuestionORM.title.ilike(like)) | (QuestionORM.content.ilike(like)))
-            stmt = stmt.order_by(QuestionORM.id.desc()).limit(limit).offset(offset)
-            result = await session.scalars(stmt)
-            orm_questions = list(result.all())
-            # Конвертируем ORM объекты в Pydantic модели
-            return [Question.model_validate(orm_q) for orm_q in orm_questions]
+        rank = question_search.backend.rank(q) if q else None
+        highlight = question_search.backend.highlight(q) if q else None
+        async with database.read_session() as session:
+            stmt = self._filtered(self._select(rank, highlight), level, category, q)
+            result = await session.execute(self._ordered(stmt, rank).limit(limit).offset(offset))
+            return [self._hit(row) for row in result.all()]
+
+    async def search_page(self, level: Optional[str] = None, category: Optional[str] = None, q: Optional[str] = None, limit: int = 20, cursor: Optional[str] = None, with_total: bool = False) -> QuestionPage:
+        """Keyset-пагинация: следующая страница начинается строго после ключа последней строки.
+
+        Ключ — id (по убыванию), а при полнотекстовом запросе — (ранг, id). Глубокие
+        страницы стоят столько же, сколько первая. Итог (with_total) берётся из оценки
+        планировщика для выборки без фильтров, из кэша по фильтру или считается в том же
+        запросе: оконной функцией на первой странице, подзапросом на последующих.
+        """
+        backend = question_search.backend
+        rank = backend.rank(q) if q else None
+        highlight = backend.highlight(q) if q else None
+        fingerprint = filter_fingerprint(level, category, q, backend.name)
+        after = decode_cursor(cursor, fingerprint, 1 if rank is None else 2) if cursor else None
+
+        async with database.read_session() as session:
+            total: Optional[int] = None
+            estimated = False
+            total_column = None
+            if with_total:
+                if not (level or category or q):
+                    total = await self._estimated_total(session)
+                    estimated = total is not None
+                if total is None:
+                    total = _question_counts.get(fingerprint)
+                if total is None:
+                    if after is None:
+                        total_column = func.count().over()
+                    else:
+                        count_stmt = self._filtered(select(func.count(QuestionORM.id)).select_from(QuestionORM), level, category, q)
+                        # correlate(None): иначе questions подзапроса склеится с внешним запросом
+                        total_column = count_stmt.correlate(None).scalar_subquery()
+
+            stmt = self._filtered(self._select(rank, highlight, total_column), level, category, q)
+            if after is not None:
+                stmt = stmt.where(self._after(rank, backend.rank_descending, after))
+            # строка сверх limit показывает, есть ли следующая страница
+            rows = (await session.execute(self._ordered(stmt, rank).limit(limit + 1))).all()
+            page, has_more = rows[:limit], len(rows) > limit
+
+            if total_column is not None:
+                if page:
+                    total = int(page[0].total)
+                elif after is None:
+                    total = 0
+                else:
+                    total = await self.count(level, category, q)
+                _question_counts.set(fingerprint, total)
+
+        next_cursor = None
+        if has_more:
+            last = page[-1]
+            key = [last.id] if rank is None else [float(last.rank), last.id]
+            next_cursor = encode_cursor(key, fingerprint)
+        return QuestionPage(
+            items=[self._hit(row) for row in page],
+            next_cursor=next_cursor,
+            total=total,
+            total_estimated=estimated,
+            limit=limit,
+        )
+
+    @staticmethod
+    def _select(rank, highlight, total_column=None):
+        columns: List[Any] = list(_QUESTION_COLUMNS)
+        if rank is not None:
+            columns.append(rank.label("rank"))
+        if highlight is not None:
+            columns.append(highlight.label("highlight"))
+        if total_column is not None:
+            columns.append(total_column.label("total"))
+        return select(*columns)
+
+    @staticmethod
+    def _ordered(stmt, rank):
+        if rank is None:
+            return stmt.order_by(QuestionORM.id.desc())
+        order = rank.desc() if question_search.backend.rank_descending else rank.asc()
+        return stmt.order_by(order, QuestionORM.id.desc())
+
+    @staticmethod
+    def _after(rank, rank_descending: bool, after: List[Any]):
+        if rank is None:
+            return QuestionORM.id < after[0]
+        last_rank, last_id = after
+        beyond = rank < last_rank if rank_descending else rank > last_rank
+        return or_(beyond, and_(rank == last_rank, QuestionORM.id < last_id))
+
+    @staticmethod
+    def _hit(row) -> QuestionSearchHit:
+        # highlight есть в строке только при полнотекстовом запросе, иначе — None по умолчанию
+        return from_db(QuestionSearchHit, row)
+
+    @staticmethod
+    async def _estimated_total(session) -> Optional[int]:
+        """Оценка числа строк из статистики Postgres — без полного прохода по таблице"""
+        if session.bind.dialect.name != "postgresql":
+            return None
+        estimate = await session.scalar(text("SELECT reltuples::bigint FROM pg_class WHERE oid = 'questions'::regclass"))
+        # маленькую или ни разу не проанализированную таблицу (-1) дешевле посчитать точно
+        if estimate is None or estimate < ESTIMATED_COUNT_MIN_ROWS:
+            return None
+        return int(estimate)
 
     async def count(self, level: Optional[str] = None, category: Optional[str] = None, q: Optional[str] = None) -> int:
-        async with database.get_session() as session:
-            stmt = select(func.count(QuestionORM.id))
-            if level:
-                stmt = stmt.where(QuestionORM.level == level)
-            if category:
-                stmt = stmt.where(QuestionORM.category == category)
-            if q:
-                like = f"%{q}%"
-                stmt = stmt.where((QuestionORM.title.ilike(like)) | (QuestionORM.content.ilike(like)))
+        async with database.read_session() as session:
+            stmt = self._filtered(select(func.count(QuestionORM.id)).select_from(QuestionORM), level, category, q)
             total = await session.scalar(stmt)
             return int(total or 0)
 
+    @staticmethod
+    def _filtered(stmt, level: Optional[str], category: Optional[str], q: Optional[str]):
+        if level:
+            stmt = stmt.where(QuestionORM.level == level)
+        if category:
+            stmt = stmt.where(QuestionORM.category == category)
+        if q:
+            stmt = question_search.backend.match(stmt, q)
+        return stmt
+
     async def update(self, question_id: int, data: Dict[str, Any]) -> Optional[Question]:
         async with database.get_session() as session:
             if not data:
                 orm_question = await session.get(QuestionORM, question_id)
                 if not orm_question:
                     return None
-                return Question.model_validate(orm_question)
-            await session.execute(
-                sa_update(QuestionORM).where(QuestionORM.id == question_id).values(**data)
-            )
-            await session.commit()
-            orm_question = await session.get(QuestionORM, question_id)
+                return from_db(Question, orm_question)
+            if data.keys() & set(_HASHED_FIELDS):
+                current = await session.get(QuestionORM, question_id)
+                if not current:
+                    return None
+                identity = {f: data.get(f, getattr(current, f)) for f in _HASHED_FIELDS}
+                data = {**data, "content_hash": question_content_hash(**identity)}
+            try:
+                await session.execute(
+                    sa_update(QuestionORM).where(QuestionORM.id == question_id).values(**data)
+                )
+                await session.commit()
+            except IntegrityError:
+                raise ValueError("duplicate question")
+            _question_counts.clear()
+            orm_question = await session.get(QuestionORM, question_id, populate_existing=True)
             if not orm_question:
+                question_cache.pop(question_id)
                 return None
-            return Question.model_validate(orm_question)
+            if "level" in data or "category" in data:
+                question_pool.update(orm_question.id, orm_question.level, orm_question.category)
+            # свежая строка с primary: после сброса кэш перечитал бы отстающую реплику
+            return _cache_question(orm_question)
 
     async def delete(self, question_id: int) -> bool:
         async with database.get_session() as session:
             await session.execute(sa_delete(QuestionORM).where(QuestionORM.id == question_id))
             await session.commit()
+            question_pool.remove(question_id)
+            question_cache.pop(question_id)
+            _question_counts.clear()
             return True
 
+    async def upsert_many(self, questions: List[QuestionEntity]) -> QuestionUpsertResult:
+        rows: Dict[str, Dict[str, Any]] = {}
+        for question in questions:
+            row = {f: getattr(question, f) for f in _HASHED_FIELDS + _UPSERT_FIELDS}
+            # повтор внутри пакета: Postgres не даёт ON CONFLICT задеть строку дважды, берём последний
+            rows[question.content_hash()] = {**row, "content_hash": question.content_hash()}
+        if not rows:
+            return QuestionUpsertResult()
+
+        stmt = dialect_insert(database.engine.dialect.name)(QuestionORM).values(list(rows.values()))
+        excluded = stmt.excluded
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[QuestionORM.content_hash],
+            set_={**{f: excluded[f] for f in _UPSERT_FIELDS}, "updated_at": func.now()},
+            # повторный импорт тех же данных ничего не переписывает
+            where=or_(*(
+                _comparable(getattr(QuestionORM, f)).is_distinct_from(_comparable(excluded[f]))
+                for f in _UPSERT_FIELDS
+            )),
+        ).returning(QuestionORM.id, QuestionORM.level, QuestionORM.category, QuestionORM.content_hash)
+
+        async with database.get_session() as session:
+            existing = set(await session.scalars(
+                select(QuestionORM.content_hash).where(QuestionORM.content_hash.in_(list(rows)))
+            ))
+            written = (await session.execute(stmt)).all()
+            await session.commit()
+
+        inserted = [r for r in written if r.content_hash not in existing]
+        for r in written:
+            question_cache.pop(r.id)
+        for r in inserted:
+            question_pool.add(r.id, r.level, r.category)
+        if inserted:
+            _question_counts.clear()
+        return QuestionUpsertResult(
+            inserted=len(inserted),
+            updated=len(written) - len(inserted),
+            unchanged=len(rows) - len(written),
+            updated_ids=[r.id for r in written if r.content_hash in existing],
+        )
+
+    async def fill_content_hashes(self, batch_size: int = 1000) -> int:
+        filled, last_id = 0, 0
+        while True:
+            async with database.get_session() as session:
+                rows = (await session.execute(
+                    select(QuestionORM.id, QuestionORM.title, QuestionORM.content, QuestionORM.level, QuestionORM.category)
+                    .where(QuestionORM.content_hash.is_(None), QuestionORM.id > last_id)
+                    .order_by(QuestionORM.id)
+                    .limit(batch_size)
+                )).all()
+                if not rows:
+                    return filled
+                last_id = rows[-1].id
+                hashes: Dict[str, int] = {}
+                for r in rows:
+                    hashes.setdefault(question_content_hash(r.title, r.content, r.level, r.category), r.id)
+                taken = set(await session.scalars(
+                    select(QuestionORM.content_hash).where(QuestionORM.content_hash.in_(list(hashes)))
+                ))
+                # дубликаты оставляем без хэша: импорт их не тронет, удалить можно через админку
+                values = [{"b_id": qid, "b_hash": h} for h, qid in hashes.items() if h not in taken]
+                if values:
+                    table = QuestionORM.__table__
+                    await session.execute(
+                        sa_update(table)
+                        .where(table.c.id == bindparam("b_id"))
+                        # updated_at не трогаем: содержимое вопроса не менялось
+                        .values(content_hash=bindparam("b_hash"), updated_at=table.c.updated_at),
+                        values,
+                    )
+                    await session.commit()
+                filled += len(values)
+
 
 class SqlAlchemyAnswerRepository(AnswerRepository):
-    async def create(self, user_id: int, question_id: int, answer_text: str, answer_type: str, voice_file_id: Optional[str] = None) -> Answer:
-        return await database.create_answer(user_id, question_id, answer_text, answer_type, voice_file_id)
+    async def create(self, user_id: int, question_id: int, answer_text: str, answer_type: str, voice_file_id: Optional[str] = None, score: Optional[int] = None, feedback: Optional[str] = None, job_id: Optional[int] = None) -> Answer:
+        return await database.create_answer(user_id, question_id, answer_text, answer_type, voice_file_id, score, feedback, job_id)
 
-    async def set_score(self, answer_id: int, score: int, feedback: str) -> Optional[Answer]:
-        return await database.update_answer_score(answer_id, score, feedback)
+    async def get_by_job_id(self, job_id: int) -> Optional[Answer]:
+        return await database.get_answer_by_job_id(job_id)
+
+
+class SqlAlchemyJobRepository(JobRepository):
+    """Очередь заданий в таблице evaluation_jobs.
+
+    На Postgres кандидаты выбираются через FOR UPDATE SKIP LOCKED, поэтому параллельные
+    воркеры не ждут друг друга. SQLite сериализует запись сама; там от двойной выдачи
+    защищает условие status = 'queued' в UPDATE (второй воркер просто не получит строку).
+    """
+
+    async def enqueue(self, kind: str, telegram_id: int, question_id: int, payload: Dict[str, Any], notify: Optional[Dict[str, Any]] = None, max_attempts: int = 3) -> EvaluationJob:
+        async with database.get_session() as session:
+            orm_job = JobORM(
+                kind=kind,
+                status="queued",
+                telegram_id=telegram_id,
+                question_id=question_id,
+                payload=payload,
+                notify=notify,
+                attempts=0,
+                max_attempts=max_attempts,
+                run_after=datetime.now(timezone.utc),
+            )
+            session.add(orm_job)
+            await session.commit()
+            await session.refresh(orm_job)
+            return from_db(EvaluationJob, orm_job)
+
+    async def get(self, job_id: int) -> Optional[EvaluationJob]:
+        async with database.get_session() as session:
+            orm_job = await session.get(JobORM, job_id)
+            if not orm_job:
+                return None
+            return from_db(EvaluationJob, orm_job)
+
+    async def claim(self, worker_id: str, limit: int = 1) -> List[EvaluationJob]:
+        if limit <= 0:
+            return []
+        now = datetime.now(timezone.utc)
+        async with database.get_session() as session:
+            candidates = (
+                select(JobORM.id)
+                .where(JobORM.status == "queued", JobORM.run_after <= now)
+                .order_by(JobORM.run_after, JobORM.id)
+                .limit(limit)
+            )
+            if database.engine.dialect.name == "postgresql":
+                candidates = candidates.with_for_update(skip_locked=True)
+            ids = list((await session.scalars(candidates)).all())
+            if not ids:
+                await session.rollback()
+                return []
+            stmt = (
+                sa_update(JobORM)
+                .where(JobORM.id.in_(ids), JobORM.status == "queued")
+                .values(status="running", locked_by=worker_id, locked_at=now, attempts=JobORM.attempts + 1, updated_at=now)
+                .returning(JobORM)
+                .execution_options(synchronize_session=False)
+            )
+            claimed = [from_db(EvaluationJob, j) for j in (await session.scalars(stmt)).all()]
+            await session.commit()
+            return sorted(claimed, key=lambda j: ids.index(j.id))
+
+    @staticmethod
+    def _owned(job_id: int, worker_id: Optional[str]):
+        # воркер, чей lease истёк, не перезапишет результат нового владельца
+        if worker_id is None:
+            return JobORM.id == job_id
+        return (JobORM.id == job_id) & (JobORM.status == "running") & (JobORM.locked_by == worker_id)
+
+    async def heartbeat(self, job_id: int, worker_id: str) -> bool:
+        now = datetime.now(timezone.utc)
+        async with database.get_session() as session:
+            result = await session.execute(
+                sa_update(JobORM).where(self._owned(job_id, worker_id)).values(locked_at=now, updated_at=now)
+            )
+            await session.commit()
+            return bool(result.rowcount)
+
+    async def complete(self, job_id: int, result: Dict[str, Any], worker_id: Optional[str] = None) -> bool:
+        async with database.get_session() as session:
+            updated = await session.execute(
+                sa_update(JobORM)
+                .where(self._owned(job_id, worker_id))
+                .values(status="done", result=result, error=None, locked_by=None, updated_at=datetime.now(timezone.utc))
+            )
+            await session.commit()
+            return bool(updated.rowcount)
+
+    async def fail(self, job_id: int, error: str, retry_at: Optional[datetime] = None, worker_id: Optional[str] = None) -> bool:
+        values: Dict[str, Any] = {"error": error, "locked_by": None, "updated_at": datetime.now(timezone.utc)}
+        if retry_at is not None:
+            values.update(status="queued", run_after=retry_at)
+        else:
+            values.update(status="failed")
+        async with database.get_session() as session:
+            updated = await session.execute(sa_update(JobORM).where(self._owned(job_id, worker_id)).values(**values))
+            await session.commit()
+            return bool(updated.rowcount)
+
+    async def requeue_stale(self, lease_seconds: float) -> int:
+        now = datetime.now(timezone.utc)
+        stale = (JobORM.status == "running") & (JobORM.locked_at < now - timedelta(seconds=lease_seconds))
+        async with database.get_session() as session:
+            exhausted = await session.execute(
+                sa_update(JobORM)
+                .where(stale, JobORM.attempts >= JobORM.max_attempts)
+                .values(status="failed", error="worker lease expired", locked_by=None, updated_at=now)
+            )
+            requeued = await session.execute(
+                sa_update(JobORM)
+                .where(stale)
+                .values(status="queued", run_after=now, locked_by=None, updated_at=now)
+            )
+            await session.commit()
+            return (exhausted.rowcount or 0) + (requeued.rowcount or 0)
+
+    async def count_by_status(self) -> Dict[str, int]:
+        async with database.get_session() as session:
+            result = await session.execute(select(JobORM.status, func.count(JobORM.id)).group_by(JobORM.status))
+            return {status: int(n) for status, n in result.all()}
@@ -0,0 +1,318 @@
+from __future__ import annotations
+import logging
+import threading
+import time
+from bisect import bisect_left, insort
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+GLOBAL = "global"
+WINDOWS = ("all", "week")
+# Правки итогов, чьи транзакции начались чуть раньше предыдущей синхронизации, тоже должны попасть в неё
+_SYNC_OVERLAP = timedelta(seconds=30)
+_CHUNK = 1000  # строк снимка на INSERT и пользователей на запрос итогов
+
+
+def week_start(day: date) -> date:
+    return day - timedelta(days=day.weekday())
+
+
+def week_id(day: date) -> str:
+    year, week, _ = day.isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+class RankedBoard:
+    """Очки участников в отсортированном массиве ключей (-score, telegram_id).
+
+    Поиск позиции — бинарный, поэтому место и перцентиль считаются за O(log n), а
+    top-k — срез массива. Обновление — удаление и вставка по найденной позиции:
+    сдвиг массива выполняется memmove и на сотнях тысяч участников занимает
+    микросекунды, заметно меньше накладных расходов skip-list на чистом Python.
+    """
+
+    __slots__ = ("_keys", "_scores")
+
+    def __init__(self) -> None:
+        self._keys: List[Tuple[int, int]] = []
+        self._scores: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def score(self, telegram_id: int) -> Optional[int]:
+        return self._scores.get(telegram_id)
+
+    def set(self, telegram_id: int, score: int) -> None:
+        old = self._scores.get(telegram_id)
+        if old == score:
+            return
+        if old is not None:
+            del self._keys[bisect_left(self._keys, (-old, telegram_id))]
+        self._scores[telegram_id] = score
+        insort(self._keys, (-score, telegram_id))
+
+    def add(self, telegram_id: int, delta: int) -> None:
+        self.set(telegram_id, self._scores.get(telegram_id, 0) + delta)
+
+    def top(self, k: int) -> List[Tuple[int, int, int]]:
+        """(место, telegram_id, очки); при равных очках место общее"""
+        entries: List[Tuple[int, int, int]] = []
+        rank = 0
+        for position, (neg_score, telegram_id) in enumerate(self._keys[:k]):
+            if not entries or -neg_score != entries[-1][2]:
+                rank = position + 1
+            entries.append((rank, telegram_id, -neg_score))
+        return entries
+
+    def rank(self, telegram_id: int) -> Optional[Tuple[int, int, float]]:
+        """(место, очки, перцентиль — доля участников с меньшим счётом, %); None — не участвует"""
+        score = self._scores.get(telegram_id)
+        if score is None:
+            return None
+        n = len(self._keys)
+        rank = bisect_left(self._keys, (-score,)) + 1
+        below = n - bisect_left(self._keys, (-score + 1,))
+        return rank, score, round(100.0 * below / n, 1)
+
+
+class Leaderboard:
+    """Рейтинги игроков: общий и по категориям, за всё время и за текущую неделю (UTC).
+
+    Источник — user_stats_rollup. Доски строятся при первом обращении: из снимка
+    leaderboard_snapshots, если он есть, иначе агрегатом по rollup. Очки ответов этого
+    процесса учитываются сразу (``record``). Изменения из других процессов подхватываются
+    раз в ``leaderboard_refresh_seconds``: пересчитываются только пользователи, чьи строки
+    rollup менялись с прошлой синхронизации. Снимок перезаписывается раз в
+    ``leaderboard_snapshot_seconds`` и ускоряет старт следующих процессов.
+    """
+
+    def __init__(self) -> None:
+        self._boards: Dict[str, RankedBoard] = {}
+        self._lock = threading.Lock()
+        self._loading = False
+        self.week = week_id(self._today())
+        self.loaded_at: Optional[float] = None
+        self.synced_at: Optional[datetime] = None  # время БД последней синхронизации
+        self.snapshot_at: Optional[float] = None
+        self.recorded = 0
+        self.synced_users = 0
+
+    @property
+    def loaded(self) -> bool:
+        return self.loaded_at is not None
+
+    @staticmethod
+    def _today() -> date:
+        return datetime.now(timezone.utc).date()
+
+    @staticmethod
+    def board_name(category: Optional[str] = None, window: str = "all", week: Optional[str] = None) -> str:
+        if window not in WINDOWS:
+            raise ValueError(f"Unknown window {window!r}, use one of: {', '.join(WINDOWS)}")
+        return f"{category or GLOBAL}:{week if window == 'week' else 'all'}"
+
+    def _names(self, category: str) -> Tuple[str, ...]:
+        return (
+            self.board_name(None, "all"), self.board_name(None, "week", self.week),
+            self.board_name(category, "all"), self.board_name(category, "week", self.week),
+        )
+
+    def record(self, telegram_id: int, category: str, score: int) -> None:
+        """Очки только что записанного ответа; до загрузки досок — пропускается (их учтёт загрузка)"""
+        if not self.loaded:
+            return
+        with self._lock:
+            self._roll_week_locked()
+            for name in self._names(category):
+                self._boards.setdefault(name, RankedBoard()).add(telegram_id, score)
+            self.recorded += 1
+
+    def top(self, k: int, category: Optional[str] = None, window: str = "all") -> List[Tuple[int, int, int]]:
+        with self._lock:
+            board = self._boards.get(self.board_name(category, window, self.week))
+            return board.top(k) if board else []
+
+    def rank(self, telegram_id: int, category: Optional[str] = None, window: str = "all") -> Optional[Tuple[int, int, float]]:
+        with self._lock:
+            board = self._boards.get(self.board_name(category, window, self.week))
+            return board.rank(telegram_id) if board else None
+
+    def size(self, category: Optional[str] = None, window: str = "all") -> int:
+        with self._lock:
+            return len(self._boards.get(self.board_name(category, window, self.week), ()))
+
+    def _roll_week_locked(self) -> None:
+        # неделя сменилась: доски прошлой недели больше не нужны
+        week = week_id(self._today())
+        if week != self.week:
+            self.week = week
+            self._boards = {name: b for name, b in self._boards.items() if name.endswith(":all")}
+
+    def apply(self, rows: Iterable[Tuple[int, str, int, int]], replace: bool = False) -> int:
+        """Итоги пользователей из (telegram_id, category, очки всего, очки за неделю).
+
+        Строки пользователя должны быть полными (все его категории): его очки на
+        досках заменяются, а не приращиваются. replace — перестроить доски с нуля.
+        """
+        with self._lock:
+            self._roll_week_locked()
+        per_user: Dict[int, Dict[str, int]] = {}
+        for telegram_id, category, total, weekly in rows:
+            scores = per_user.setdefault(telegram_id, {})
+            global_all, global_week, category_all, category_week = self._names(category)
+            scores[global_all] = scores.get(global_all, 0) + total
+            scores[category_all] = total
+            if weekly:
+                scores[global_week] = scores.get(global_week, 0) + weekly
+                scores[category_week] = weekly
+        with self._lock:
+            if replace:
+                self._boards = {}
+            for telegram_id, scores in per_user.items():
+                for name, value in scores.items():
+                    self._boards.setdefault(name, RankedBoard()).set(telegram_id, value)
+        return len(per_user)
+
+    async def _totals(self, session, user_ids: Optional[List[int]] = None) -> List[Tuple[int, str, int, int]]:
+        from sqlalchemy import case, func, select
+        from .database import User, UserStatsRollup as Rollup
+
+        weekly = case((Rollup.day >= week_start(self._today()), Rollup.total_score), else_=0)
+        stmt = (
+            select(User.telegram_id, Rollup.category, func.sum(Rollup.total_score), func.sum(weekly))
+            .join(User, User.id == Rollup.user_id)
+            .group_by(User.telegram_id, Rollup.category)
+        )
+        if user_ids is not None:
+            stmt = stmt.where(Rollup.user_id.in_(user_ids))
+        result = await session.stream(stmt)
+        return [(tid, category, int(total or 0), int(week or 0)) async for tid, category, total, week in result]
+
+    async def load(self) -> None:
+        """Доски из снимка с досинхронизацией, а без снимка — агрегатом по user_stats_rollup"""
+        from sqlalchemy import func, select
+        from .database import database, LeaderboardSnapshot as Snapshot
+
+        async with database.get_session() as session:
+            synced_at = await session.scalar(select(func.now()))
+            taken_at = await session.scalar(select(func.min(Snapshot.taken_at)))
+            if taken_at is not None:
+                week = week_id(self._today())
+                boards: Dict[str, RankedBoard] = {}
+                result = await session.stream(select(Snapshot.board, Snapshot.telegram_id, Snapshot.score))
+                async for name, telegram_id, score in result:
+                    # доски прошлых недель в снимке не нужны
+                    if name.endswith((":all", f":{week}")):
+                        boards.setdefault(name, RankedBoard()).set(telegram_id, score)
+                with self._lock:
+                    self._boards = boards
+                    self.week = week
+                    self.loaded_at = time.monotonic()
+                    self.synced_at = taken_at
+                await self._sync(session)
+                logger.info(f"Leaderboard loaded from snapshot: {len(boards)} boards")
+                return
+            users = self.apply(await self._totals(session), replace=True)
+        with self._lock:
+            self.loaded_at = time.monotonic()
+            self.synced_at = synced_at
+        logger.info(f"Leaderboard built from user_stats_rollup: {users} users")
+        await self.save_snapshot()
+
+    async def _sync(self, session) -> None:
+        """Пересчёт пользователей, чьи строки rollup менялись с прошлой синхронизации"""
+        from sqlalchemy import func, select
+        from .database import UserStatsRollup as Rollup
+
+        synced_at = await session.scalar(select(func.now()))
+        since = self.synced_at - _SYNC_OVERLAP if self.synced_at else None
+        stmt = select(Rollup.user_id).distinct()
+        if since is not None:
+            stmt = stmt.where(Rollup.updated_at >= since)
+        user_ids = list(await session.scalars(stmt))
+        for start in range(0, len(user_ids), _CHUNK):
+            self.synced_users += self.apply(await self._totals(session, user_ids[start:start + _CHUNK]))
+        self.synced_at = synced_at
+
+    async def refresh(self) -> None:
+        from .database import database
+
+        async with database.get_session() as session:
+            await self._sync(session)
+        self.loaded_at = time.monotonic()
+        snapshot_every = settings.leaderboard_snapshot_seconds
+        if snapshot_every > 0 and (self.snapshot_at is None or time.monotonic() - self.snapshot_at >= snapshot_every):
+            await self.save_snapshot()
+
+    async def save_snapshot(self) -> None:
+        """Перезапись leaderboard_snapshots текущими досками (upsert порциями и удаление старых строк)"""
+        from sqlalchemy import delete, func, select
+        from .database import database, dialect_insert, LeaderboardSnapshot as Snapshot
+
+        with self._lock:
+            rows = [
+                {"board": name, "telegram_id": telegram_id, "score": score}
+                for name, board in self._boards.items()
+                for telegram_id, score in board._scores.items()
+            ]
+        try:
+            async with database.get_session() as session:
+                taken_at = self.synced_at or await session.scalar(select(func.now()))
+                insert_ = dialect_insert(database.engine.dialect.name)
+                for start in range(0, len(rows), _CHUNK):
+                    stmt = insert_(Snapshot).values(
+                        [{**row, "taken_at": taken_at} for row in rows[start:start + _CHUNK]]
+                    )
+                    await session.execute(stmt.on_conflict_do_update(
+                        index_elements=[Snapshot.board, Snapshot.telegram_id],
+                        set_={"score": stmt.excluded.score, "taken_at": stmt.excluded.taken_at},
+                    ))
+                await session.execute(delete(Snapshot).where(Snapshot.taken_at < taken_at))
+                await session.commit()
+        except Exception as e:
+            logger.warning(f"Leaderboard snapshot failed: {e}")
+            return
+        self.snapshot_at = time.monotonic()
+
+    async def ensure_loaded(self) -> bool:
+        """Загружает доски при первом обращении и досинхронизирует устаревшие; False — недоступны"""
+        refresh = settings.leaderboard_refresh_seconds
+        if self.loaded and (refresh <= 0 or time.monotonic() - self.loaded_at < refresh):
+            return True
+        if self._loading and self.loaded:
+            return True
+        self._loading = True
+        try:
+            await (self.refresh() if self.loaded else self.load())
+        except Exception as e:
+            logger.warning(f"Leaderboard load failed: {e}")
+            return self.loaded
+        finally:
+            self._loading = False
+        return True
+
+    def invalidate(self) -> None:
+        """Доски перестроятся при следующем обращении"""
+        with self._lock:
+            self.loaded_at = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            sizes = {name: len(board) for name, board in sorted(self._boards.items())}
+        return {
+            "loaded": self.loaded,
+            "week": self.week,
+            "age_seconds": round(time.monotonic() - self.loaded_at, 1) if self.loaded else None,
+            "boards": sizes,
+            "recorded": self.recorded,
+            "synced_users": self.synced_users,
+        }
+
+
+# Глобальные рейтинги процесса
+leaderboard = Leaderboard()
@@ -0,0 +1,216 @@
+from __future__ import annotations
+import asyncio
+import logging
+import threading
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from time import monotonic
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, Optional
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+OVERLOAD_STATUSES = {429, 500, 502, 503, 504}
+
+
+class LimiterRejected(Exception):
+    """Запрос не дождался свободного слота (очередь переполнена или истекло ожидание)"""
+
+
+def is_overload_error(error: BaseException) -> bool:
+    """429/5xx и таймауты провайдера считаются сигналом перегрузки"""
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError)):
+        return True
+    status = getattr(error, "status_code", None) or getattr(error, "status", None)
+    if isinstance(status, int):
+        return status in OVERLOAD_STATUSES
+    return type(error).__name__ in {"APITimeoutError", "APIConnectionError", "RateLimitError"}
+
+
+class SlotTimer:
+    """Время слота, учитываемое в латентности: без пауз, в которые ждали не провайдера"""
+
+    __slots__ = ("started", "_paused")
+
+    def __init__(self) -> None:
+        self.started = monotonic()
+        self._paused = 0.0
+
+    @contextmanager
+    def paused(self) -> Iterator[None]:
+        """Потоковый вызов отдаёт чанк потребителю; его время не латентность провайдера"""
+        paused_at = monotonic()
+        try:
+            yield
+        finally:
+            self._paused += monotonic() - paused_at
+
+    def elapsed(self) -> float:
+        return monotonic() - self.started - self._paused
+
+
+class AdaptiveConcurrencyLimiter:
+    """AIMD-ограничитель параллелизма вызовов LLM.
+
+    Окно растёт аддитивно (+1 за окно успешных вызовов, пока окно насыщено) и
+    сжимается мультипликативно при 429/5xx или всплеске латентности. Лишние вызовы
+    ждут в очереди не дольше ``max_wait`` секунд. Состояние защищено threading.Lock,
+    т.к. бот и API в режиме ``both`` работают в разных event loop.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = 8,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        max_wait: float = 10.0,
+        max_queue: int = 256,
+        backoff_ratio: float = 0.5,
+        latency_spike_ratio: float = 2.0,
+        latency_max_seconds: float = 30.0,
+    ) -> None:
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.backoff_ratio = backoff_ratio
+        self.latency_spike_ratio = latency_spike_ratio
+        self.latency_max_seconds = latency_max_seconds
+
+        self._limit = float(min(max(initial_limit, min_limit), max_limit))
+        self._in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._lock = threading.Lock()
+        self._baseline_latency: Optional[float] = None
+        self._samples = 0
+        self._last_decrease = 0.0
+
+        self.successes = 0
+        self.overloads = 0
+        self.rejections = 0
+        self.increases = 0
+        self.decreases = 0
+
+    @property
+    def limit(self) -> int:
+        return max(self.min_limit, int(self._limit))
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[SlotTimer]:
+        """Слот на вызов LLM; потоковый вызов оборачивает yield в ``timer.paused()``"""
+        await self.acquire()
+        timer = SlotTimer()
+        try:
+            yield timer
+        except BaseException as e:
+            self.release(timer.elapsed(), overload=is_overload_error(e))
+            raise
+        else:
+            self.release(timer.elapsed(), overload=False)
+
+    async def acquire(self) -> None:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._in_flight < self.limit and not self._waiters:
+                self._in_flight += 1
+                return
+            if len(self._waiters) >= self.max_queue:
+                self.rejections += 1
+                raise LimiterRejected("LLM queue is full")
+            waiter = loop.create_future()
+            self._waiters.append(waiter)
+        try:
+            # слот передаётся ожидающему уже занятым (in_flight увеличен в _wake)
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=self.max_wait)
+        except asyncio.TimeoutError:
+            self._abandon(waiter)
+            with self._lock:
+                self.rejections += 1
+            raise LimiterRejected(f"LLM slot wait exceeded {self.max_wait}s")
+        except asyncio.CancelledError:
+            self._abandon(waiter)
+            raise
+
+    def _abandon(self, waiter: asyncio.Future) -> None:
+        with self._lock:
+            granted = waiter not in self._waiters
+            if not granted:
+                self._waiters.remove(waiter)
+        if not waiter.done():
+            waiter.cancel()
+        if granted:
+            # слот успели выдать одновременно с отменой ожидания — возвращаем его
+            self.release(0.0, overload=False, record=False)
+
+    def release(self, latency: float, overload: bool, record: bool = True) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            if record:
+                self._on_sample(latency, overload)
+            self._wake()
+
+    def _on_sample(self, latency: float, overload: bool) -> None:
+        spike = False
+        if self._baseline_latency is None:
+            self._baseline_latency = latency
+        else:
+            spike = self._samples >= 10 and latency > self._baseline_latency * self.latency_spike_ratio
+            self._baseline_latency += 0.05 * (latency - self._baseline_latency)
+        self._samples += 1
+        spike = spike or latency > self.latency_max_seconds
+
+        if overload or spike:
+            self.overloads += 1
+            now = monotonic()
+            # одно сжатие на "поколение" запросов, чтобы пачка 429 не схлопнула окно до минимума
+            if now - self._last_decrease >= max(self._baseline_latency or 0.0, 1.0):
+                old = self.limit
+                self._limit = max(float(self.min_limit), self._limit * self.backoff_ratio)
+                self._last_decrease = now
+                self.decreases += 1
+                logger.warning(f"LLM limiter: window {old} -> {self.limit} (overload={overload}, latency={latency:.2f}s)")
+            return
+
+        self.successes += 1
+        # растём только когда окно действительно упиралось в лимит
+        if self._in_flight + 1 >= self.limit and self._limit < self.max_limit:
+            before = self.limit
+            self._limit = min(float(self.max_limit), self._limit + 1.0 / self._limit)
+            if self.limit > before:
+                self.increases += 1
+
+    def _wake(self) -> None:
+        while self._waiters and self._in_flight < self.limit:
+            waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            self._in_flight += 1
+            waiter.get_loop().call_soon_threadsafe(_grant, waiter)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "in_flight": self._in_flight,
+            "queue_depth": len(self._waiters),
+            "successes": self.successes,
+            "overloads": self.overloads,
+            "rejections": self.rejections,
+            "increases": self.increases,
+            "decreases": self.decreases,
+            "baseline_latency": round(self._baseline_latency or 0.0, 3),
+        }
+
+
+def _grant(waiter: asyncio.Future) -> None:
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+llm_limiter = AdaptiveConcurrencyLimiter(
+    initial_limit=settings.llm_limiter_initial,
+    min_limit=settings.llm_limiter_min,
+    max_limit=settings.llm_limiter_max,
+    max_wait=settings.llm_limiter_max_wait,
+    max_queue=settings.llm_limiter_max_queue,
+)
@@ -1,7 +1,10 @@
-from datetime import datetime
-from typing import Dict, List, Optional, Literal
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Literal, Tuple, Type, TypeVar
 from pydantic import BaseModel, Field, ConfigDict
 
+M = TypeVar("M", bound=BaseModel)
+
 
 class UserBase(BaseModel):
     """Базовая модель пользователя"""
@@ -39,6 +42,11 @@ class User(UserBase):
     model_config = ConfigDict(from_attributes=True)
 
 
+class CachedUser(User):
+    """Пользователь из кэша сессий: один экземпляр делят все обработчики, поэтому он неизменяемый"""
+    model_config = ConfigDict(from_attributes=True, frozen=True)
+
+
 class QuestionBase(BaseModel):
     """Базовая модель вопроса"""
     title: str = Field(..., description="Заголовок вопроса")
@@ -84,6 +92,33 @@ class Question(QuestionBase):
     model_config = ConfigDict(from_attributes=True)
 
 
+class CachedQuestion(Question):
+    """Вопрос из кэша репозитория: один экземпляр делят все читатели, поэтому он неизменяемый"""
+    model_config = ConfigDict(from_attributes=True, frozen=True)
+
+
+class QuestionSearchHit(Question):
+    """Вопрос в результатах поиска"""
+    highlight: Optional[str] = Field(None, description="Фрагмент с подсвеченными совпадениями (<b>…</b>)")
+
+
+class QuestionPage(BaseModel):
+    """Страница поиска вопросов (keyset-пагинация)"""
+    items: List[QuestionSearchHit] = Field(default_factory=list, description="Вопросы страницы")
+    next_cursor: Optional[str] = Field(None, description="Курсор следующей страницы; None — страница последняя")
+    total: Optional[int] = Field(None, description="Всего найдено (если запрошено with_total)")
+    total_estimated: bool = Field(False, description="total — оценка по статистике БД, а не точный подсчёт")
+    limit: int = Field(..., description="Размер страницы")
+
+
+class QuestionUpsertResult(BaseModel):
+    """Итог пакетного upsert вопросов по content_hash"""
+    inserted: int = Field(0, description="Новых вопросов")
+    updated: int = Field(0, description="Существующих вопросов с изменёнными полями")
+    unchanged: int = Field(0, description="Вопросов, уже совпадающих с базой")
+    updated_ids: List[int] = Field(default_factory=list, description="Id обновлённых вопросов (для сброса кэшей оценок)")
+
+
 class AnswerBase(BaseModel):
     """Базовая модель ответа"""
     user_id: int = Field(..., description="ID пользователя")
@@ -108,6 +143,22 @@ class Answer(AnswerBase):
     model_config = ConfigDict(from_attributes=True)
 
 
+class CategoryStats(BaseModel):
+    """Итоги пользователя по категории и уровню"""
+    category: str = Field(..., description="Категория")
+    level: str = Field(..., description="Уровень")
+    answered: int = Field(0, description="Оценённых ответов")
+    total_score: int = Field(0, description="Сумма баллов")
+    average_score: float = Field(0.0, description="Средний балл")
+
+
+class DayStats(BaseModel):
+    """Итоги пользователя за день (UTC)"""
+    day: date = Field(..., description="День")
+    answered: int = Field(0, description="Оценённых ответов")
+    total_score: int = Field(0, description="Сумма баллов")
+
+
 class UserStats(BaseModel):
     """Модель статистики пользователя"""
     user_id: int = Field(..., description="ID пользователя")
@@ -117,6 +168,34 @@ class UserStats(BaseModel):
     level: Optional[str] = Field(None, description="Текущий уровень")
     category: Optional[str] = Field(None, description="Текущая категория")
     last_activity: Optional[datetime] = Field(None, description="Последняя активность")
+    categories: List[CategoryStats] = Field(default_factory=list, description="Разбивка по категориям и уровням")
+    recent_days: List[DayStats] = Field(default_factory=list, description="Активность за последние дни")
+
+
+class LeaderboardEntry(BaseModel):
+    """Строка рейтинга"""
+    rank: int = Field(..., description="Место (при равных очках — общее)")
+    telegram_id: int = Field(..., description="Telegram ID")
+    username: Optional[str] = Field(None, description="Username")
+    first_name: Optional[str] = Field(None, description="Имя")
+    score: int = Field(..., description="Очки")
+
+
+class LeaderboardRank(BaseModel):
+    """Положение пользователя в рейтинге"""
+    rank: int = Field(..., description="Место")
+    score: int = Field(..., description="Очки")
+    percentile: float = Field(..., description="Доля участников с меньшим счётом, %")
+
+
+class LeaderboardPage(BaseModel):
+    """Топ рейтинга и место запросившего пользователя"""
+    category: Optional[str] = Field(None, description="Категория; None — общий рейтинг")
+    window: Literal["all", "week"] = Field("all", description="all — за всё время, week — за текущую неделю (UTC)")
+    week: Optional[str] = Field(None, description="ISO-неделя для window=week")
+    total: int = Field(0, description="Участников в рейтинге")
+    entries: List[LeaderboardEntry] = Field(default_factory=list, description="Топ")
+    me: Optional[LeaderboardRank] = Field(None, description="Место пользователя telegram_id (если он в рейтинге)")
 
 
 class QuestionRequest(BaseModel):
@@ -132,10 +211,79 @@ class AnswerEvaluation(BaseModel):
     score: int = Field(..., description="Полученный балл")
     feedback: str = Field(..., description="Обратная связь")
     is_correct: bool = Field(..., description="Правильность ответа")
+    strengths: List[str] = Field(default_factory=list, description="Сильные стороны ответа")
+    improvements: List[str] = Field(default_factory=list, description="Что можно улучшить")
+
+
+class AnswerBatchItem(BaseModel):
+    """Элемент пакетной оценки ответов"""
+    user_id: int = Field(..., description="Telegram ID пользователя")
+    question_id: int = Field(..., description="ID вопроса")
+    answer_text: str = Field(..., min_length=3, description="Текст ответа")
+
+
+class AnswerBatchRequest(BaseModel):
+    """Запрос на пакетную оценку ответов"""
+    items: List[AnswerBatchItem] = Field(..., min_length=1, description="Ответы для оценки")
+
+
+class EvaluationJob(BaseModel):
+    """Задание на фоновую оценку ответа"""
+    id: int = Field(..., description="ID задания")
+    kind: Literal["text", "voice"] = Field(..., description="Тип ответа")
+    status: Literal["queued", "running", "done", "failed"] = Field(..., description="Статус задания")
+    telegram_id: int = Field(..., description="Telegram ID пользователя")
+    question_id: int = Field(..., description="ID вопроса")
+    payload: Dict = Field(default_factory=dict, description="Текст ответа или ID голосового файла")
+    notify: Optional[Dict] = Field(None, description="Куда сообщить о результате")
+    result: Optional[Dict] = Field(None, description="Результат оценки (answer_id, score, feedback, ...)")
+    error: Optional[str] = Field(None, description="Ошибка последней попытки")
+    attempts: int = Field(0, description="Число попыток")
+    max_attempts: int = Field(3, description="Максимум попыток")
+    created_at: Optional[datetime] = Field(None, description="Дата создания")
+    updated_at: Optional[datetime] = Field(None, description="Дата обновления")
+
+    model_config = ConfigDict(from_attributes=True)
 
 
 class TelegramWebhook(BaseModel):
     """Модель для Telegram webhook"""
     update_id: int = Field(..., description="ID обновления")
     message: Optional[Dict] = Field(None, description="Сообщение")
-    callback_query: Optional[Dict] = Field(None, description="Callback query") 
\ No newline at end of file
+    callback_query: Optional[Dict] = Field(None, description="Callback query") 
+
+
+@lru_cache(maxsize=None)
+def _trusted_fields(model: Type[BaseModel]) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+    names = tuple(model.model_fields)
+    optional = tuple(n for n, f in model.model_fields.items() if not f.is_required())
+    return names, optional
+
+
+def from_db(model: Type[M], source: Any) -> M:
+    """DTO из строки своей БД (Row или ORM-объект) без валидации.
+
+    Типы и обязательность полей уже гарантирует схема таблицы, поэтому поля не проверяются:
+    ``__dict__`` заполняется так же, как в ``model_construct``, но без его разбора алиасов
+    (в pydantic 2 ``model_construct`` медленнее валидации). В Row может не быть
+    необязательных полей — для них берётся значение по умолчанию.
+    """
+    names, optional = _trusted_fields(model)
+    mapping = getattr(source, "_mapping", None)
+    if mapping is None:
+        data = {n: getattr(source, n) for n in names}
+    else:
+        try:
+            data = {n: mapping[n] for n in names}
+        except KeyError:
+            # проверка `in` на RowMapping дорогая — только когда поля действительно нет
+            data = {n: mapping[n] for n in names if n in mapping}
+            for n in optional:
+                if n not in data:
+                    data[n] = model.model_fields[n].get_default(call_default_factory=True)
+    obj = model.__new__(model)
+    object.__setattr__(obj, "__dict__", data)
+    object.__setattr__(obj, "__pydantic_fields_set__", set(data))
+    object.__setattr__(obj, "__pydantic_extra__", None)
+    object.__setattr__(obj, "__pydantic_private__", None)
+    return obj
@@ -0,0 +1,39 @@
+from __future__ import annotations
+import base64
+import hashlib
+import json
+from typing import Any, List
+
+
+class InvalidCursor(ValueError):
+    """Курсор повреждён или выдан для другого фильтра"""
+
+
+def filter_fingerprint(*parts: Any) -> str:
+    """Короткий отпечаток фильтра: курсор одной выборки нельзя подставить в другую"""
+    raw = json.dumps(parts, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:12]
+
+
+def encode_cursor(key: List[Any], fingerprint: str) -> str:
+    """Непрозрачный токен из ключа сортировки последней строки страницы"""
+    raw = json.dumps({"k": key, "f": fingerprint}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(token: str, fingerprint: str, key_length: int) -> List[Any]:
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        key = data["k"]
+        valid = (
+            data["f"] == fingerprint
+            and isinstance(key, list)
+            and len(key) == key_length
+            and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in key)
+        )
+    except (ValueError, KeyError, TypeError, UnicodeError):
+        valid = False
+    if not valid:
+        raise InvalidCursor("Invalid cursor")
+    return key
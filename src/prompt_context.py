@@ -5,10 +5,11 @@ from .domain.rubrics import build_rubric_text
 
 
 def build_prompt_context(category: str, notes: Optional[str]) -> str:
+    # Рубрика зависит только от категории и стабильнее заметок — ставим её первой
     parts: list[str] = []
-    if notes:
-        parts.append("Мнения экспертов по теме (конспект):\n" + notes)
     rubric = build_rubric_text(category)
     if rubric:
         parts.append(rubric)
+    if notes:
+        parts.append("Мнения экспертов по теме (конспект):\n" + notes)
     return "\n\n".join(parts) if parts else ""
@@ -0,0 +1,83 @@
+from __future__ import annotations
+import asyncio
+import random
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Mapping, Optional, Tuple
+
+import aiohttp
+from openai import APIConnectionError, APITimeoutError
+
+from .config import settings
+from .llm_limiter import LimiterRejected
+
+RETRYABLE_STATUSES = {408, 409, 425, 429, 500, 502, 503, 504}
+
+
+class ProviderError(Exception):
+    """Ошибка HTTP-ответа AI провайдера"""
+
+    def __init__(self, message: str, status: Optional[int] = None,
+                 retry_after: Optional[float] = None, retryable: Optional[bool] = None) -> None:
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+        self._retryable = retryable
+
+    @property
+    def retryable(self) -> bool:
+        if self._retryable is not None:
+            return self._retryable
+        return self.status is None or self.status in RETRYABLE_STATUSES
+
+
+def parse_retry_after(headers: Optional[Mapping[str, str]]) -> Optional[float]:
+    """Retry-After в секундах или HTTP-дате, а также retry-after-ms (OpenAI)"""
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms") or headers.get("Retry-After-Ms")
+    if value:
+        try:
+            return max(float(value) / 1000.0, 0.0)
+        except ValueError:
+            pass
+    value = headers.get("retry-after") or headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max((when - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+def classify_error(error: BaseException) -> Tuple[bool, Optional[float]]:
+    """(можно ли повторять, сколько ждать по Retry-After) для ошибки вызова провайдера"""
+    if isinstance(error, ProviderError):
+        return error.retryable, error.retry_after
+    if isinstance(error, LimiterRejected):
+        # локальная перегрузка: повтор того же провайдера её только усилит
+        return False, None
+    if isinstance(error, (asyncio.TimeoutError, aiohttp.ClientError, APITimeoutError, APIConnectionError)):
+        return True, None
+    status = getattr(error, "status_code", None)
+    if isinstance(status, int):
+        headers = getattr(getattr(error, "response", None), "headers", None)
+        return status in RETRYABLE_STATUSES, parse_retry_after(headers)
+    # ошибки разбора ответа и прочие детерминированные сбои не повторяем
+    return False, None
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """Экспоненциальная задержка с full jitter; Retry-After провайдера имеет приоритет"""
+    ceiling = min(settings.ai_retry_max_delay, settings.ai_retry_base_delay * (2 ** attempt))
+    delay = random.uniform(0, ceiling)
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, settings.ai_retry_after_max))
+    return delay
@@ -0,0 +1,335 @@
+from __future__ import annotations
+import asyncio
+import logging
+import threading
+from collections import deque
+from time import monotonic
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional, Set
+
+from .config import settings
+from .evaluation_parser import EvaluationParseError
+from .evaluation_prompt import EvaluationPrompt, prompt_builder
+from .models import AnswerEvaluation, Question
+from .provider_errors import ProviderError, backoff_delay, classify_error
+from .services import AIService, error_evaluation
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """Circuit breaker провайдера: closed → open после серии сбоев → half-open (одна пробная попытка)"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = monotonic) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self.opens = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+        return self._state
+
+    def allow(self) -> bool:
+        """Можно ли сейчас звать провайдера; в half-open пропускает ровно одну пробу"""
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._probe_in_flight or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self.opens += 1
+                self._state = self.OPEN
+                self._opened_at = self._clock()
+            self._probe_in_flight = False
+
+    def release(self) -> None:
+        """Вызов завершился без вердикта о здоровье провайдера (отмена, ошибка клиента)"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {"state": self.state, "consecutive_failures": self._failures, "opens": self.opens}
+
+
+class _ProviderState:
+    def __init__(self, provider: AIService, breaker: CircuitBreaker) -> None:
+        self.provider = provider
+        self.breaker = breaker
+        self.latencies: Deque[float] = deque(maxlen=200)
+        self.calls = 0
+        self.transport_failures = 0
+        self.parse_failures = 0
+
+    @property
+    def name(self) -> str:
+        return self.provider.name
+
+    def p95(self) -> Optional[float]:
+        if len(self.latencies) < 20:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+
+class ProviderRouter(AIService):
+    """Маршрутизатор оценок между провайдерами.
+
+    Провайдеры перебираются в порядке приоритета, пропуская те, чей breaker разомкнут.
+    Повторяемые сбои (429/5xx, таймауты) сначала переключают на другой провайдер и
+    лишь затем повторяют уже опробованный с jittered backoff. Hedging (опционально)
+    дублирует вызов в резервный провайдер, если основной не ответил к своему p95.
+    """
+
+    name = "router"
+
+    def __init__(self, providers: List[AIService]) -> None:
+        if not providers:
+            raise ValueError("ProviderRouter requires at least one provider")
+        self._states = [
+            _ProviderState(
+                p,
+                CircuitBreaker(settings.ai_breaker_failure_threshold, settings.ai_breaker_reset_timeout),
+            )
+            for p in providers
+        ]
+        self.failovers = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    @property
+    def providers(self) -> List[AIService]:
+        return [s.provider for s in self._states]
+
+    @property
+    def supports_transcription(self) -> bool:
+        return any(s.provider.supports_transcription for s in self._states)
+
+    async def evaluate_answer(self, question: Question, user_answer: str,
+                              answer_type: str = "text",
+                              multi_agent_notes: Optional[str] = None) -> AnswerEvaluation:
+        prompt = prompt_builder.build(question, user_answer, answer_type, multi_agent_notes)
+        try:
+            return await self.evaluate_prompt(prompt)
+        except Exception as e:
+            logger.error(f"Ошибка при оценке ответа (все провайдеры): {e}")
+            return error_evaluation()
+
+    async def evaluate_prompt(self, prompt: EvaluationPrompt) -> AnswerEvaluation:
+        tried: Set[str] = set()
+        last_error: Optional[Exception] = None
+        retry_after: Optional[float] = None
+        for attempt in range(settings.ai_max_attempts):
+            state = await self._next_state(tried, attempt, retry_after)
+            if state is None:
+                break
+            try:
+                return await self._call_hedged(state, prompt, tried)
+            except Exception as e:
+                retryable, retry_after = classify_error(e)
+                last_error = e
+                logger.warning(f"{state.name} evaluate attempt {attempt+1} failed (retryable={retryable}): {e}")
+                if not retryable:
+                    raise
+        raise last_error or ProviderError("all AI providers are unavailable", retryable=False)
+
+    async def stream_prompt(self, prompt: EvaluationPrompt) -> AsyncIterator[str]:
+        """Стриминг с failover до первого чанка; после начала ответа провайдер уже не меняется"""
+        tried: Set[str] = set()
+        last_error: Optional[Exception] = None
+        retry_after: Optional[float] = None
+        for attempt in range(settings.ai_max_attempts):
+            state = await self._next_state(tried, attempt, retry_after)
+            if state is None:
+                break
+            state.calls += 1
+            started = monotonic()
+            stream = state.provider.stream_prompt(prompt)
+            try:
+                try:
+                    first = await stream.__anext__()
+                except StopAsyncIteration:
+                    state.breaker.release()
+                    return
+                except asyncio.CancelledError:
+                    state.breaker.release()
+                    raise
+                except Exception as e:
+                    self._on_failure(state, e)
+                    retryable, retry_after = classify_error(e)
+                    last_error = e
+                    logger.warning(f"{state.name} stream attempt {attempt+1} failed (retryable={retryable}): {e}")
+                    if not retryable:
+                        raise
+                    continue
+
+                try:
+                    yield first
+                    async for chunk in stream:
+                        yield chunk
+                except Exception as e:
+                    self._on_failure(state, e)
+                    raise
+                except BaseException:
+                    state.breaker.release()
+                    raise
+                self._on_success(state, monotonic() - started)
+                return
+            finally:
+                await stream.aclose()
+        raise last_error or ProviderError("all AI providers are unavailable", retryable=False)
+
+    async def _next_state(self, tried: Set[str], attempt: int,
+                          retry_after: Optional[float]) -> Optional[_ProviderState]:
+        """Следующий провайдер: сначала ещё не опробованные, повтор того же — только после backoff"""
+        state = self._pick(tried)
+        if state is None:
+            state = self._pick(set())
+            if state is None:
+                return None
+            await asyncio.sleep(backoff_delay(attempt, retry_after))
+        elif tried:
+            self.failovers += 1
+        tried.add(state.name)
+        return state
+
+    def _pick(self, skip: Set[str]) -> Optional[_ProviderState]:
+        for state in self._states:
+            if state.name in skip:
+                continue
+            if state.breaker.allow():
+                return state
+        return None
+
+    async def _call_hedged(self, primary: _ProviderState, prompt: EvaluationPrompt,
+                           tried: Set[str]) -> AnswerEvaluation:
+        if not settings.ai_hedge_enabled or len(self._states) < 2:
+            return await self._call(primary, prompt)
+
+        tasks = [asyncio.ensure_future(self._call(primary, prompt))]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self._hedge_delay(primary))
+            if done:
+                return tasks[0].result()
+            backup = self._pick(tried)
+            if backup is None:
+                return await tasks[0]
+            tried.add(backup.name)
+            self.hedges += 1
+            logger.info(f"Hedging {primary.name} -> {backup.name}")
+            tasks.append(asyncio.ensure_future(self._call(backup, prompt)))
+
+            pending = set(tasks)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is tasks[1]:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # проигравший вызов отменяем, чтобы не держать слот лимитера
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def _hedge_delay(self, state: _ProviderState) -> float:
+        p95 = state.p95()
+        if p95 is None:
+            return settings.ai_hedge_delay_default
+        return max(settings.ai_hedge_min_delay, p95)
+
+    async def _call(self, state: _ProviderState, prompt: EvaluationPrompt) -> AnswerEvaluation:
+        state.calls += 1
+        started = monotonic()
+        try:
+            result = await state.provider.evaluate_prompt(prompt)
+        except asyncio.CancelledError:
+            state.breaker.release()
+            raise
+        except Exception as e:
+            self._on_failure(state, e)
+            raise
+        self._on_success(state, monotonic() - started)
+        return result
+
+    @staticmethod
+    def _on_success(state: _ProviderState, latency: float) -> None:
+        state.breaker.record_success()
+        state.latencies.append(latency)
+
+    @staticmethod
+    def _on_failure(state: _ProviderState, error: Exception) -> None:
+        if isinstance(error, EvaluationParseError):
+            state.parse_failures += 1
+        else:
+            state.transport_failures += 1
+        retryable, _ = classify_error(error)
+        # breaker считает только сбои провайдера; ошибки разбора и 4xx о его здоровье не говорят
+        if retryable:
+            state.breaker.record_failure()
+        else:
+            state.breaker.release()
+
+    async def transcribe_voice(self, voice_file_path: str) -> str:
+        for state in self._states:
+            if state.provider.supports_transcription and state.breaker.state != CircuitBreaker.OPEN:
+                text = await state.provider.transcribe_voice(voice_file_path)
+                if text:
+                    return text
+        if not self.supports_transcription:
+            return await self._states[0].provider.transcribe_voice(voice_file_path)
+        return ""
+
+    async def close(self) -> None:
+        for state in self._states:
+            await state.provider.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "providers": {
+                s.name: {
+                    **s.breaker.stats(),
+                    "calls": s.calls,
+                    "transport_failures": s.transport_failures,
+                    "parse_failures": s.parse_failures,
+                    "p95_latency": round(s.p95() or 0.0, 3),
+                }
+                for s in self._states
+            },
+            "failovers": self.failovers,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+        }
@@ -0,0 +1,198 @@
+from __future__ import annotations
+import csv
+import json
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, IO, Iterable, Iterator, List, Optional
+
+from yaml.composer import Composer
+from yaml.events import SequenceEndEvent, SequenceStartEvent, StreamEndEvent
+
+from .domain.entities import QuestionEntity
+
+try:
+    # libyaml: разбор в C в разы быстрее чистого Python
+    from yaml import CSafeLoader as _SafeLoader
+except ImportError:  # PyYAML собран без libyaml
+    from yaml import SafeLoader as _SafeLoader
+
+FORMATS = ("yaml", "jsonl", "csv")
+DEFAULT_BATCH_SIZE = 500
+MAX_REPORTED_ERRORS = 20
+
+_SUFFIX_FORMATS = {".yaml": "yaml", ".yml": "yaml", ".jsonl": "jsonl", ".ndjson": "jsonl", ".csv": "csv"}
+# В CSV списки (hints, tags) записываются через «|»
+_CSV_LIST_SEPARATOR = "|"
+
+
+class _ItemLoader(_SafeLoader):
+    """Загрузчик, собирающий элементы верхнего списка по одному.
+
+    C-загрузчик строит узлы только целым документом, а банк вопросов — один большой
+    список. Composer из чистого Python работает поверх событий C-парсера, поэтому в
+    памяти одновременно держится лишь текущий вопрос.
+    """
+
+    compose_node = Composer.compose_node
+    compose_scalar_node = Composer.compose_scalar_node
+    compose_sequence_node = Composer.compose_sequence_node
+    compose_mapping_node = Composer.compose_mapping_node
+
+    def __init__(self, stream) -> None:
+        super().__init__(stream)
+        self.anchors = {}
+
+    def next_item(self) -> Any:
+        """Очередной элемент; якоря живут в пределах элемента, как в Composer.compose_document"""
+        item = self.construct_document(self.compose_node(None, None))
+        self.anchors = {}
+        return item
+
+
+def detect_format(path: str | Path) -> str:
+    fmt = _SUFFIX_FORMATS.get(Path(path).suffix.lower())
+    if not fmt:
+        raise ValueError(f"Cannot detect format of {path}, use one of: {', '.join(FORMATS)}")
+    return fmt
+
+
+def iter_yaml(stream: IO) -> Iterator[Any]:
+    """Элементы верхнего списка; документ без списка (в потоке из нескольких ``---``) — сам элемент"""
+    loader = _ItemLoader(stream)
+    try:
+        loader.get_event()  # StreamStart
+        while not loader.check_event(StreamEndEvent):
+            loader.get_event()  # DocumentStart
+            if loader.check_event(SequenceStartEvent):
+                loader.get_event()
+                while not loader.check_event(SequenceEndEvent):
+                    yield loader.next_item()
+                loader.get_event()
+            else:
+                yield loader.next_item()
+            loader.get_event()  # DocumentEnd
+    finally:
+        loader.dispose()
+
+
+def iter_jsonl(stream: IO) -> Iterator[Any]:
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+def iter_csv(stream: IO) -> Iterator[Dict[str, Any]]:
+    for row in csv.DictReader(stream):
+        item: Dict[str, Any] = {k: v for k, v in row.items() if k and v not in (None, "")}
+        for key in ("hints", "tags"):
+            if key in item:
+                item[key] = [part.strip() for part in item[key].split(_CSV_LIST_SEPARATOR) if part.strip()]
+        yield item
+
+
+def iter_records(path: str | Path, fmt: Optional[str] = None) -> Iterator[Any]:
+    """Потоковое чтение файла: записи отдаются по одной, файл целиком в память не грузится"""
+    fmt = fmt or detect_format(path)
+    if fmt == "yaml":
+        with open(path, "rb") as f:
+            yield from iter_yaml(f)
+    elif fmt == "jsonl":
+        with open(path, "r", encoding="utf-8") as f:
+            yield from iter_jsonl(f)
+    elif fmt == "csv":
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            yield from iter_csv(f)
+    else:
+        raise ValueError(f"Unknown format {fmt!r}, use one of: {', '.join(FORMATS)}")
+
+
+def to_entity(item: Any) -> QuestionEntity:
+    if not isinstance(item, dict):
+        raise ValueError("record is not a mapping")
+    try:
+        entity = QuestionEntity(
+            id=0,
+            title=item["title"],
+            content=item["content"],
+            level=item["level"],
+            category=item["category"],
+            question_type=item.get("question_type") or "text",
+            points=int(item.get("points") or 10),
+            correct_answer=item["correct_answer"],
+            explanation=item.get("explanation"),
+            hints=item.get("hints"),
+            tags=item.get("tags"),
+        )
+    except KeyError as e:
+        raise ValueError(f"missing field {e.args[0]}")
+    entity.validate()
+    return entity
+
+
+@dataclass
+class ImportStats:
+    read: int = 0
+    invalid: int = 0
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    duplicates: int = 0  # повторы одного вопроса внутри пакета
+    batches: int = 0
+    errors: List[str] = field(default_factory=list)
+    started: float = field(default_factory=time.monotonic)
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    @property
+    def rate(self) -> float:
+        """Записей в секунду"""
+        return self.read / self.elapsed if self.elapsed > 0 else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"{self.read} read: {self.inserted} new, {self.updated} updated, {self.unchanged} unchanged, "
+            f"{self.duplicates} duplicates, {self.invalid} invalid in {self.elapsed:.1f}s ({self.rate:.0f} rows/s)"
+        )
+
+
+async def import_questions(
+    records: Iterable[Any],
+    service,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    on_batch: Optional[Callable[[ImportStats], None]] = None,
+) -> ImportStats:
+    """Валидация и upsert пакетами по batch_size записей, каждый пакет — одна транзакция.
+
+    service — QuestionAppService (import_batch). Невалидные записи пропускаются
+    и попадают в stats.errors; повторный импорт того же файла ничего не меняет.
+    """
+    stats = ImportStats()
+    batch: List[QuestionEntity] = []
+
+    async def flush() -> None:
+        result = await service.import_batch(batch)
+        stats.inserted += result.inserted
+        stats.updated += result.updated
+        stats.unchanged += result.unchanged
+        stats.duplicates += len(batch) - result.inserted - result.updated - result.unchanged
+        stats.batches += 1
+        batch.clear()
+        if on_batch:
+            on_batch(stats)
+
+    for item in records:
+        stats.read += 1
+        try:
+            batch.append(to_entity(item))
+        except (ValueError, TypeError) as e:
+            stats.invalid += 1
+            if len(stats.errors) < MAX_REPORTED_ERRORS:
+                stats.errors.append(f"record {stats.read}: {e}")
+        if len(batch) >= batch_size:
+            await flush()
+    if batch:
+        await flush()
+    return stats
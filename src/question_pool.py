@@ -0,0 +1,153 @@
+from __future__ import annotations
+import logging
+import random
+import threading
+import time
+from array import array
+from typing import Any, Container, Dict, Iterable, Optional, Tuple
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+PoolKey = Tuple[str, str]
+
+
+class QuestionPool:
+    """Индекс id вопросов по (level, category) для выбора случайного вопроса за O(1).
+
+    Id хранятся в компактных array('q'), а не в списках объектов: 100k вопросов — около
+    800 КБ. Случайный выбор — индекс в массиве; исключённые id (уже заданные вопросы)
+    отбрасываются повторной выборкой, а если исключено почти всё — один проход по пулу.
+    Пул строится одним запросом при старте и обновляется при создании, правке и удалении
+    вопросов; изменения из других процессов подхватываются перестройкой раз в
+    ``question_pool_refresh_seconds``.
+    """
+
+    def __init__(self, rng: Optional[random.Random] = None, max_rejections: int = 16) -> None:
+        self._pools: Dict[PoolKey, array] = {}
+        self._lock = threading.Lock()  # бот и API могут работать в разных потоках одного процесса
+        self._loading = False
+        self._rng = rng or random.Random()
+        self.max_rejections = max_rejections
+        self.loaded_at: Optional[float] = None
+        self.picks = 0
+        self.rejections = 0
+        self.scans = 0
+
+    @property
+    def loaded(self) -> bool:
+        return self.loaded_at is not None
+
+    def build(self, rows: Iterable[Tuple[int, str, str]]) -> None:
+        """Полная перестройка из (id, level, category)"""
+        pools: Dict[PoolKey, array] = {}
+        for question_id, level, category in rows:
+            pools.setdefault((level, category), array("q")).append(question_id)
+        with self._lock:
+            self._pools = pools
+            self.loaded_at = time.monotonic()
+
+    async def load(self) -> None:
+        """Строит пул по таблице questions (только id, level, category)"""
+        from sqlalchemy import select
+        from .database import database, Question as QuestionORM
+
+        async with database.get_session() as session:
+            result = await session.stream(select(QuestionORM.id, QuestionORM.level, QuestionORM.category))
+            rows = [tuple(row) async for row in result]
+        self.build(rows)
+        logger.info(f"Question pool loaded: {len(rows)} questions in {len(self._pools)} pools")
+
+    async def ensure_loaded(self) -> bool:
+        """Загружает пул при первом обращении и перестраивает устаревший; False — пул недоступен"""
+        refresh = settings.question_pool_refresh_seconds
+        if self.loaded and (refresh <= 0 or time.monotonic() - self.loaded_at < refresh):
+            return True
+        if self._loading and self.loaded:
+            # перестройку уже выполняет другой запрос; пока отдаём из текущего пула
+            return True
+        self._loading = True
+        try:
+            await self.load()
+        except Exception as e:
+            logger.warning(f"Question pool load failed, falling back to SQL: {e}")
+            return self.loaded
+        finally:
+            self._loading = False
+        return True
+
+    def invalidate(self) -> None:
+        """Пул перестроится при следующем обращении"""
+        with self._lock:
+            self.loaded_at = None
+
+    def add(self, question_id: int, level: str, category: str) -> None:
+        with self._lock:
+            self._remove_locked(question_id)
+            self._pools.setdefault((level, category), array("q")).append(question_id)
+
+    def update(self, question_id: int, level: str, category: str) -> None:
+        """Вопрос мог сменить уровень или категорию — переносим id в нужный пул"""
+        self.add(question_id, level, category)
+
+    def remove(self, question_id: int) -> bool:
+        with self._lock:
+            return self._remove_locked(question_id)
+
+    def _remove_locked(self, question_id: int) -> bool:
+        # удаление — редкая админская операция, поэтому линейный поиск вместо словаря позиций
+        for key, ids in self._pools.items():
+            try:
+                index = ids.index(question_id)
+            except ValueError:
+                continue
+            ids[index] = ids[-1]
+            ids.pop()
+            if not ids:
+                del self._pools[key]
+            return True
+        return False
+
+    def pick(self, level: str, category: str, exclude: Optional[Container[int]] = None) -> Optional[int]:
+        """Случайный id из пула (level, category), не входящий в exclude; None — подходящих нет"""
+        with self._lock:
+            ids = self._pools.get((level, category))
+            if not ids:
+                return None
+            self.picks += 1
+            if not exclude:
+                return ids[self._rng.randrange(len(ids))]
+            for _ in range(self.max_rejections):
+                candidate = ids[self._rng.randrange(len(ids))]
+                if candidate not in exclude:
+                    return candidate
+                self.rejections += 1
+            # почти весь пул исключён: выбираем из оставшихся за один проход
+            self.scans += 1
+            remaining = [i for i in ids if i not in exclude]
+            return self._rng.choice(remaining) if remaining else None
+
+    def size(self, level: str, category: str) -> int:
+        with self._lock:
+            return len(self._pools.get((level, category), ()))
+
+    def sizes(self) -> Dict[str, int]:
+        with self._lock:
+            return {f"{level}/{category}": len(ids) for (level, category), ids in sorted(self._pools.items())}
+
+    def stats(self) -> Dict[str, Any]:
+        sizes = self.sizes()
+        return {
+            "loaded": self.loaded,
+            "age_seconds": round(time.monotonic() - self.loaded_at, 1) if self.loaded else None,
+            "total": sum(sizes.values()),
+            "pools": sizes,
+            "picks": self.picks,
+            "rejections": self.rejections,
+            "scans": self.scans,
+        }
+
+
+# Глобальный пул вопросов процесса
+question_pool = QuestionPool()
@@ -0,0 +1,238 @@
+from __future__ import annotations
+import logging
+from array import array
+from bisect import bisect_right
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+from .cache_utils import LRUCache
+from .config import settings
+from .domain.ports import QuestionRepository, UserRepository
+from .models import Question
+
+logger = logging.getLogger(__name__)
+
+_FORMAT_VERSION = 2
+# v1 хранил наборы по категории без уровня; к пулам (уровень, категория) он не сводится
+_LEGACY_VERSIONS = {1}
+
+
+class RunBitmap:
+    """Множество id вопросов в виде отсортированных интервалов [start, end).
+
+    Id вопросов выдаются подряд, поэтому пройденные вопросы быстро склеиваются в
+    несколько длинных интервалов: проверка ``id in bitmap`` — бинарный поиск по началам
+    интервалов, а сериализованный размер зависит от числа интервалов, а не вопросов.
+    """
+
+    __slots__ = ("_starts", "_ends")
+
+    def __init__(self) -> None:
+        self._starts = array("q")
+        self._ends = array("q")
+
+    def __contains__(self, question_id: object) -> bool:
+        if not isinstance(question_id, int):
+            return False
+        i = bisect_right(self._starts, question_id) - 1
+        return i >= 0 and question_id < self._ends[i]
+
+    def add(self, question_id: int) -> bool:
+        """Добавляет id; False — уже был"""
+        i = bisect_right(self._starts, question_id) - 1
+        if i >= 0 and question_id < self._ends[i]:
+            return False
+        joins_left = i >= 0 and self._ends[i] == question_id
+        joins_right = i + 1 < len(self._starts) and self._starts[i + 1] == question_id + 1
+        if joins_left and joins_right:
+            self._ends[i] = self._ends[i + 1]
+            del self._starts[i + 1]
+            del self._ends[i + 1]
+        elif joins_left:
+            self._ends[i] = question_id + 1
+        elif joins_right:
+            self._starts[i + 1] = question_id
+        else:
+            self._starts.insert(i + 1, question_id)
+            self._ends.insert(i + 1, question_id + 1)
+        return True
+
+    def __len__(self) -> int:
+        return sum(end - start for start, end in zip(self._starts, self._ends))
+
+    def __bool__(self) -> bool:
+        return len(self._starts) > 0
+
+    def __iter__(self) -> Iterator[int]:
+        for start, end in zip(self._starts, self._ends):
+            yield from range(start, end)
+
+    @property
+    def runs(self) -> int:
+        return len(self._starts)
+
+    def encode(self, out: bytearray) -> None:
+        """Число интервалов, затем (разрыв от конца предыдущего, длина) — varint"""
+        _write_varint(out, len(self._starts))
+        prev = 0
+        for start, end in zip(self._starts, self._ends):
+            _write_varint(out, start - prev)
+            _write_varint(out, end - start)
+            prev = end
+
+    @classmethod
+    def decode(cls, data: bytes, pos: int) -> Tuple["RunBitmap", int]:
+        bitmap = cls()
+        count, pos = _read_varint(data, pos)
+        prev = 0
+        for _ in range(count):
+            gap, pos = _read_varint(data, pos)
+            length, pos = _read_varint(data, pos)
+            start = prev + gap
+            bitmap._starts.append(start)
+            bitmap._ends.append(start + length)
+            prev = start + length
+        return bitmap, pos
+
+
+def _write_varint(out: bytearray, value: int) -> None:
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return
+
+
+def _read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    result = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+def seen_key(level: str, category: str) -> str:
+    """Ключ набора: вопросы выбираются из пула (уровень, категория), прогресс ведётся так же"""
+    return f"{level}/{category}"
+
+
+def encode_seen(seen: Dict[str, RunBitmap]) -> bytes:
+    """Пройденные вопросы пользователя по ключам seen_key -> blob для users.seen_questions"""
+    out = bytearray([_FORMAT_VERSION])
+    keys = [(k, b) for k, b in sorted(seen.items()) if b]
+    _write_varint(out, len(keys))
+    for key, bitmap in keys:
+        name = key.encode("utf-8")
+        _write_varint(out, len(name))
+        out.extend(name)
+        bitmap.encode(out)
+    return bytes(out)
+
+
+def decode_seen(data: Optional[bytes]) -> Dict[str, RunBitmap]:
+    if not data or data[0] in _LEGACY_VERSIONS:
+        return {}
+    if data[0] != _FORMAT_VERSION:
+        raise ValueError(f"unknown seen_questions format {data[0]}")
+    seen: Dict[str, RunBitmap] = {}
+    count, pos = _read_varint(data, 1)
+    for _ in range(count):
+        size, pos = _read_varint(data, pos)
+        key = bytes(data[pos:pos + size]).decode("utf-8")
+        seen[key], pos = RunBitmap.decode(data, pos + size)
+    return seen
+
+
+class SeenQuestionsStore:
+    """Пройденные вопросы пользователей: blob в users.seen_questions плюс LRU в памяти.
+
+    Блоб пишется тем же UPDATE, что и current_question_id (см. QuestionAppService).
+    LRU общий только внутри процесса и служит лишь для исключений при выборе вопроса:
+    отметка и сброс перечитывают blob из БД (на Postgres — FOR UPDATE) и меняют его,
+    поэтому бот и API не затирают записи друг друга. Вызывающий сохраняет blob в той же
+    единице работы, что и чтение.
+    """
+
+    def __init__(self, users: UserRepository, maxsize: Optional[int] = None, ttl: Optional[float] = None) -> None:
+        self.users = users
+        self._cache: LRUCache[int, Dict[str, RunBitmap]] = LRUCache(
+            maxsize if maxsize is not None else settings.seen_cache_size,
+            ttl if ttl is not None else settings.seen_cache_ttl_seconds,
+        )
+        self.resets = 0
+
+    async def get(self, telegram_id: int) -> Dict[str, RunBitmap]:
+        seen = self._cache.get(telegram_id)
+        if seen is None:
+            seen = await self._read(telegram_id)
+            self._cache.set(telegram_id, seen)
+        return seen
+
+    async def _read(self, telegram_id: int, for_update: bool = False) -> Dict[str, RunBitmap]:
+        blob = await self.users.get_seen_questions(telegram_id, for_update=for_update)
+        try:
+            return decode_seen(blob)
+        except (ValueError, IndexError, UnicodeDecodeError) as e:
+            logger.warning(f"Corrupted seen_questions for user {telegram_id}, starting over: {e}")
+            return {}
+
+    async def _update(self, telegram_id: int, change: Callable[[Dict[str, RunBitmap]], Any]) -> bytes:
+        """Чтение из БД, изменение и новый blob; кэш не бывает основой записи"""
+        seen = await self._read(telegram_id, for_update=True)
+        change(seen)
+        self._cache.set(telegram_id, seen)
+        return encode_seen(seen)
+
+    async def exclusions(self, telegram_id: int, level: str, category: str) -> RunBitmap:
+        seen = await self.get(telegram_id)
+        return seen.get(seen_key(level, category)) or RunBitmap()
+
+    async def mark(self, telegram_id: int, level: str, category: str, question_id: int) -> bytes:
+        """Отмечает вопрос пройденным и возвращает новый blob для сохранения"""
+        key = seen_key(level, category)
+        return await self._update(telegram_id, lambda seen: seen.setdefault(key, RunBitmap()).add(question_id))
+
+    async def next_unseen(self, questions: QuestionRepository, telegram_id: int, level: str, category: str) -> Tuple[Optional[Question], Optional[bytes]]:
+        """Случайный непройденный вопрос и blob с отметкой о нём.
+
+        Когда пройдена вся категория на этом уровне, прогресс по ней начинается заново;
+        наборы других уровней не трогаются.
+        """
+        key = seen_key(level, category)
+        exclude = await self.exclusions(telegram_id, level, category)
+        question = await questions.get_random(level, category, exclude)
+        restart = question is None and bool(exclude)
+        if restart:
+            question = await questions.get_random(level, category, None)
+        if question is None:
+            return None, None
+
+        def change(seen: Dict[str, RunBitmap]) -> None:
+            if restart:
+                seen.pop(key, None)
+            seen.setdefault(key, RunBitmap()).add(question.id)
+
+        if restart:
+            self.resets += 1
+        # сброс и отметка — один blob: вызывающий сохраняет только его
+        return question, await self._update(telegram_id, change)
+
+    async def reset(self, telegram_id: int, category: Optional[str] = None) -> bytes:
+        """Сбрасывает прогресс по категории на всех уровнях (или по всем) и возвращает новый blob"""
+        self.resets += 1
+        if category is None:
+            return await self._update(telegram_id, lambda seen: seen.clear())
+
+        def change(seen: Dict[str, RunBitmap]) -> None:
+            for key in [k for k in seen if k.partition("/")[2] == category]:
+                del seen[key]
+
+        return await self._update(telegram_id, change)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"cache": self._cache.stats(), "resets": self.resets}
@@ -1,8 +1,9 @@
 import asyncio
 import logging
 import json
-from typing import Dict, List, Optional, Tuple
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 from datetime import datetime, timedelta
+from time import monotonic
 from openai import AsyncOpenAI
 from pydub import AudioSegment
 import aiofiles
@@ -13,149 +14,221 @@ from .config import settings
 from .interview_service import InterviewService
 from .database import database
 from .models import User, Question, Answer, UserStats, AnswerEvaluation
-from .prompt_context import build_prompt_context
+from .evaluation_prompt import EvaluationPrompt, prompt_builder, prompt_usage
+from .evaluation_parser import parse_evaluation
+from .leaderboard import leaderboard
+from .llm_limiter import llm_limiter
+from .provider_errors import ProviderError, backoff_delay, classify_error, parse_retry_after
 
 logger = logging.getLogger(__name__)
 
+# Ответ-заглушка при неудачной оценке (не кэшируется)
+EVALUATION_ERROR_FEEDBACK = "Произошла ошибка при оценке ответа. Попробуйте еще раз."
+
+
+def error_evaluation() -> AnswerEvaluation:
+    return AnswerEvaluation(answer_id=0, score=0, feedback=EVALUATION_ERROR_FEEDBACK, is_correct=False)
+
 
 class AIService:
-    """Базовый класс для AI сервисов"""
-    
+    """Базовый класс для AI сервисов.
+
+    Провайдер реализует одну попытку вызова (``evaluate_prompt``/``stream_prompt``),
+    а повторы с backoff и классификацией ошибок живут здесь.
+    """
+
+    name = "base"
+    supports_transcription = False
+
     async def evaluate_answer(self, question: Question, user_answer: str,
                               answer_type: str = "text",
                               multi_agent_notes: Optional[str] = None) -> AnswerEvaluation:
         """Оценка ответа пользователя"""
+        prompt = prompt_builder.build(question, user_answer, answer_type, multi_agent_notes)
+        for attempt in range(settings.ai_max_attempts):
+            try:
+                return await self.evaluate_prompt(prompt)
+            except Exception as e:
+                retryable, retry_after = classify_error(e)
+                logger.warning(f"{self.name} evaluate attempt {attempt+1} failed (retryable={retryable}): {e}")
+                if not retryable or attempt == settings.ai_max_attempts - 1:
+                    logger.error(f"Ошибка при оценке ответа {self.name}: {e}")
+                    return error_evaluation()
+                await asyncio.sleep(backoff_delay(attempt, retry_after))
+        return error_evaluation()
+
+    async def stream_evaluation(self, question: Question, user_answer: str,
+                                answer_type: str = "text",
+                                multi_agent_notes: Optional[str] = None) -> AsyncIterator[str]:
+        """Потоковая оценка: текстовые чанки JSON-ответа модели"""
+        prompt = prompt_builder.build(question, user_answer, answer_type, multi_agent_notes)
+        async for chunk in self.stream_prompt(prompt):
+            yield chunk
+
+    async def evaluate_prompt(self, prompt: EvaluationPrompt) -> AnswerEvaluation:
+        """Одна попытка оценки готового промпта; ошибки пробрасываются наверх"""
         raise NotImplementedError
-    
+
+    async def stream_prompt(self, prompt: EvaluationPrompt) -> AsyncIterator[str]:
+        """Одна попытка потоковой оценки.
+
+        По умолчанию стриминг не поддерживается — отдаём готовый JSON одним чанком.
+        """
+        evaluation = await self.evaluate_prompt(prompt)
+        yield json.dumps(
+            {"score": evaluation.score, "feedback": evaluation.feedback, "is_correct": evaluation.is_correct},
+            ensure_ascii=False,
+        )
+
     async def transcribe_voice(self, voice_file_path: str) -> str:
         """Транскрипция голосового сообщения"""
         raise NotImplementedError
 
+    async def close(self) -> None:
+        """Освобождение ресурсов провайдера"""
+
+    @staticmethod
+    def _parse_evaluation(content: str, max_score: Optional[int] = None) -> AnswerEvaluation:
+        # терпимый разбор: ограждения, преамбула и мелкие дефекты JSON не тратят повторный вызов
+        return AnswerEvaluation(answer_id=0, **parse_evaluation(content, max_score))
+
+
+# Модели OpenAI с поддержкой response_format={"type": "json_object"}
+_OPENAI_JSON_MODE_PREFIXES = ("gpt-4o", "gpt-4-turbo", "gpt-4-1106", "gpt-4-0125", "gpt-4.1", "gpt-3.5-turbo")
+
+
+def _openai_supports_json_mode(model: str) -> bool:
+    return model.startswith(_OPENAI_JSON_MODE_PREFIXES) and model not in ("gpt-3.5-turbo-0613", "gpt-3.5-turbo-0301")
+
 
 class OpenAIService(AIService):
     """Сервис для работы с OpenAI API"""
-    
-    def __init__(self):
-        # Настраиваем таймауты и базовые ретраи SDK
+
+    name = "openai"
+    supports_transcription = True
+
+    def __init__(self, base_url: Optional[str] = None):
+        # Ретраи SDK отключены: повторами и failover управляет AIService/ProviderRouter
         self.client = AsyncOpenAI(
             api_key=settings.openai_api_key,
+            base_url=base_url or settings.openai_base_url or None,
             timeout=20.0,
-            max_retries=2,
+            max_retries=0,
         )
-        self._max_retries = 3
         self.docs_client = None  # Удалено по требованию
-    
-    async def evaluate_answer(self, question: Question, user_answer: str,
-                            answer_type: str = "text",
-                            multi_agent_notes: Optional[str] = None) -> AnswerEvaluation:
+        self.model = settings.openai_model
+        self.json_mode = _openai_supports_json_mode(self.model) if settings.openai_json_mode is None else settings.openai_json_mode
+
+    def _completion_kwargs(self, prompt: EvaluationPrompt) -> Dict:
+        kwargs = {
+            "model": self.model,
+            "messages": prompt.messages,
+            "temperature": 0.3,
+            "max_tokens": prompt.max_tokens,
+        }
+        if self.json_mode:
+            # JSON mode гарантирует синтаксически валидный объект
+            kwargs["response_format"] = {"type": "json_object"}
+        return kwargs
+
+    async def evaluate_prompt(self, prompt: EvaluationPrompt) -> AnswerEvaluation:
         """Оценка ответа пользователя с помощью OpenAI"""
-        context_section = build_prompt_context(question.category, multi_agent_notes)
+        started = monotonic()
+        async with llm_limiter.slot():
+            response = await self.client.chat.completions.create(**self._completion_kwargs(prompt))
+        self._record_usage(response, monotonic() - started, prompt.estimated_tokens)
+        return self._parse_evaluation(response.choices[0].message.content, prompt.max_score)
 
-        system_prompt = f"""
-        Ты эксперт по техническим собеседованиям. Оцени ответ кандидата на вопрос.
-        
-        Вопрос: {question.title}
-        Содержание: {question.content}
-        Правильный ответ: {question.correct_answer}
-        Объяснение: {question.explanation or "Нет объяснения"}
-        Уровень сложности: {question.level}
-        Категория: {question.category}
-        Максимальный балл: {question.points}
-        {context_section}
-        
-        Ответ кандидата: {user_answer}
-        Тип ответа: {answer_type}
-        
-        Оцени ответ по следующим критериям:
-        1. Точность и полнота ответа (0-{question.points//2} баллов)
-        2. Понимание концепций (0-{question.points//4} баллов)
-        3. Качество объяснения (0-{question.points//4} баллов)
-        
-        Верни JSON в формате:
-        {{
-            "score": число_баллов,
-            "feedback": "подробная обратная связь на русском языке",
-            "is_correct": true/false,
-            "strengths": ["сильные стороны ответа"],
-            "improvements": ["что можно улучшить"]
-        }}
-        """
+    async def stream_prompt(self, prompt: EvaluationPrompt) -> AsyncIterator[str]:
+        """Потоковая оценка ответа через OpenAI (stream=True)"""
+        # латентность — только ожидание провайдера: время потребителя чанков в неё не входит
+        async with llm_limiter.slot() as timer:
+            stream = await self.client.chat.completions.create(
+                **self._completion_kwargs(prompt),
+                stream=True,
+                stream_options={"include_usage": True},
+            )
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    with timer.paused():
+                        yield chunk.choices[0].delta.content
+                if getattr(chunk, "usage", None):
+                    self._record_usage(chunk, timer.elapsed(), prompt.estimated_tokens)
+
+    @staticmethod
+    def _record_usage(response, latency: float, estimated_tokens: Optional[int] = None) -> None:
+        usage = getattr(response, "usage", None)
+        if not usage:
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        prompt_usage.record(
+            "openai",
+            usage.prompt_tokens or 0,
+            (getattr(details, "cached_tokens", None) or 0) if details else 0,
+            usage.completion_tokens or 0,
+            latency,
+            estimated_tokens,
+        )
 
-        for attempt in range(self._max_retries):
-            try:
-                response = await self.client.chat.completions.create(
-                    model="gpt-4",
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": f"Оцени этот ответ: {user_answer}"}
-                    ],
-                    temperature=0.3,
-                    max_tokens=1000
-                )
-                result = json.loads(response.choices[0].message.content)
-                return AnswerEvaluation(
-                    answer_id=0,
-                    score=result["score"],
-                    feedback=result["feedback"],
-                    is_correct=result["is_correct"]
-                )
-            except Exception as e:
-                logger.warning(f"OpenAI evaluate attempt {attempt+1} failed: {e}")
-                if attempt == self._max_retries - 1:
-                    logger.error(f"Ошибка при оценке ответа OpenAI: {e}")
-                    return AnswerEvaluation(
-                        answer_id=0,
-                        score=0,
-                        feedback="Произошла ошибка при оценке ответа. Попробуйте еще раз.",
-                        is_correct=False
-                    )
-                await asyncio.sleep(0.5 * (2 ** attempt))
-    
     async def transcribe_voice(self, voice_file_path: str) -> str:
         """Транскрипция голосового сообщения"""
-        for attempt in range(self._max_retries):
+        for attempt in range(settings.ai_max_attempts):
             try:
                 with open(voice_file_path, "rb") as audio_file:
-                    transcript = await self.client.audio.transcriptions.create(
-                        model="whisper-1",
-                        file=audio_file,
-                        language="ru"
-                    )
+                    async with llm_limiter.slot():
+                        transcript = await self.client.audio.transcriptions.create(
+                            model="whisper-1",
+                            file=audio_file,
+                            language="ru"
+                        )
                     return transcript.text
             except Exception as e:
-                logger.warning(f"OpenAI transcribe attempt {attempt+1} failed: {e}")
-                if attempt == self._max_retries - 1:
+                retryable, retry_after = classify_error(e)
+                logger.warning(f"OpenAI transcribe attempt {attempt+1} failed (retryable={retryable}): {e}")
+                if not retryable or attempt == settings.ai_max_attempts - 1:
                     logger.error(f"Ошибка при транскрипции OpenAI: {e}")
                     return ""
-                await asyncio.sleep(0.5 * (2 ** attempt))
+                await asyncio.sleep(backoff_delay(attempt, retry_after))
+        return ""
+
+    async def close(self) -> None:
+        await self.client.close()
 
 
 class GigaChatService(AIService):
     """Сервис для работы с GigaChat API"""
-    
-    def __init__(self):
+
+    name = "gigachat"
+
+    def __init__(self, api_url: Optional[str] = None, auth_url: Optional[str] = None):
         self.client_id = settings.gigachat_client_id
         self.client_secret = settings.gigachat_client_secret
-        self.auth_url = settings.gigachat_auth_url
-        self.api_url = settings.gigachat_api_url
+        self.auth_url = auth_url or settings.gigachat_auth_url
+        self.api_url = (api_url or settings.gigachat_api_url).rstrip("/")
         self.access_token = None
         self.token_expiry: Optional[datetime] = None
-        self.session = aiohttp.ClientSession(timeout=ClientTimeout(total=20))
-        self._max_retries = 3
-    
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        # создаём лениво: сервис может быть сконструирован вне event loop (sync-зависимости FastAPI)
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=ClientTimeout(total=20))
+        return self._session
+
     async def _get_access_token(self) -> str:
         """Получение access token для GigaChat"""
         # проверяем валидность токена
         if self.access_token and self.token_expiry and datetime.utcnow() < self.token_expiry:
             return self.access_token
-        
+
         try:
             auth_data = {
                 "client_id": self.client_id,
                 "client_secret": self.client_secret,
                 "grant_type": "client_credentials"
             }
-            
+
             async with self.session.post(self.auth_url, data=auth_data) as response:
                 if response.status == 200:
                     token_data = await response.json()
@@ -166,119 +239,148 @@ class GigaChatService(AIService):
                     self.token_expiry = datetime.utcnow() + timedelta(seconds=max(expires_in - 30, 30))
                     return self.access_token
                 else:
-                    raise Exception(f"Ошибка авторизации GigaChat: {response.status}")
-                    
+                    raise ProviderError(f"Ошибка авторизации GigaChat: {response.status}", response.status)
+
         except Exception as e:
             logger.error(f"Ошибка при получении токена GigaChat: {e}")
             raise
-    
-    async def evaluate_answer(self, question: Question, user_answer: str,
-                            answer_type: str = "text",
-                            multi_agent_notes: Optional[str] = None) -> AnswerEvaluation:
+
+    async def _headers(self, prompt: EvaluationPrompt, stream: bool = False) -> Dict[str, str]:
+        access_token = await self._get_access_token()
+        headers = {
+            "Authorization": f"Bearer {access_token}",
+            "Content-Type": "application/json",
+            # X-Session-ID включает кэширование общего префикса на стороне GigaChat
+            "X-Session-ID": prompt.prefix_key,
+        }
+        if stream:
+            headers["Accept"] = "text/event-stream"
+        return headers
+
+    def _raise_for_status(self, response: aiohttp.ClientResponse) -> None:
+        if response.status == 200:
+            return
+        if response.status == 401:
+            # возможна просрочка токена — следующая попытка получит новый
+            self.access_token = None
+            self.token_expiry = None
+            raise ProviderError("GigaChat token rejected", 401, retryable=True)
+        raise ProviderError(
+            f"Ошибка API GigaChat: {response.status}",
+            response.status,
+            retry_after=parse_retry_after(response.headers),
+        )
+
+    async def evaluate_prompt(self, prompt: EvaluationPrompt) -> AnswerEvaluation:
         """Оценка ответа пользователя с помощью GigaChat"""
-        
-        context_section = build_prompt_context(question.category, multi_agent_notes)
-        system_prompt = f"""
-        Ты эксперт по техническим собеседованиям. Оцени ответ кандидата на вопрос.
-        
-        Вопрос: {question.title}
-        Содержание: {question.content}
-        Правильный ответ: {question.correct_answer}
-        Объяснение: {question.explanation or "Нет объяснения"}
-        Уровень сложности: {question.level}
-        Категория: {question.category}
-        Максимальный балл: {question.points}
-        {context_section}
-        
-        Ответ кандидата: {user_answer}
-        Тип ответа: {answer_type}
-        
-        Оцени ответ по следующим критериям:
-        1. Точность и полнота ответа (0-{question.points//2} баллов)
-        2. Понимание концепций (0-{question.points//4} баллов)
-        3. Качество объяснения (0-{question.points//4} баллов)
-        
-        Верни JSON в формате:
-        {{
-            "score": число_баллов,
-            "feedback": "подробная обратная связь на русском языке",
-            "is_correct": true/false,
-            "strengths": ["сильные стороны ответа"],
-            "improvements": ["что можно улучшить"]
-        }}
-        """
-        
-        for attempt in range(self._max_retries):
-            try:
-                access_token = await self._get_access_token()
-                headers = {
-                    "Authorization": f"Bearer {access_token}",
-                    "Content-Type": "application/json"
-                }
-                payload = {
-                    "model": "GigaChat:latest",
-                    "messages": [
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": f"Оцени этот ответ: {user_answer}"}
-                    ],
-                    "temperature": 0.3,
-                    "max_tokens": 1000
-                }
+        payload = {
+            "model": "GigaChat:latest",
+            "messages": prompt.messages,
+            "temperature": 0.3,
+            "max_tokens": prompt.max_tokens
+        }
+        started = monotonic()
+        async with llm_limiter.slot():
+            for refreshed in (False, True):
                 async with self.session.post(
                     f"{self.api_url}/chat/completions",
-                    headers=headers,
+                    headers=await self._headers(prompt),
                     json=payload
                 ) as response:
-                    if response.status == 401:
-                        # возможна просрочка токена — обновим и повторим
+                    if response.status == 401 and not refreshed:
+                        # токен протух раньше срока — обновляем сразу, без backoff
                         self.access_token = None
                         self.token_expiry = None
-                        if attempt < self._max_retries - 1:
-                            continue
-                    if response.status in (429, 500, 502, 503, 504):
-                        raise Exception(f"retryable status {response.status}")
-                    if response.status == 200:
-                        response_data = await response.json()
-                        result = json.loads(response_data["choices"][0]["message"]["content"])
-                        return AnswerEvaluation(
-                            answer_id=0,
-                            score=result["score"],
-                            feedback=result["feedback"],
-                            is_correct=result["is_correct"]
+                        continue
+                    self._raise_for_status(response)
+                    response_data = await response.json()
+                    break
+        usage = response_data.get("usage") or {}
+        prompt_usage.record(
+            "gigachat",
+            int(usage.get("prompt_tokens") or 0),
+            int(usage.get("precached_prompt_tokens") or 0),
+            int(usage.get("completion_tokens") or 0),
+            monotonic() - started,
+            prompt.estimated_tokens,
+        )
+        return self._parse_evaluation(response_data["choices"][0]["message"]["content"], prompt.max_score)
+
+    async def stream_prompt(self, prompt: EvaluationPrompt) -> AsyncIterator[str]:
+        """Потоковая оценка ответа через GigaChat (SSE, stream=true)"""
+        headers = await self._headers(prompt, stream=True)
+        payload = {
+            "model": "GigaChat:latest",
+            "messages": prompt.messages,
+            "temperature": 0.3,
+            "max_tokens": prompt.max_tokens,
+            "stream": True,
+        }
+        async with llm_limiter.slot() as timer:
+            async with self.session.post(f"{self.api_url}/chat/completions", headers=headers, json=payload) as response:
+                self._raise_for_status(response)
+                async for raw_line in response.content:
+                    line = raw_line.decode("utf-8").strip()
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    chunk = json.loads(data)
+                    choices = chunk.get("choices") or []
+                    if choices and choices[0].get("delta", {}).get("content"):
+                        with timer.paused():
+                            yield choices[0]["delta"]["content"]
+                    usage = chunk.get("usage")
+                    if usage:
+                        prompt_usage.record(
+                            "gigachat",
+                            int(usage.get("prompt_tokens") or 0),
+                            int(usage.get("precached_prompt_tokens") or 0),
+                            int(usage.get("completion_tokens") or 0),
+                            timer.elapsed(),
+                            prompt.estimated_tokens,
                         )
-                    else:
-                        raise Exception(f"Ошибка API GigaChat: {response.status}")
-            except Exception as e:
-                logger.warning(f"GigaChat evaluate attempt {attempt+1} failed: {e}")
-                if attempt == self._max_retries - 1:
-                    logger.error(f"Ошибка при оценке ответа GigaChat: {e}")
-                    return AnswerEvaluation(
-                        answer_id=0,
-                        score=0,
-                        feedback="Произошла ошибка при оценке ответа. Попробуйте еще раз.",
-                        is_correct=False
-                    )
-                await asyncio.sleep(0.5 * (2 ** attempt))
-    
+
     async def transcribe_voice(self, voice_file_path: str) -> str:
         """Транскрипция голосового сообщения через GigaChat"""
         # GigaChat пока не поддерживает транскрипцию аудио
         # Можно использовать внешний сервис или OpenAI только для транскрипции
         logger.warning("GigaChat не поддерживает транскрипцию аудио. Используйте OpenAI для транскрипции.")
         return ""
-    
+
     async def close(self):
         """Закрытие сессии"""
-        if self.session:
-            await self.session.close()
+        if self._session:
+            await self._session.close()
 
 
-def get_ai_service() -> AIService:
-    """Фабрика для создания AI сервиса"""
-    if settings.ai_provider.lower() == "gigachat":
+def _build_provider(name: str) -> AIService:
+    if name == "gigachat":
         return GigaChatService()
-    else:
-        return OpenAIService()
+    return OpenAIService()
+
+
+def _provider_configured(name: str) -> bool:
+    if name == "gigachat":
+        return bool(settings.gigachat_client_id and settings.gigachat_client_secret)
+    return bool(settings.openai_api_key)
+
+
+def get_ai_service() -> AIService:
+    """Фабрика для создания AI сервиса.
+
+    Основной провайдер задаётся ``ai_provider``; при включённом failover второй
+    настроенный провайдер становится резервом за ``ProviderRouter``.
+    """
+    from .provider_router import ProviderRouter
+
+    primary = "gigachat" if settings.ai_provider.lower() == "gigachat" else "openai"
+    names = [primary]
+    if settings.ai_failover_enabled:
+        names += [n for n in ("openai", "gigachat") if n != primary and _provider_configured(n)]
+    return ProviderRouter([_build_provider(n) for n in names])
+
 
 
 class QuestionService:
@@ -384,15 +486,12 @@ class AnswerService:
         )
         evaluation.answer_id = answer.id
         
-        # Обновляем оценку в базе
-        await database.update_answer_score(answer.id, evaluation.score, evaluation.feedback)
-        
-        # Обновляем статистику пользователя
-        await database.update_user(
-            user_id,
-            score=user.score + evaluation.score,
-            questions_answered=user.questions_answered + 1
-        )
+        # Оценка и статистика пользователя — одной транзакцией
+        async with database.unit_of_work("answer.score"):
+            await database.update_answer_score(answer.id, evaluation.score, evaluation.feedback)
+            await database.increment_user_progress(user_id, evaluation.score)
+            await database.add_user_stats(user.id, question.category, question.level, evaluation.score)
+        leaderboard.record(user_id, question.category, evaluation.score)
         
         return answer, evaluation
     
@@ -441,15 +540,12 @@ class AnswerService:
         )
         evaluation.answer_id = answer.id
         
-        # Обновляем оценку в базе
-        await database.update_answer_score(answer.id, evaluation.score, evaluation.feedback)
-        
-        # Обновляем статистику пользователя
-        await database.update_user(
-            user_id,
-            score=user.score + evaluation.score,
-            questions_answered=user.questions_answered + 1
-        )
+        # Оценка и статистика пользователя — одной транзакцией
+        async with database.unit_of_work("answer.score"):
+            await database.update_answer_score(answer.id, evaluation.score, evaluation.feedback)
+            await database.increment_user_progress(user_id, evaluation.score)
+            await database.add_user_stats(user.id, question.category, question.level, evaluation.score)
+        leaderboard.record(user_id, question.category, evaluation.score)
         
         return answer, evaluation
 
@@ -464,7 +560,7 @@ class VoiceService:
             # Получаем информацию о файле
             async with aiohttp.ClientSession() as session:
                 # Получаем file_path
-                file_url = f"https://api.telegram.org/bot{bot_token}/getFile?file_id={file_id}"
+                file_url = f"{settings.telegram_api_url}/bot{bot_token}/getFile?file_id={file_id}"
                 async with session.get(file_url) as response:
                     file_info = await response.json()
                     if not file_info.get("ok"):
@@ -473,7 +569,7 @@ class VoiceService:
                     file_path = file_info["result"]["file_path"]
                 
                 # Скачиваем файл
-                download_url = f"https://api.telegram.org/file/bot{bot_token}/{file_path}"
+                download_url = f"{settings.telegram_api_url}/file/bot{bot_token}/{file_path}"
                 async with session.get(download_url) as response:
                     if response.status == 200:
                         async with aiofiles.open(save_path, 'wb') as f:
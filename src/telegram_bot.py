@@ -1,6 +1,10 @@
+import asyncio
 import logging
+from datetime import datetime, timedelta, timezone
+from time import monotonic
 from typing import Optional
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest, RetryAfter
 from telegram.ext import (
     Application, CommandHandler, MessageHandler, CallbackQueryHandler,
     ContextTypes, filters
@@ -12,11 +16,60 @@ from .container import (
     get_user_app_service,
     get_question_app_service,
     get_answer_app_service,
+    get_evaluation_job_app_service,
+    get_leaderboard_app_service,
 )
+from .evaluation_jobs import format_evaluation_message
+from .leaderboard import WINDOWS
+from .question_pool import question_pool
 from .models import User, Question
 
 logger = logging.getLogger(__name__)
 
+QUEUED_MESSAGE = "⏳ Ответ принят, оценка появится в этом сообщении"
+
+
+class ThrottledMessageEditor:
+    """Прогрессивная правка сообщения не чаще заданного интервала (лимиты Telegram на edit)"""
+
+    MAX_LENGTH = 4096
+
+    def __init__(self, message, interval: float) -> None:
+        self.message = message
+        self.interval = interval
+        self._next_edit_at = 0.0
+        self._last_text = ""
+
+    async def update(self, text: str) -> None:
+        now = monotonic()
+        if now < self._next_edit_at or text == self._last_text:
+            return
+        try:
+            await self.message.edit_text(text[: self.MAX_LENGTH])
+            self._last_text = text
+            self._next_edit_at = now + self.interval
+        except RetryAfter as e:
+            self._next_edit_at = now + _retry_after_seconds(e)
+        except BadRequest as e:
+            # "message is not modified" и т.п. не критичны для промежуточных правок
+            logger.debug(f"Промежуточная правка сообщения не удалась: {e}")
+
+    async def finish(self, text: str, reply_markup=None) -> None:
+        """Финальная правка выполняется всегда (с ожиданием, если Telegram попросил подождать)"""
+        delay = self._next_edit_at - monotonic()
+        if delay > 0 and self._last_text:
+            await asyncio.sleep(min(delay, self.interval))
+        try:
+            await self.message.edit_text(text[: self.MAX_LENGTH], reply_markup=reply_markup)
+        except RetryAfter as e:
+            await asyncio.sleep(_retry_after_seconds(e))
+            await self.message.edit_text(text[: self.MAX_LENGTH], reply_markup=reply_markup)
+
+
+def _retry_after_seconds(error: RetryAfter) -> float:
+    retry_after = error.retry_after
+    return retry_after.total_seconds() if hasattr(retry_after, "total_seconds") else float(retry_after)
+
 
 class InterviewBot:
     """Telegram бот для подготовки к техническим собеседованиям"""
@@ -26,6 +79,7 @@ class InterviewBot:
         async def _post_init(app):
             await database.connect()
             await database.create_tables()
+            await question_pool.ensure_loaded()
 
         async def _post_shutdown(app):
             await database.disconnect()
@@ -45,6 +99,7 @@ class InterviewBot:
         self.application.add_handler(CommandHandler("start", self.start_command))
         self.application.add_handler(CommandHandler("help", self.help_command))
         self.application.add_handler(CommandHandler("stats", self.stats_command))
+        self.application.add_handler(CommandHandler("top", self.top_command))
         self.application.add_handler(CommandHandler("settings", self.settings_command))
         
         # Обработка callback query (кнопки)
@@ -98,6 +153,7 @@ class InterviewBot:
 🔹 /start - Начать работу с ботом
 🔹 /help - Показать эту справку
 🔹 /stats - Показать вашу статистику
+🔹 /top [категория] [all|week] - Рейтинг игроков (по умолчанию — за неделю)
 🔹 /settings - Настройки профиля
 
 📝 Как отвечать на вопросы:
@@ -143,6 +199,14 @@ class InterviewBot:
 📈 Средний балл: {float(stats.get('average_score', 0.0)):.1f}
 🕐 Последняя активность: {stats.get('last_activity') or 'Нет данных'}
             """
+            categories = stats.get('categories') or []
+            if categories:
+                stats_text += "\n📚 По категориям:\n" + "\n".join(
+                    f"• {c['category']} ({c['level']}): {c['answered']} отв., ср. балл {c['average_score']:.1f}"
+                    for c in categories
+                )
+                week = [d for d in stats.get('recent_days') or [] if d['day'] >= datetime.now(timezone.utc).date() - timedelta(days=6)]
+                stats_text += f"\n\n🗓 За 7 дней: {sum(d['answered'] for d in week)} отв., {sum(d['total_score'] for d in week)} баллов"
             
             await update.message.reply_text(stats_text)
             
@@ -150,6 +214,31 @@ class InterviewBot:
             logger.error(f"Ошибка при получении статистики: {e}")
             await update.message.reply_text("❌ Ошибка при получении статистики")
     
+    async def top_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Обработка команды /top [категория] [all|week]"""
+        args = [a.lower() for a in context.args or []]
+        window = "all" if "all" in args else "week"
+        category = next((a for a in args if a not in WINDOWS), None)
+        
+        try:
+            page = await get_leaderboard_app_service().top(10, category, window, update.effective_user.id)
+        except Exception as e:
+            logger.error(f"Ошибка при получении рейтинга: {e}")
+            await update.message.reply_text("❌ Ошибка при получении рейтинга")
+            return
+        
+        title = f"🏆 Рейтинг{f' ({category})' if category else ''} {'за всё время' if window == 'all' else 'за неделю'}"
+        if not page.entries:
+            await update.message.reply_text(f"{title}\n\nПока никто не набрал очков.")
+            return
+        lines = [
+            f"{e.rank}. {e.username and '@' + e.username or e.first_name or e.telegram_id} — {e.score}"
+            for e in page.entries
+        ]
+        if page.me:
+            lines.append(f"\nВы: {page.me.rank} место из {page.total}, {page.me.score} очков (лучше {page.me.percentile:.0f}% игроков)")
+        await update.message.reply_text(f"{title}\n\n" + "\n".join(lines))
+    
     async def settings_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработка команды /settings"""
         user_id = update.effective_user.id
@@ -361,8 +450,7 @@ class InterviewBot:
         text = update.message.text
         
         try:
-            users = get_user_app_service()
-            user = await users.get_or_create(user_id, None, None, None)
+            user, points = await self._load_answer_context(user_id)
             
             if not user.current_question_id:
                 await update.message.reply_text(
@@ -372,29 +460,28 @@ class InterviewBot:
             
             # Обрабатываем текстовый ответ
             answers = get_answer_app_service()
-            # Для отображения баллов получим вопрос
-            qs = get_question_app_service()
-            question = await qs.get(user.current_question_id)
-            answer, evaluation = await answers.answer_text(user_id, user.current_question_id, text)
-            
-            # Формируем ответ с оценкой
-            points = question.points if question else 0
-            response_text = f"""
-📊 Результат оценки:
 
-🏆 Получено баллов: {evaluation["score"]}/{points}
-✅ Правильность: {'Да' if evaluation["is_correct"] else 'Нет'}
+            if settings.bot_use_job_queue:
+                # Оценку выполнит воркер (main.py --mode worker) и сам отредактирует это сообщение
+                processing_msg = await update.message.reply_text(QUEUED_MESSAGE)
+                await get_evaluation_job_app_service().submit_text(
+                    user_id, user.current_question_id, text, notify=self._job_notify(processing_msg, points)
+                )
+                return
 
-💬 Обратная связь:
-{evaluation["feedback"]}
+            # Оценка стримится: сообщение прогрессивно дописывается по мере генерации
+            processing_msg = await update.message.reply_text("⏳ Оцениваю ответ...")
+            editor = ThrottledMessageEditor(processing_msg, settings.telegram_stream_edit_interval)
+            evaluation = await self._stream_evaluation(
+                answers.answer_text_stream(user_id, user.current_question_id, text), editor, points
+            )
 
-🎯 Хотите еще один вопрос?
-            """
+            response_text = format_evaluation_message(evaluation, points)
             
             keyboard = [[InlineKeyboardButton("🎯 Следующий вопрос", callback_data="get_question")]]
             reply_markup = InlineKeyboardMarkup(keyboard)
             
-            await update.message.reply_text(response_text, reply_markup=reply_markup)
+            await editor.finish(response_text, reply_markup=reply_markup)
             
         except Exception as e:
             logger.error(f"Ошибка при обработке текстового ответа: {e}")
@@ -406,8 +493,7 @@ class InterviewBot:
         voice = update.message.voice
         
         try:
-            users = get_user_app_service()
-            user = await users.get_or_create(user_id, None, None, None)
+            user, points = await self._load_answer_context(user_id)
             
             if not user.current_question_id:
                 await update.message.reply_text(
@@ -416,36 +502,35 @@ class InterviewBot:
                 return
             
             # Отправляем сообщение о обработке
-            processing_msg = await update.message.reply_text("🎤 Обрабатываю голосовое сообщение...")
+            processing_msg = await update.message.reply_text(
+                QUEUED_MESSAGE if settings.bot_use_job_queue else "🎤 Обрабатываю голосовое сообщение..."
+            )
             
             # Скачиваем и обрабатываем голосовое сообщение
             answers = get_answer_app_service()
-            qs = get_question_app_service()
-            question = await qs.get(user.current_question_id)
-            answer, evaluation = await answers.answer_voice(
-                user_id, user.current_question_id, voice.file_id, settings.telegram_bot_token
+
+            if settings.bot_use_job_queue:
+                await get_evaluation_job_app_service().submit_voice(
+                    user_id, user.current_question_id, voice.file_id, notify=self._job_notify(processing_msg, points)
+                )
+                return
+
+            editor = ThrottledMessageEditor(processing_msg, settings.telegram_stream_edit_interval)
+            evaluation = await self._stream_evaluation(
+                answers.answer_voice_stream(
+                    user_id, user.current_question_id, voice.file_id, settings.telegram_bot_token
+                ),
+                editor,
+                points,
             )
             
             # Формируем ответ с оценкой
-            points = question.points if question else 0
-            response_text = f"""
-📊 Результат оценки:
-
-🎤 Распознанный текст: "{answer.answer_text}"
-
-🏆 Получено баллов: {evaluation["score"]}/{points}
-✅ Правильность: {'Да' if evaluation["is_correct"] else 'Нет'}
-
-💬 Обратная связь:
-{evaluation["feedback"]}
-
-🎯 Хотите еще один вопрос?
-            """
+            response_text = format_evaluation_message({"transcript": "", **evaluation}, points)
             
             keyboard = [[InlineKeyboardButton("🎯 Следующий вопрос", callback_data="get_question")]]
             reply_markup = InlineKeyboardMarkup(keyboard)
             
-            await processing_msg.edit_text(response_text, reply_markup=reply_markup)
+            await editor.finish(response_text, reply_markup=reply_markup)
             
             # Файлы очищаются на уровне AnswerAppService через VoiceStorage
             
@@ -453,6 +538,48 @@ class InterviewBot:
             logger.error(f"Ошибка при обработке голосового ответа: {e}")
             await update.message.reply_text("❌ Ошибка при обработке голосового ответа")
     
+    async def _load_answer_context(self, user_id: int):
+        """Пользователь и баллы за его текущий вопрос — одной единицей работы (одна сессия БД)"""
+        async with database.unit_of_work("bot.answer_context"):
+            user = await get_user_app_service().get_or_create(user_id, None, None, None)
+            if not user.current_question_id:
+                return user, 0
+            question = await get_question_app_service().get(user.current_question_id)
+        return user, question.points if question else 0
+
+    @staticmethod
+    def _job_notify(message, points: int) -> dict:
+        """Куда воркеру прислать результат: правим сообщение «ответ принят»"""
+        return {"chat_id": message.chat_id, "message_id": message.message_id, "points": points}
+
+    async def _stream_evaluation(self, events, editor: "ThrottledMessageEditor", points: int) -> dict:
+        """Прогрессивно показывает оценку по событиям стрима, возвращает итоговый результат"""
+        transcript = None
+        score = None
+        feedback = ""
+        async for event in events:
+            if event["type"] == "result":
+                return {**event, "transcript": transcript}
+            if event["type"] == "transcript":
+                transcript = event["text"]
+            elif event["type"] == "score":
+                score = event["score"]
+            elif event["type"] == "feedback":
+                feedback += event["delta"]
+            elif event["type"] == "reset":
+                # стрим оборвался, оценка будет получена заново — частичный текст не показываем
+                score = None
+                feedback = ""
+            lines = ["⏳ Оцениваю ответ..."]
+            if transcript:
+                lines.append(f'🎤 Распознанный текст: "{transcript}"')
+            if score is not None:
+                lines.append(f"🏆 Баллы: {score}/{points}")
+            if feedback:
+                lines.append(f"💬 Обратная связь:\n{feedback}▌")
+            await editor.update("\n\n".join(lines))
+        raise RuntimeError("evaluation stream ended without result")
+
     async def error_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработка ошибок"""
         logger.error(f"Ошибка в боте: {context.error}")
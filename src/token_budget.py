@@ -0,0 +1,126 @@
+from __future__ import annotations
+import logging
+import math
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+TRUNCATION_MARK = "\n…[сокращено]…\n"
+
+_encoder = None
+_encoder_loaded = False
+
+
+def _get_encoder():
+    """tiktoken, если установлен и словарь доступен локально; иначе None (оценка по символам)"""
+    global _encoder, _encoder_loaded
+    if not _encoder_loaded:
+        _encoder_loaded = True
+        try:
+            import tiktoken
+            _encoder = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:  # нет пакета или нет сети для загрузки словаря
+            logger.info(f"tiktoken unavailable, using estimator: {e}")
+            _encoder = None
+    return _encoder
+
+
+def estimate_tokens(text: str) -> int:
+    """Офлайн-оценка: ~4 символа ASCII на токен, кириллица и прочее — ~2 символа"""
+    if not text:
+        return 0
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return math.ceil(ascii_chars / 4 + (len(text) - ascii_chars) / 2)
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    encoder = _get_encoder()
+    if encoder is None:
+        return estimate_tokens(text)
+    return len(encoder.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, keep_tail: bool = False) -> str:
+    """Обрезка до max_tokens; keep_tail сохраняет и конец текста (вывод ответа обычно там)"""
+    if max_tokens <= 0:
+        return ""
+    total = count_tokens(text)
+    if total <= max_tokens:
+        return text
+    mark_tokens = count_tokens(TRUNCATION_MARK)
+    keep = max(max_tokens - mark_tokens, 1)
+    encoder = _get_encoder()
+    if encoder is not None:
+        tokens = encoder.encode(text, disallowed_special=())
+        if keep_tail:
+            head = keep * 2 // 3
+            return encoder.decode(tokens[:head]) + TRUNCATION_MARK + encoder.decode(tokens[len(tokens) - (keep - head):])
+        return encoder.decode(tokens[:keep]) + TRUNCATION_MARK
+
+    # без токенизатора режем пропорционально числу символов
+    chars = max(int(len(text) * keep / total), 1)
+    if keep_tail:
+        head = chars * 2 // 3
+        return text[:head] + TRUNCATION_MARK + text[len(text) - (chars - head):]
+    return text[:chars] + TRUNCATION_MARK
+
+
+def shorten_notes(notes: str, max_tokens: int) -> str:
+    """Конспект экспертов сокращаем по целым строкам, а не посреди фразы"""
+    if count_tokens(notes) <= max_tokens:
+        return notes
+    kept: List[str] = []
+    used = count_tokens(TRUNCATION_MARK)
+    for line in notes.splitlines():
+        cost = count_tokens(line) + 1
+        if used + cost > max_tokens:
+            break
+        kept.append(line)
+        used += cost
+    if not kept:
+        return truncate_to_tokens(notes, max_tokens)
+    return "\n".join(kept) + TRUNCATION_MARK.rstrip("\n")
+
+
+@dataclass
+class BudgetSection:
+    """Секция промпта: чем меньше priority, тем раньше её сокращают"""
+    name: str
+    text: str
+    priority: int
+    min_tokens: int = 0
+    keep_tail: bool = False
+
+
+def fit_sections(sections: List[BudgetSection], budget: int) -> Dict[str, str]:
+    """Вписывает секции в бюджет, сокращая сначала наименее приоритетные"""
+    sizes = {s.name: count_tokens(s.text) for s in sections}
+    result = {s.name: s.text for s in sections}
+    overflow = sum(sizes.values()) - budget
+    if overflow <= 0:
+        return result
+    for section in sorted(sections, key=lambda s: s.priority):
+        if overflow <= 0:
+            break
+        size = sizes[section.name]
+        target = max(section.min_tokens, size - overflow)
+        if target >= size:
+            continue
+        if section.name == "notes":
+            result[section.name] = shorten_notes(section.text, target)
+        else:
+            result[section.name] = truncate_to_tokens(section.text, target, keep_tail=section.keep_tail)
+        overflow -= size - count_tokens(result[section.name])
+        logger.info(f"Prompt section '{section.name}' truncated {size} -> {target} tokens")
+    return result
+
+
+def completion_budget(points: Optional[int]) -> int:
+    """max_tokens ответа модели: вопросам с большим баллом — более развёрнутый отзыв"""
+    tokens = settings.eval_completion_tokens_base + settings.eval_completion_tokens_per_point * max(points or 0, 0)
+    return max(settings.eval_completion_tokens_min, min(tokens, settings.eval_completion_tokens_max))
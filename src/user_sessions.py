@@ -0,0 +1,134 @@
+from __future__ import annotations
+import itertools
+import logging
+import uuid
+from typing import Any, Dict, Optional
+
+from .cache_utils import LRUCache
+from .config import settings
+from .models import CachedUser, from_db
+
+logger = logging.getLogger(__name__)
+
+# Канал Postgres LISTEN/NOTIFY; payload — "<процесс>:<telegram_id>"
+NOTIFY_CHANNEL = "user_sessions"
+
+
+class UserSessionCache:
+    """Пользователи по telegram_id в памяти процесса: уровень, категория, текущий вопрос, счёт.
+
+    Читают кэш ``Database.get_user_by_telegram_id`` и ``get_users_by_telegram_ids``; запись
+    (``update_user``, ``increment_user_progress``, ``create_user``) идёт в БД и после COMMIT
+    кладёт в кэш свежую строку. Чтение из БД заполняет только отсутствующую запись, поэтому
+    не затирает более новую, записанную параллельно. Поколение ключа снимается до SELECT:
+    если между чтением и ``fill`` пришёл сброс (NOTIFY или своя запись), строка устарела и
+    в кэш не кладётся — иначе скользящий срок жизни держал бы её сколько угодно.
+
+    Другие процессы узнают о записи через Postgres NOTIFY (отправляется в той же транзакции,
+    что и запись) и сбрасывают у себя запись пользователя. Пока слушатель работает, запись
+    живёт до ``user_session_idle_seconds`` простоя; без него (SQLite, не asyncpg, обрыв
+    соединения) — не дольше ``user_session_idle_seconds`` с момента чтения.
+    """
+
+    def __init__(self) -> None:
+        self._cache: LRUCache[int, CachedUser] = LRUCache(settings.user_session_cache_size, settings.user_session_idle_seconds)
+        self.origin = uuid.uuid4().hex[:12]
+        # поколения сброшенных ключей; при переполнении сбрасываются все сразу через _floor
+        self._generations: Dict[int, int] = {}
+        self._counter = itertools.count(1)
+        self._floor = 0
+        self._listener = None  # соединение с LISTEN
+        self.notifications = 0
+
+    @property
+    def listening(self) -> bool:
+        return self._listener is not None
+
+    def get(self, telegram_id: int) -> Optional[CachedUser]:
+        return self._cache.get(telegram_id)
+
+    def generation(self, telegram_id: int) -> int:
+        """Поколение ключа; снимается до чтения из БД и передаётся в fill"""
+        return self._generations.get(telegram_id, self._floor)
+
+    def fill(self, user: Any, generation: int) -> CachedUser:
+        """Строка, прочитанная из БД; запись, положенная после COMMIT, приоритетнее.
+
+        Если ключ сбрасывали после снятия generation, строка возвращается, но не кэшируется.
+        """
+        cached = from_db(CachedUser, user)
+        if cached.telegram_id not in self._cache and self.generation(cached.telegram_id) == generation:
+            self._cache.set(cached.telegram_id, cached)
+        return cached
+
+    def put(self, user: Any) -> CachedUser:
+        """Строка после зафиксированной записи"""
+        cached = from_db(CachedUser, user)
+        self._cache.set(cached.telegram_id, cached)
+        return cached
+
+    def invalidate(self, telegram_id: int) -> None:
+        if len(self._generations) >= settings.user_session_cache_size:
+            self._bump_all()
+        self._generations[telegram_id] = next(self._counter)
+        self._cache.pop(telegram_id)
+
+    def clear(self) -> None:
+        self._bump_all()
+        self._cache.clear()
+
+    def _bump_all(self) -> None:
+        # новое поколение для всех ключей: начатые чтения ничего не закэшируют
+        self._generations.clear()
+        self._floor = next(self._counter)
+
+    def notify_payload(self, telegram_id: int) -> str:
+        return f"{self.origin}:{telegram_id}"
+
+    def _on_notify(self, connection, pid, channel, payload: str) -> None:
+        origin, _, telegram_id = payload.partition(":")
+        if origin == self.origin or not telegram_id.isdigit():
+            return
+        self.notifications += 1
+        self.invalidate(int(telegram_id))
+
+    def _on_terminate(self, connection) -> None:
+        # уведомления больше не приходят — возвращаемся к сроку жизни от чтения
+        logger.warning("User session listener connection lost, cache falls back to TTL")
+        self._listener = None
+        self._cache.sliding = False
+        self.clear()
+
+    async def attach(self, engine) -> bool:
+        """LISTEN на отдельном соединении; только Postgres через asyncpg"""
+        self.clear()
+        if engine.dialect.name != "postgresql" or engine.dialect.driver != "asyncpg" or not settings.user_session_notify:
+            return False
+        try:
+            conn = await engine.connect()
+            raw = (await conn.get_raw_connection()).driver_connection
+            await raw.add_listener(NOTIFY_CHANNEL, self._on_notify)
+            raw.add_termination_listener(self._on_terminate)
+        except Exception as e:
+            logger.warning(f"User session listener unavailable, cache falls back to TTL: {e}")
+            return False
+        self._listener = conn
+        self._cache.sliding = True
+        return True
+
+    async def detach(self) -> None:
+        conn, self._listener = self._listener, None
+        self._cache.sliding = False
+        self.clear()
+        if conn is not None:
+            try:
+                await conn.close()
+            except Exception as e:
+                logger.debug(f"User session listener close failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._cache.stats(), "listening": self.listening, "notifications": self.notifications}
+
+
+# Кэш пользователей процесса (бот, API, воркер)
+user_sessions = UserSessionCache()
@@ -0,0 +1,45 @@
+from __future__ import annotations
+from datetime import datetime
+
+import pytest_asyncio
+
+from src.config import settings
+from src.database import database
+from src.infrastructure.repositories import question_cache
+from src.models import Question, QuestionCreate
+
+
+@pytest_asyncio.fixture
+async def db(tmp_path, monkeypatch):
+    """Чистая SQLite в tmp_path; синглтон database после теста возвращается как был"""
+    monkeypatch.setattr(settings, "database_url", f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+    saved = database.engine, database.session_maker, database.replicas, database.uow_stats
+    question_cache.clear()  # кэш процесса не должен переживать смену БД
+    await database.connect()
+    await database.create_tables()
+    database.uow_stats = type(saved[3])()
+    try:
+        yield database
+    finally:
+        await database.disconnect()
+        database.engine, database.session_maker, database.replicas, database.uow_stats = saved
+        question_cache.clear()
+
+
+def make_question(**overrides) -> Question:
+    """DTO вопроса для тестов без БД"""
+    data = dict(
+        id=1, title="T", content="C", level="middle", category="databases", question_type="text", points=10,
+        correct_answer="...", explanation=None, hints=None, tags=None,
+        created_at=datetime(2024, 1, 1), updated_at=datetime(2024, 1, 1),
+    )
+    data.update(overrides)
+    return Question(**data)
+
+
+def new_question(title: str = "Индексы", **overrides) -> QuestionCreate:
+    """Вопрос для записи в БД"""
+    data = dict(title=title, content="...", level="middle", category="databases", question_type="text",
+                points=10, correct_answer="...")
+    data.update(overrides)
+    return QuestionCreate(**data)
@@ -8,8 +8,8 @@ from fastapi import Depends
 
 
 class FakeQuestionService:
-    async def search(self, level=None, category=None, q=None, limit: int = 20, offset: int = 0):
-        return {"items": [], "total": 0, "limit": limit, "offset": offset}
+    async def search(self, level=None, category=None, q=None, limit: int = 20, cursor=None, with_total: bool = False):
+        return {"items": [], "next_cursor": None, "total": 0 if with_total else None, "limit": limit}
 
 client = TestClient(app)
 
@@ -24,7 +24,7 @@ def test_admin_search_with_token(monkeypatch):
     monkeypatch.setenv("ADMIN_TOKEN", "secret")
     # dependency override: стабильный ответ 200 с пустым списком
     app.dependency_overrides[get_question_app_service] = lambda: FakeQuestionService()
-    r = client.get("/admin/questions", headers={"X-Admin-Token": "secret"})
+    r = client.get("/admin/questions", params={"with_total": True}, headers={"X-Admin-Token": "secret"})
     assert r.status_code == 200
     assert r.json()["total"] == 0
     app.dependency_overrides.clear()
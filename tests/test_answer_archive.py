@@ -0,0 +1,58 @@
+from __future__ import annotations
+from datetime import date, datetime, timezone
+
+import pytest
+from sqlalchemy import func, select, update
+
+from src.answer_archive import answer_archive, compress_payload, decompress_payload
+from src.config import settings
+from src.database import Answer as AnswerORM, UserStatsRollup
+from src.infrastructure.repositories import SqlAlchemyQuestionRepository
+
+from conftest import new_question
+
+
+def test_payload_roundtrip_shrinks_long_text():
+    feedback = "Хороший ответ, но не раскрыты уровни изоляции транзакций. " * 40
+    payload = compress_payload("B-tree " * 200, feedback)
+    assert len(payload) < len(feedback.encode("utf-8")) / 5
+    assert decompress_payload(payload) == {"answer_text": "B-tree " * 200, "feedback": feedback}
+
+
+@pytest.mark.asyncio
+async def test_old_months_move_to_archive_and_expire(db, monkeypatch):
+    monkeypatch.setattr(settings, "answer_hot_months", 2)
+    user = await db.create_user(1, "u", None, None)
+    question = await SqlAlchemyQuestionRepository().create(new_question())
+    hot_start = answer_archive.hot_start()
+    cold = [datetime(2025, 1, 10, tzinfo=timezone.utc), datetime(2025, 1, 20, tzinfo=timezone.utc),
+            datetime(2025, 3, 5, tzinfo=timezone.utc)]
+    for i, created_at in enumerate(cold + [datetime.now(timezone.utc)]):
+        answer = await db.create_answer(user.id, question.id, f"ответ {i}", "text", score=5, feedback="ok " * 50)
+        async with db.get_session() as session:
+            await session.execute(update(AnswerORM).where(AnswerORM.id == answer.id).values(created_at=created_at))
+            await session.commit()
+        await db.add_user_stats(user.id, "databases", "middle", 5, day=created_at.date())
+
+    with pytest.raises(ValueError):
+        await answer_archive.archive_month(hot_start)
+    results = await answer_archive.archive_due()
+    assert [(r.month, r.moved) for r in results] == [(date(2025, 1, 1), 2), (date(2025, 3, 1), 1)]
+    assert await answer_archive.months() == [date(2025, 1, 1), date(2025, 3, 1)]
+
+    # в горячей таблице остался только свежий ответ, архив читается с распаковкой
+    async with db.get_session() as session:
+        assert await session.scalar(select(func.count()).select_from(AnswerORM)) == 1
+    archived = await answer_archive.read(date(2025, 1, 1), user_id=user.id)
+    assert [a["answer_text"] for a in archived] == ["ответ 0", "ответ 1"] and archived[0]["score"] == 5
+    assert await answer_archive.archive_due() == []
+
+    # пересборка итогов не теряет архивные месяцы
+    await db.rebuild_user_stats()
+    async with db.get_session() as session:
+        assert await session.scalar(select(func.sum(UserStatsRollup.answered))) == 4
+
+    monkeypatch.setattr(settings, "answer_archive_retention_months", (hot_start.year - 2025) * 12 + hot_start.month - 2)
+    assert await answer_archive.drop_expired() == [date(2025, 1, 1)]
+    assert await answer_archive.months() == [date(2025, 3, 1)]
+    assert await answer_archive.read(date(2025, 1, 1)) == []
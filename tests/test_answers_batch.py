@@ -0,0 +1,196 @@
+from __future__ import annotations
+import asyncio
+import json
+import pytest
+from datetime import datetime
+from fastapi.testclient import TestClient
+
+from sqlalchemy import func, select
+
+from src.api import app
+from src.application.user_services import AnswerAppService
+from src.container import get_answer_app_service
+from src.database import Answer as AnswerORM
+from src.infrastructure.repositories import SqlAlchemyAnswerRepository, SqlAlchemyQuestionRepository, SqlAlchemyUserRepository
+from src.models import User as DTOUser, Answer as DTOAnswer
+from src.rate_limit import limiter
+
+from conftest import make_question, new_question
+
+
+def make_user(telegram_id: int) -> DTOUser:
+    return DTOUser(
+        id=telegram_id, telegram_id=telegram_id, username=None, first_name=None, last_name=None,
+        level="middle", category="databases", current_question_id=None, score=0, questions_answered=0,
+        created_at=datetime.utcnow(), updated_at=datetime.utcnow(),
+    )
+
+
+class FakeUsers:
+    def __init__(self):
+        self.users = {1: make_user(1), 2: make_user(2)}
+        self.bulk_calls = 0
+
+    async def get_many_by_telegram_ids(self, telegram_ids):
+        self.bulk_calls += 1
+        return {t: self.users[t] for t in telegram_ids if t in self.users}
+
+    async def get_by_telegram_id(self, telegram_id):
+        return self.users.get(telegram_id)
+
+    async def update_by_telegram_id(self, telegram_id, **kwargs):
+        await asyncio.sleep(0)
+        self.users[telegram_id] = self.users[telegram_id].model_copy(update=kwargs)
+        return self.users[telegram_id]
+
+    async def increment_progress(self, telegram_id, score_delta, answered=1):
+        # без await между чтением и записью — как атомарный UPDATE в БД
+        u = self.users[telegram_id]
+        self.users[telegram_id] = u.model_copy(
+            update={"score": u.score + score_delta, "questions_answered": u.questions_answered + answered}
+        )
+        return self.users[telegram_id]
+
+    async def add_answer_stats(self, user_id, category, level, score):
+        return None
+
+
+class FakeQuestions:
+    def __init__(self):
+        self.bulk_calls = 0
+
+    async def get_many_by_ids(self, question_ids):
+        self.bulk_calls += 1
+        return {q: make_question(id=q, title=f"Q{q}") for q in question_ids if q < 100}
+
+
+class FakeAnswers:
+    def __init__(self):
+        self.scores: dict[int, int] = {}
+
+    async def create(self, user_id, question_id, answer_text, answer_type, voice_file_id=None, score=None,
+                     feedback=None, job_id=None):
+        answer_id = len(self.scores) + 1
+        self.scores[answer_id] = score
+        return DTOAnswer(id=answer_id, user_id=user_id, question_id=question_id, answer_text=answer_text,
+                         answer_type=answer_type, score=score, feedback=feedback, created_at=datetime.utcnow())
+
+
+class FakeAI:
+    def __init__(self):
+        self.active = 0
+        self.max_active = 0
+
+    async def evaluate(self, question, user_answer, answer_type="text", multi_agent_notes=None):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        await asyncio.sleep(0.01)
+        self.active -= 1
+        return {"score": 3, "feedback": "ok", "is_correct": True}
+
+
+class FakeOrch:
+    async def prepare_notes(self, category, user_id, level, topic):
+        return ""
+
+
+@pytest.mark.asyncio
+async def test_answer_batch_bulk_loads_and_caps_concurrency():
+    users, questions, answers, ai = FakeUsers(), FakeQuestions(), FakeAnswers(), FakeAI()
+    svc = AnswerAppService(users, questions, answers, ai, voice=None, orch=FakeOrch())
+    items = [(1, 1, "ответ"), (1, 2, "ответ"), (2, 3, "ответ"), (3, 1, "ответ"), (2, 500, "ответ")]
+
+    results = [r async for r in svc.answer_batch(items, concurrency=2)]
+
+    assert users.bulk_calls == 1 and questions.bulk_calls == 1
+    assert ai.max_active <= 2
+    by_index = {r["index"]: r for r in results}
+    assert by_index[3]["error"] == "User not found"
+    assert by_index[4]["error"] == "Question not found"
+    assert all(by_index[i]["score"] == 3 for i in (0, 1, 2))
+    assert answers.scores == {1: 3, 2: 3, 3: 3}
+    assert users.users[1].score == 6 and users.users[1].questions_answered == 2
+
+
+@pytest.mark.asyncio
+async def test_answer_batch_charges_limit_only_for_valid_items():
+    svc = AnswerAppService(FakeUsers(), FakeQuestions(), FakeAnswers(), FakeAI(), voice=None, orch=FakeOrch())
+    charged = []
+
+    def allow(telegram_id):
+        charged.append(telegram_id)
+        return len(charged) <= 1
+
+    items = [(3, 1, "ответ"), (1, 500, "ответ"), (1, 1, "ответ"), (2, 2, "ответ")]
+    by_index = {r["index"]: r async for r in svc.answer_batch(items, allow=allow)}
+
+    assert charged == [1, 2]  # неизвестные пользователь и вопрос лимит не тратят
+    assert by_index[2]["score"] == 3
+    assert by_index[3] == {"index": 3, "error": "Daily limit exceeded"}
+
+
+class FlakyAI:
+    """Падает на вопросе fail_on, остальные оценивает после паузы"""
+
+    def __init__(self, fail_on: int):
+        self.fail_on = fail_on
+
+    async def evaluate(self, question, user_answer, answer_type="text", multi_agent_notes=None):
+        if question.id == self.fail_on:
+            raise RuntimeError("LLM down")
+        await asyncio.sleep(0.05)
+        return {"score": 3, "feedback": "ok", "is_correct": True}
+
+
+@pytest.mark.asyncio
+async def test_answer_batch_leaves_no_unscored_rows_on_failure_or_disconnect(db):
+    users, questions = SqlAlchemyUserRepository(), SqlAlchemyQuestionRepository()
+    await users.create(1, "u", None, None)
+    q1 = await questions.create(new_question("Индексы"))
+    q2 = await questions.create(new_question("Транзакции"))
+    svc = AnswerAppService(users, questions, SqlAlchemyAnswerRepository(), FlakyAI(fail_on=q1.id),
+                           voice=None, orch=FakeOrch(), uow=db.unit_of_work)
+
+    async def count_answers(unscored: bool = False) -> int:
+        stmt = select(func.count()).select_from(AnswerORM)
+        if unscored:
+            stmt = stmt.where(AnswerORM.score.is_(None))
+        async with db.get_session() as session:
+            return await session.scalar(stmt)
+
+    # клиент отключился после первого результата (ошибки q1): оценка q2 отменяется
+    batch = svc.answer_batch([(1, q1.id, "ответ"), (1, q2.id, "ответ")])
+    assert await batch.__anext__() == {"index": 0, "error": "Evaluation failed"}
+    await batch.aclose()
+    assert await count_answers() == 0
+
+    results = [r async for r in svc.answer_batch([(1, q1.id, "ответ"), (1, q2.id, "ответ")])]
+    assert sorted(r["index"] for r in results) == [0, 1]
+    assert await count_answers() == 1 and await count_answers(unscored=True) == 0
+
+
+def test_answers_batch_endpoint_streams_ndjson_and_charges_limiter_per_item():
+    class FakeService:
+        async def answer_batch(self, items, concurrency, allow=None):
+            for i, (user_id, question_id, _) in enumerate(items):
+                if not allow(user_id):
+                    yield {"index": i, "error": "Daily limit exceeded"}
+                    continue
+                yield {"index": i, "answer_id": i + 1, "score": 1, "feedback": "", "is_correct": True}
+
+    old_limit = limiter.limit
+    limiter.limit = 2
+    limiter._store.clear()
+    app.dependency_overrides[get_answer_app_service] = lambda: FakeService()
+    client = TestClient(app)
+    body = {"items": [{"user_id": 77, "question_id": 1, "answer_text": "abc"} for _ in range(3)]}
+    r = client.post("/answers/batch", json=body)
+    app.dependency_overrides.clear()
+    limiter.limit = old_limit
+    limiter._store.clear()
+
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in r.text.splitlines()]
+    assert {row["index"] for row in rows} == {0, 1, 2}
+    assert [row for row in rows if row.get("error") == "Daily limit exceeded"] == [{"index": 2, "error": "Daily limit exceeded"}]
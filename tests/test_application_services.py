@@ -5,6 +5,8 @@ from datetime import datetime
 from src.application.user_services import AnswerAppService
 from src.domain.ports import UserRepository, QuestionRepository, AnswerRepository, AIProvider, VoiceStorage, Orchestrator
 from src.models import User as DTOUser, Question as DTOQuestion, Answer as DTOAnswer
+from src.provider_errors import ProviderError
+from src.services import error_evaluation
 
 
 class FakeUserRepo(UserRepository):
@@ -38,6 +40,12 @@ class FakeUserRepo(UserRepository):
         self.users[telegram_id] = updated
         return updated
 
+    async def increment_progress(self, telegram_id: int, score_delta: int, answered: int = 1):
+        u = self.users[telegram_id]
+        return await self.update_by_telegram_id(
+            telegram_id, score=u.score + score_delta, questions_answered=u.questions_answered + answered
+        )
+
     async def get_stats(self, user_id: int):
         # find by id
         for u in self.users.values():
@@ -97,24 +105,30 @@ class FakeQuestionRepo(QuestionRepository):
 class FakeAnswerRepo(AnswerRepository):
     def __init__(self):
         self.answers: dict[int, DTOAnswer] = {}
+        self.by_job: dict[int, DTOAnswer] = {}
         self._next_id = 1
 
-    async def create(self, user_id: int, question_id: int, answer_text: str, answer_type: str, voice_file_id=None):
+    async def create(self, user_id: int, question_id: int, answer_text: str, answer_type: str, voice_file_id=None, score=None, feedback=None, job_id=None):
         ans = DTOAnswer(
             id=self._next_id,
             user_id=user_id,
             question_id=question_id,
             answer_text=answer_text,
             answer_type=answer_type,
-            score=None,
-            feedback=None,
+            score=score,
+            feedback=feedback,
             voice_file_id=voice_file_id,
             created_at=datetime.utcnow(),
         )
         self.answers[self._next_id] = ans
+        if job_id is not None:
+            self.by_job[job_id] = ans
         self._next_id += 1
         return ans
 
+    async def get_by_job_id(self, job_id: int):
+        return self.by_job.get(job_id)
+
     async def set_score(self, answer_id: int, score: int, feedback: str):
         ans = self.answers[answer_id]
         updated = ans.model_copy(update={"score": score, "feedback": feedback})
@@ -185,3 +199,42 @@ async def test_answer_text_flow_updates_score_and_stats():
     stats = await users.get_stats(u.id)
     assert stats["questions_answered"] == 1
     assert stats["total_score"] == ev["score"]
+
+
+class DownAI(FakeAI):
+    async def evaluate(self, question, user_answer: str, answer_type: str = "text", multi_agent_notes=None):
+        return error_evaluation().model_dump()
+
+
+@pytest.mark.asyncio
+async def test_job_answers_are_recorded_once_and_llm_outage_raises():
+    users, questions, answers = FakeUserRepo(), FakeQuestionRepo(), FakeAnswerRepo()
+    u = await users.create(telegram_id=5, username=None, first_name=None, last_name=None)
+    await questions.create(DTOQuestion(
+        id=1, title="Индекс", content="?", level="middle", category="databases", question_type="text",
+        points=10, correct_answer="...", created_at=datetime.utcnow(), updated_at=datetime.utcnow(),
+    ))
+
+    # синхронный ответ получает заглушку как раньше, задание — ошибку для повтора, без записи
+    down = AnswerAppService(users, questions, answers, DownAI(), FakeVoice(), FakeOrch())
+    with pytest.raises(ProviderError):
+        await down.answer_text(5, 1, "индекс", job_id=7)
+    assert await down.recorded(7) is None
+    assert (await users.get_stats(u.id))["questions_answered"] == 0
+
+    svc = AnswerAppService(users, questions, answers, FakeAI(), FakeVoice(), FakeOrch())
+    ans, _ = await svc.answer_text(5, 1, "индекс", job_id=7)
+    assert (await svc.recorded(7)).id == ans.id
+
+
+@pytest.mark.asyncio
+async def test_voice_answer_is_transcribed_by_injected_provider():
+    users, questions, answers = FakeUserRepo(), FakeQuestionRepo(), FakeAnswerRepo()
+    await users.create(telegram_id=5, username=None, first_name=None, last_name=None)
+    await questions.create(DTOQuestion(
+        id=1, title="Индекс", content="?", level="middle", category="databases", question_type="text",
+        points=10, correct_answer="...", created_at=datetime.utcnow(), updated_at=datetime.utcnow(),
+    ))
+    svc = AnswerAppService(users, questions, answers, FakeAI(), FakeVoice(), FakeOrch())
+    ans, _ = await svc.answer_voice(5, 1, "file-1", "token")
+    assert ans.answer_text == "transcribed" and ans.voice_file_id == "file-1"
@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import pytest
+from sqlalchemy import exc, text
+
+from src.config import settings
+from src.database import Database
+from src.db_pool import WaitHistogram, engine_options, PoolMetrics
+
+
+def test_wait_histogram_is_cumulative():
+    hist = WaitHistogram(buckets=(0.01, 0.1, 1.0))
+    for seconds in (0.001, 0.05, 0.05, 3.0):
+        hist.observe(seconds)
+    snap = hist.snapshot()
+    assert snap["buckets"] == {"le_0.01": 1, "le_0.1": 3, "le_1": 3, "le_inf": 4}
+    assert snap["count"] == 4 and snap["max_seconds"] == 3.0
+    # SQLite в памяти — один StaticPool, без размеров пула
+    assert "pool_size" not in engine_options("sqlite+aiosqlite://", PoolMetrics())
+
+
+@pytest.mark.asyncio
+async def test_pool_reports_checkouts_timeouts_and_idle_pings(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "database_url", f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}")
+    monkeypatch.setattr(settings, "db_pool_size", 1)
+    monkeypatch.setattr(settings, "db_max_overflow", 0)
+    monkeypatch.setattr(settings, "db_pool_timeout", 0.05)
+    monkeypatch.setattr(settings, "db_pool_pre_ping", "idle")
+    monkeypatch.setattr(settings, "db_pool_pre_ping_idle_seconds", 0.0)
+    db = Database()
+    await db.connect()
+    try:
+        async with db.engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+            stats = db.pool_stats()
+            assert stats["size"] == 1 and stats["checked_out"] == 1 and stats["idle"] == 0
+            with pytest.raises(exc.TimeoutError):
+                async with db.engine.connect():
+                    pass
+        async with db.engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+        stats = db.pool_stats()
+        assert stats["checked_out"] == 0 and stats["idle"] == 1
+        assert stats["checkouts"] == 2 and stats["timeouts"] == 1 and stats["connects"] == 1
+        # соединение вернулось в пул и при повторной выдаче пропинговано
+        assert stats["pings"] >= 1 and stats["ping_failures"] == 0
+        assert stats["checkout_wait"]["count"] == 3
+        assert stats["checkout_wait"]["max_seconds"] >= 0.05
+    finally:
+        await db.disconnect()
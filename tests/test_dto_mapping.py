@@ -0,0 +1,32 @@
+from __future__ import annotations
+from datetime import datetime
+
+from src.database import Question as QuestionORM, User as UserORM
+from src.models import Question, QuestionSearchHit, User, from_db
+
+
+def test_from_db_matches_validation_for_orm_objects_and_rows():
+    now = datetime(2026, 1, 1, 12, 0)
+    orm = QuestionORM(
+        id=7, title="Индексы", content="...", level="middle", category="databases", question_type="text",
+        points=10, correct_answer="B-tree", explanation=None, hints=["диапазоны"], tags=None,
+        created_at=now, updated_at=now,
+    )
+    assert from_db(Question, orm) == Question.model_validate(orm)
+
+    # строка без highlight (поиск без запроса) — значение по умолчанию; лишние столбцы отбрасываются
+    values = {n: getattr(orm, n) for n in Question.model_fields}
+    hit = from_db(QuestionSearchHit, _FakeRow({**values, "rank": 0.5}))
+    assert hit.highlight is None and hit.model_dump() == {**Question.model_validate(orm).model_dump(), "highlight": None}
+    assert hit.model_copy(update={"highlight": "<b>B</b>-tree"}).highlight == "<b>B</b>-tree"
+
+    user = UserORM(id=1, telegram_id=10, username="u", first_name=None, last_name=None, level="middle",
+                   category=None, current_question_id=None, score=3, questions_answered=1, created_at=now, updated_at=now)
+    assert from_db(User, user) == User.model_validate(user)
+
+
+class _FakeRow:
+    """Row с тем же интерфейсом _mapping, что и у SQLAlchemy"""
+
+    def __init__(self, mapping):
+        self._mapping = mapping
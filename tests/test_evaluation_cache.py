@@ -0,0 +1,72 @@
+from __future__ import annotations
+import asyncio
+import pytest
+from datetime import datetime
+
+from src.evaluation_cache import EvaluationCache, make_cache_key
+
+from conftest import make_question
+
+
+def test_cache_key_ignores_line_endings_and_trailing_spaces_but_not_question_version():
+    q = make_question()
+    k1 = make_cache_key(q, "индекс это\r\nструктура  \n", "text", None)
+    k2 = make_cache_key(q, "индекс это\nструктура", "text", None)
+    assert k1 == k2
+    # NFC: «й» одной кодовой точкой и «и» + бреве — один ответ
+    assert make_cache_key(q, "мой", "text", None) == make_cache_key(q, "мои\u0306", "text", None)
+    assert k1 != make_cache_key(q, "индекс это\nструктура", "voice", None)
+    assert k1 != make_cache_key(q, "индекс это структура", "text", "notes")
+    assert k1 != make_cache_key(make_question(updated_at=datetime(2024, 2, 1)), "индекс это\nструктура", "text", None)
+
+
+@pytest.mark.parametrize("first, second", [
+    ("if x:\n    return 1\n    return 2", "if x:\n    return 1\nreturn 2"),
+    ("x = None", "X = none"),
+    ("SELECT * FROM T", "select * from t"),
+])
+def test_cache_key_keeps_case_and_indentation(first, second):
+    q = make_question()
+    assert make_cache_key(q, first, "text", None) != make_cache_key(q, second, "text", None)
+
+
+@pytest.mark.asyncio
+async def test_cache_hits_and_coalesces_concurrent_requests():
+    cache = EvaluationCache(maxsize=16, ttl_seconds=60, persistent=False)
+    q = make_question()
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"score": 7, "feedback": "ok", "is_correct": True}
+
+    results = await asyncio.gather(*[cache.get_or_compute(q, "ответ", "text", None, compute) for _ in range(5)])
+    assert calls == 1
+    assert all(r["score"] == 7 for r in results)
+    assert cache.stats()["coalesced"] == 4
+
+    await cache.get_or_compute(q, "ответ\r\n", "text", None, compute)
+    assert calls == 1
+    assert cache.stats()["memory_hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_invalidate_question_and_skip_failed_results():
+    cache = EvaluationCache(maxsize=16, ttl_seconds=60, persistent=False)
+    q = make_question()
+
+    async def failed():
+        return {"score": 0, "feedback": "error", "is_correct": False}
+
+    await cache.get_or_compute(q, "a", "text", None, failed, should_store=lambda r: r["feedback"] != "error")
+    assert cache.stats()["memory"]["size"] == 0
+
+    async def ok():
+        return {"score": 5, "feedback": "ok", "is_correct": True}
+
+    await cache.get_or_compute(q, "a", "text", None, ok)
+    assert cache.stats()["memory"]["size"] == 1
+    await cache.invalidate_question(q.id)
+    assert cache.stats()["memory"]["size"] == 0
@@ -0,0 +1,136 @@
+from __future__ import annotations
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.api import app
+from src.config import settings
+from src.container import get_evaluation_job_app_service, get_interview_app_service
+from src.evaluation_jobs import EvaluationWorker
+from src.infrastructure.repositories import SqlAlchemyJobRepository
+from src.models import EvaluationJob
+
+
+@pytest.fixture
+def jobs(db):
+    return SqlAlchemyJobRepository()
+
+
+class FakeAnswerService:
+    def __init__(self, fail_first: int = 0, error: Exception | None = None):
+        self.fail_first = fail_first
+        self.error = error
+        self.calls = 0
+        self.by_job = {}
+
+    async def answer_text(self, telegram_id: int, question_id: int, text: str, job_id=None):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        if self.calls <= self.fail_first:
+            raise RuntimeError("provider down")
+
+        class A: id, score, feedback = 10 * self.calls, 7, "ok"
+        self.by_job[job_id] = A()
+        return A(), {"score": 7, "feedback": "ok", "is_correct": True}
+
+    async def answer_voice(self, telegram_id: int, question_id: int, voice_file_id: str, bot_token: str, job_id=None):
+        return await self.answer_text(telegram_id, question_id, voice_file_id, job_id=job_id)
+
+    async def recorded(self, job_id: int):
+        return self.by_job.get(job_id)
+
+
+@pytest.mark.asyncio
+async def test_claim_hands_each_job_to_one_worker(jobs):
+    for i in range(3):
+        await jobs.enqueue("text", 100 + i, 1, {"answer_text": f"ответ {i}"})
+
+    first = await jobs.claim("w1", 2)
+    second = await jobs.claim("w2", 2)
+    assert [j.telegram_id for j in first] == [100, 101]
+    assert [j.telegram_id for j in second] == [102]
+    assert await jobs.claim("w3", 2) == []
+    assert all(j.status == "running" and j.attempts == 1 for j in first + second)
+
+    # завершить задание может только его владелец
+    assert not await jobs.complete(first[0].id, {"answer_id": 1, "score": 5}, worker_id="w2")
+    assert await jobs.heartbeat(first[0].id, "w1") and not await jobs.heartbeat(first[0].id, "w2")
+    assert await jobs.complete(first[0].id, {"answer_id": 1, "score": 5}, worker_id="w1")
+    await jobs.fail(first[1].id, "boom", retry_at=datetime.now(timezone.utc) + timedelta(hours=1), worker_id="w1")
+    assert (await jobs.get(first[0].id)).result == {"answer_id": 1, "score": 5}
+    assert await jobs.claim("w1", 5) == []  # повтор ещё не наступил
+    assert await jobs.count_by_status() == {"done": 1, "queued": 1, "running": 1}
+
+    # воркер w2 пропал: по истечении lease задание возвращается в очередь
+    assert await jobs.requeue_stale(lease_seconds=0) == 1
+    assert [j.id for j in await jobs.claim("w1", 5)] == [second[0].id]
+
+
+@pytest.mark.asyncio
+async def test_worker_retries_transient_errors_and_fails_bad_input(jobs, monkeypatch):
+    monkeypatch.setattr(settings, "ai_retry_base_delay", 0.0)
+    ok = await jobs.enqueue("text", 1, 1, {"answer_text": "ответ"}, max_attempts=3)
+    worker = EvaluationWorker(jobs, FakeAnswerService(fail_first=1), concurrency=2, poll_interval=0.01, lease_seconds=60)
+    await worker.drain()
+    job = await jobs.get(ok.id)
+    assert job.status == "done" and job.attempts == 2
+    assert job.result == {"answer_id": 20, "score": 7, "feedback": "ok", "is_correct": True}
+    assert worker.stats()["retried"] == 1
+
+    bad = await jobs.enqueue("voice", 1, 1, {"voice_file_id": "x"}, max_attempts=3)
+    worker = EvaluationWorker(jobs, FakeAnswerService(error=ValueError("Question not found")), poll_interval=0.01)
+    await worker.drain()
+    job = await jobs.get(bad.id)
+    assert job.status == "failed" and job.attempts == 1 and job.error == "Question not found"
+
+
+@pytest.mark.asyncio
+async def test_rerun_after_failed_complete_does_not_evaluate_again(jobs, monkeypatch):
+    class FlakyJobs(SqlAlchemyJobRepository):
+        broken = True
+
+        async def complete(self, job_id, result, worker_id=None):
+            if self.broken:
+                self.broken = False
+                raise ConnectionError("db gone")
+            return await super().complete(job_id, result, worker_id)
+
+    job = await jobs.enqueue("text", 1, 1, {"answer_text": "ответ"})
+    answers = FakeAnswerService()
+    worker = EvaluationWorker(FlakyJobs(), answers, poll_interval=0.01, lease_seconds=60)
+    await worker.drain()
+    assert (await jobs.get(job.id)).status == "running"
+
+    # lease истёк: задание повторяется, но ответ уже записан
+    assert await jobs.requeue_stale(lease_seconds=0) == 1
+    await worker.drain()
+    done = await jobs.get(job.id)
+    assert done.status == "done" and answers.calls == 1
+    assert done.result == {"answer_id": 10, "score": 7, "feedback": "ok", "is_correct": None}
+
+def test_answers_text_background_returns_202():
+    class FakeJobs:
+        async def submit_text(self, user_id: int, question_id: int, text: str):
+            return EvaluationJob(id=42, kind="text", status="queued", telegram_id=user_id, question_id=question_id,
+                                 payload={"answer_text": text})
+
+        async def get(self, job_id: int):
+            return EvaluationJob(id=job_id, kind="text", status="done", telegram_id=1, question_id=2,
+                                 payload={"answer_text": "secret"}, result={"answer_id": 5, "score": 9})
+
+    app.dependency_overrides[get_evaluation_job_app_service] = lambda: FakeJobs()
+    app.dependency_overrides[get_interview_app_service] = lambda: None
+    try:
+        client = TestClient(app)
+        r = client.post("/answers/text", params={"user_id": 1, "question_id": 2, "background": True}, json="my answer")
+        assert r.status_code == 202
+        assert r.json()["job_id"] == 42 and r.headers["location"] == "/jobs/42"
+
+        r = client.get("/jobs/42")
+        assert r.status_code == 200
+        assert r.json()["status"] == "done" and r.json()["result"]["score"] == 9
+        assert "payload" not in r.json()
+    finally:
+        app.dependency_overrides.clear()
@@ -0,0 +1,58 @@
+from __future__ import annotations
+import pytest
+
+from src.evaluation_parser import EvaluationParseError, extract_json_object, parse_evaluation
+from src.evaluation_stream import IncrementalEvaluationParser
+from src.provider_errors import classify_error
+
+
+def test_parses_fenced_json_with_preface_and_keeps_lists():
+    text = (
+        "Вот оценка ответа:\n```json\n"
+        '{"score": 8, "feedback": "Хорошо {в целом}", "is_correct": true,'
+        ' "strengths": ["индексы"], "improvements": ["MVCC", ""]}\n```\nУдачи!'
+    )
+    result = parse_evaluation(text, max_score=10)
+    assert result == {
+        "score": 8,
+        "feedback": "Хорошо {в целом}",
+        "is_correct": True,
+        "strengths": ["индексы"],
+        "improvements": ["MVCC"],
+    }
+
+
+def test_repairs_common_defects_and_clamps_score():
+    text = '{“score”: "15/10", "feedback": "ok", "is_correct": True, "strengths": [],}'
+    result = parse_evaluation(text, max_score=10)
+    assert result["score"] == 10
+    assert result["is_correct"] is True
+
+
+def test_repair_keeps_python_literals_inside_feedback():
+    text = '{"score": 5, "feedback": "Функция вернёт None, а не False (см. [1,])", "is_correct": False,}'
+    result = parse_evaluation(text)
+    assert result["feedback"] == "Функция вернёт None, а не False (см. [1,])"
+    assert result["is_correct"] is False
+
+
+def test_truncated_output_is_closed():
+    raw = extract_json_object('{"score": 6, "feedback": "обрыв на полусло')
+    assert raw.endswith('"}')
+    result = parse_evaluation('{"score": 6, "feedback": "обрыв на полусло', max_score=10)
+    assert result["feedback"] == "обрыв на полусло"
+    assert result["is_correct"] is True  # вердикт выведен из балла
+
+
+def test_missing_score_is_non_retryable_parse_error():
+    with pytest.raises(EvaluationParseError) as exc:
+        parse_evaluation("Не могу оценить этот ответ", max_score=10)
+    assert classify_error(exc.value) == (False, None)
+
+
+def test_stream_parser_finish_uses_tolerant_parser():
+    parser = IncrementalEvaluationParser(max_score=10)
+    events = parser.feed('```json\n{"score": 12, "feedback": "ok", "is_correct": false}\n```')
+    # промежуточное событие ограничено баллами вопроса так же, как итог
+    assert {"type": "score", "score": 10} in events
+    assert parser.finish()["score"] == 10
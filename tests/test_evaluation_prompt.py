@@ -0,0 +1,27 @@
+from __future__ import annotations
+
+from src.evaluation_prompt import EvaluationPromptBuilder
+
+from conftest import make_question
+
+
+def test_prefix_is_byte_identical_and_answer_sent_once_at_the_end():
+    builder = EvaluationPromptBuilder()
+    q = make_question(title="CAP", content="Объясните CAP-теорему", correct_answer="C, A, P", explanation="...")
+    p1 = builder.build(q, "первый ответ", "text", "notes")
+    p2 = builder.build(q, "второй ответ", "voice", "notes")
+
+    assert p1.system == p2.system
+    assert p1.prefix_key == p2.prefix_key
+    assert "первый ответ" not in p1.system
+    assert p1.messages[-1]["role"] == "user"
+    assert p1.messages[-1]["content"].endswith("первый ответ")
+    assert sum(m["content"].count("первый ответ") for m in p1.messages) == 1
+    assert builder.stats()["hits"] == 1
+
+
+def test_prefix_section_order():
+    q = make_question(title="CAP", content="Объясните CAP-теорему", correct_answer="C, A, P", explanation="...")
+    system = EvaluationPromptBuilder().build(q, "a", notes="мнение эксперта").system
+    positions = [system.index(marker) for marker in ("Вопрос:", "Правильный ответ:", "Объяснение:", "Рубрика оценки", "Мнения экспертов")]
+    assert positions == sorted(positions)
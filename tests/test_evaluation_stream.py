@@ -0,0 +1,101 @@
+from __future__ import annotations
+import json
+import pytest
+from fastapi.testclient import TestClient
+
+from src.api import app
+from src.container import get_answer_app_service
+from src.evaluation_stream import IncrementalEvaluationParser
+from src.infrastructure.ai import DefaultAIProvider
+from src.config import settings
+
+from conftest import make_question
+
+
+def test_parser_emits_score_and_feedback_incrementally():
+    payload = json.dumps(
+        {"score": 7, "feedback": "Хорошо: \"индекс\"\nускоряет поиск", "is_correct": True},
+        ensure_ascii=False,
+    )
+    parser = IncrementalEvaluationParser()
+    events = []
+    for i in range(0, len(payload), 3):
+        events.extend(parser.feed(payload[i:i + 3]))
+
+    assert events[0] == {"type": "score", "score": 7}
+    feedback = "".join(e["delta"] for e in events if e["type"] == "feedback")
+    assert feedback == "Хорошо: \"индекс\"\nускоряет поиск"
+    assert {"type": "is_correct", "is_correct": True} in events
+    assert parser.finish()["score"] == 7
+
+
+class FakeStreamingService:
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.evaluate_calls = 0
+
+    async def stream_evaluation(self, question, user_answer, answer_type="text", multi_agent_notes=None):
+        for chunk in self.chunks:
+            yield chunk
+
+    async def evaluate_answer(self, question, user_answer, answer_type="text", multi_agent_notes=None):
+        self.evaluate_calls += 1
+
+        class E:
+            score, feedback, is_correct = 1, "fallback", False
+            strengths, improvements = [], []
+        return E()
+
+
+@pytest.mark.asyncio
+async def test_provider_stream_yields_result_last_and_falls_back_on_error(monkeypatch):
+    monkeypatch.setattr(settings, "eval_cache_enabled", False)
+    provider = DefaultAIProvider.__new__(DefaultAIProvider)
+    provider._svc = FakeStreamingService(['{"score": 4, "feed', 'back": "ok", "is_correct": true}'])
+    events = [e async for e in provider.evaluate_stream(make_question(), "ответ")]
+    assert events[0]["type"] == "score"
+    assert events[-1] == {
+        "type": "result", "score": 4, "feedback": "ok", "is_correct": True, "strengths": [], "improvements": [],
+    }
+
+    provider._svc = FakeStreamingService(["not json at all"])
+    events = [e async for e in provider.evaluate_stream(make_question(), "ответ")]
+    assert events[-1]["feedback"] == "fallback"
+    assert provider._svc.evaluate_calls == 1
+    assert {"type": "reset"} not in events  # частичных событий не было
+
+
+@pytest.mark.asyncio
+async def test_provider_stream_resets_partial_events_before_fallback(monkeypatch):
+    class BrokenStreamingService(FakeStreamingService):
+        async def stream_evaluation(self, question, user_answer, answer_type="text", multi_agent_notes=None):
+            yield '{"score": 25, "feedback": "Почти'
+            raise ConnectionError("stream dropped")
+
+    monkeypatch.setattr(settings, "eval_cache_enabled", False)
+    provider = DefaultAIProvider.__new__(DefaultAIProvider)
+    provider._svc = BrokenStreamingService([])
+    events = [e async for e in provider.evaluate_stream(make_question(points=10), "ответ")]
+
+    assert events[0] == {"type": "score", "score": 10}
+    assert [e["type"] for e in events[-2:]] == ["reset", "result"]
+    assert events[-1]["feedback"] == "fallback"
+
+
+def test_answers_text_stream_sse():
+    class FakeService:
+        async def answer_text_stream(self, user_id, question_id, text):
+            yield {"type": "score", "score": 5}
+            yield {"type": "feedback", "delta": "ok"}
+            yield {"type": "result", "score": 5, "feedback": "ok", "is_correct": True, "answer_id": 1}
+
+    app.dependency_overrides[get_answer_app_service] = lambda: FakeService()
+    client = TestClient(app)
+    r = client.post("/answers/text/stream", params={"user_id": 901, "question_id": 1}, json="my answer")
+    app.dependency_overrides.clear()
+
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/event-stream")
+    events = [block for block in r.text.split("\n\n") if block]
+    assert events[0].startswith("event: score")
+    assert json.loads(events[-1].split("data: ", 1)[1])["answer_id"] == 1
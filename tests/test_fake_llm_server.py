@@ -0,0 +1,38 @@
+from __future__ import annotations
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts"))
+
+from fake_llm_server import Cassette, FakeLLMServer, LatencyModel, start_server  # noqa: E402
+from src.config import settings  # noqa: E402
+from src.services import GigaChatService, OpenAIService  # noqa: E402
+
+from conftest import make_question  # noqa: E402
+
+
+@pytest.mark.asyncio
+async def test_providers_talk_to_fake_server_via_base_url(monkeypatch):
+    monkeypatch.setattr(settings, "openai_api_key", "fake-key")
+    cassette = Cassette([{"match": "B-tree", "content": "```json\n{\"score\": 9, \"feedback\": \"ok\", \"is_correct\": true}\n```"}])
+    server = FakeLLMServer(LatencyModel("fixed", mean=0.0), chunk_delay=0.0, cassette=cassette)
+    runner = await start_server(server, "127.0.0.1", 0)
+    port = runner.addresses[0][1]
+    base = f"http://127.0.0.1:{port}"
+    try:
+        openai = OpenAIService(base_url=f"{base}/v1")
+        evaluation = await openai.evaluate_answer(make_question(), "B-tree индекс")
+        assert evaluation.score == 9
+        chunks = [c async for c in openai.stream_evaluation(make_question(), "B-tree индекс")]
+        assert "".join(chunks).count("score") == 1
+        await openai.close()
+
+        giga = GigaChatService(api_url=f"{base}/api/v1", auth_url=f"{base}/api/v2/oauth")
+        evaluation = await giga.evaluate_answer(make_question(), "B-tree индекс")
+        assert evaluation.score == 9
+        await giga.close()
+    finally:
+        await runner.cleanup()
+    assert server.counters["chat"] == 3 and server.counters["oauth"] == 1
@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import pytest
+from sqlalchemy import func, select
+
+from src.config import settings
+from src.database import LeaderboardSnapshot
+from src.leaderboard import Leaderboard, RankedBoard
+
+
+def test_ranked_board_orders_ties_and_percentiles():
+    board = RankedBoard()
+    for telegram_id, score in ((1, 10), (2, 30), (3, 20), (4, 20)):
+        board.set(telegram_id, score)
+    board.add(1, 25)  # 35 — теперь первый
+    assert board.top(3) == [(1, 1, 35), (2, 2, 30), (3, 3, 20)]
+    assert board.top(10)[-1] == (3, 4, 20)  # при равных очках место общее
+    assert board.rank(4) == (3, 20, 0.0)
+    assert board.rank(2) == (2, 30, 50.0)
+    assert board.rank(99) is None and len(board) == 4
+
+
+async def answer(db, user, category: str, score: int) -> None:
+    async with db.unit_of_work("answer.record"):
+        await db.add_user_stats(user.id, category, "middle", score)
+
+
+@pytest.mark.asyncio
+async def test_boards_load_sync_across_processes_and_restore_from_snapshot(db, monkeypatch):
+    monkeypatch.setattr(settings, "leaderboard_refresh_seconds", 0)
+    alice, bob = await db.create_user(1, "alice", None, None), await db.create_user(2, "bob", None, None)
+    await answer(db, alice, "databases", 8)
+    await answer(db, bob, "networking", 5)
+
+    api = Leaderboard()
+    assert await api.ensure_loaded()
+    assert api.top(10) == [(1, 1, 8), (2, 2, 5)]
+    assert api.top(10, "networking", "week") == [(1, 2, 5)]
+
+    # очки этого процесса — сразу, другого процесса (бота) — при синхронизации
+    api.record(2, "networking", 4)
+    await answer(db, bob, "networking", 4)
+    await answer(db, alice, "networking", 9)
+    assert api.rank(2) == (1, 9, 50.0)
+    await api.refresh()
+    assert api.top(10) == [(1, 1, 17), (2, 2, 9)]
+    assert api.rank(1, "networking", "week") == (1, 9, 0.0)  # вровень с bob
+
+    # новый процесс стартует со снимка и догоняет изменения после него
+    await api.save_snapshot()
+    async with db.get_session() as session:
+        assert await session.scalar(select(func.count()).select_from(LeaderboardSnapshot)) == 10
+    await answer(db, bob, "databases", 20)
+    fresh = Leaderboard()
+    await fresh.load()
+    assert fresh.top(2) == [(1, 2, 29), (2, 1, 17)]
+    assert fresh.top(10, "databases") == [(1, 2, 20), (2, 1, 8)]
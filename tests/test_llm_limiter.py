@@ -0,0 +1,72 @@
+from __future__ import annotations
+import asyncio
+import pytest
+
+from src.llm_limiter import AdaptiveConcurrencyLimiter, LimiterRejected
+from src.services import ProviderError
+
+
+@pytest.mark.asyncio
+async def test_window_grows_when_saturated_and_shrinks_on_429():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=2, max_limit=10, max_wait=1.0)
+
+    async def call():
+        async with limiter.slot():
+            await asyncio.sleep(0.001)
+
+    for _ in range(10):
+        await asyncio.gather(*[call() for _ in range(limiter.limit)])
+    grown = limiter.limit
+    assert grown > 2
+
+    with pytest.raises(ProviderError):
+        async with limiter.slot():
+            raise ProviderError("rate limited", 429)
+    assert limiter.limit == max(1, int(grown * 0.5))
+    assert limiter.stats()["decreases"] == 1
+
+
+@pytest.mark.asyncio
+async def test_excess_callers_queue_and_are_rejected_after_max_wait():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=1, max_limit=1, max_wait=0.05)
+    release = asyncio.Event()
+
+    async def holder():
+        async with limiter.slot():
+            await release.wait()
+
+    task = asyncio.create_task(holder())
+    await asyncio.sleep(0)
+    assert limiter.stats()["in_flight"] == 1
+
+    with pytest.raises(LimiterRejected):
+        await limiter.acquire()
+    assert limiter.stats()["rejections"] == 1
+    assert limiter.stats()["queue_depth"] == 0
+
+    waiter = asyncio.create_task(limiter.acquire())
+    await asyncio.sleep(0)
+    assert limiter.stats()["queue_depth"] == 1
+    release.set()
+    await task
+    await waiter
+    assert limiter.stats()["in_flight"] == 1
+    limiter.release(0.0, overload=False)
+    assert limiter.stats()["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_stream_consumer_time_is_not_provider_latency():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=4, max_limit=4)
+
+    async def stream():
+        async with limiter.slot() as timer:
+            for chunk in ("a", "b", "c"):
+                await asyncio.sleep(0.001)  # ожидание провайдера
+                with timer.paused():
+                    yield chunk
+
+    async for _ in stream():
+        await asyncio.sleep(0.05)  # медленный потребитель (бот правит сообщение)
+    assert limiter.stats()["baseline_latency"] < 0.05
+    assert limiter.stats()["in_flight"] == 0
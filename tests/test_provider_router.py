@@ -0,0 +1,109 @@
+from __future__ import annotations
+import asyncio
+import pytest
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+from src.config import settings
+from src.models import AnswerEvaluation
+from src.provider_errors import ProviderError, backoff_delay, classify_error, parse_retry_after
+from src.provider_router import CircuitBreaker, ProviderRouter
+from src.services import AIService, EVALUATION_ERROR_FEEDBACK
+
+from conftest import make_question
+
+
+class FakeProvider(AIService):
+    def __init__(self, name, outcomes, delay=0.0):
+        self.name = name
+        self.outcomes = list(outcomes)
+        self.delay = delay
+        self.calls = 0
+
+    async def evaluate_prompt(self, prompt):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        outcome = self.outcomes.pop(0) if self.outcomes else "ok"
+        if isinstance(outcome, Exception):
+            raise outcome
+        return AnswerEvaluation(answer_id=0, score=7, feedback=self.name, is_correct=True)
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(settings, "ai_retry_base_delay", 0.001)
+    monkeypatch.setattr(settings, "ai_retry_max_delay", 0.001)
+    monkeypatch.setattr(settings, "ai_hedge_enabled", False)
+
+
+def test_breaker_opens_after_threshold_and_half_opens_after_timeout():
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=lambda: now[0])
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and not breaker.allow()
+
+    now[0] = 11
+    assert breaker.allow()  # единственная проба
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    now[0] = 22
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_error_classification_and_retry_after():
+    assert classify_error(ProviderError("busy", 429, retry_after=3)) == (True, 3)
+    assert classify_error(ProviderError("bad request", 400)) == (False, None)
+    assert classify_error(ValueError("Expecting value")) == (False, None)
+    assert classify_error(asyncio.TimeoutError()) == (True, None)
+
+    assert parse_retry_after({"Retry-After": "5"}) == 5.0
+    assert parse_retry_after({"retry-after-ms": "250"}) == 0.25
+    future = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=20), usegmt=True)
+    assert 15 < parse_retry_after({"Retry-After": future}) <= 20
+    assert backoff_delay(0, retry_after=1000) == settings.ai_retry_after_max
+
+
+@pytest.mark.asyncio
+async def test_router_fails_over_on_retryable_error_without_retrying_parse_errors():
+    primary = FakeProvider("openai", [ProviderError("overloaded", 503)])
+    backup = FakeProvider("gigachat", [])
+    router = ProviderRouter([primary, backup])
+    result = await router.evaluate_answer(make_question(), "ответ")
+    assert result.feedback == "gigachat"
+    assert router.stats()["failovers"] == 1
+
+    broken = FakeProvider("openai", [ValueError("invalid json")])
+    router = ProviderRouter([broken, FakeProvider("gigachat", [])])
+    result = await router.evaluate_answer(make_question(), "ответ")
+    assert result.feedback == EVALUATION_ERROR_FEEDBACK
+    assert broken.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_open_breaker_skips_provider(monkeypatch):
+    monkeypatch.setattr(settings, "ai_breaker_failure_threshold", 1)
+    primary = FakeProvider("openai", [ProviderError("down", 502)] * 5)
+    backup = FakeProvider("gigachat", [])
+    router = ProviderRouter([primary, backup])
+    await router.evaluate_answer(make_question(), "ответ")
+    await router.evaluate_answer(make_question(), "ответ")
+    assert primary.calls == 1
+    assert router.stats()["providers"]["openai"]["state"] == CircuitBreaker.OPEN
+
+
+@pytest.mark.asyncio
+async def test_hedged_request_returns_faster_provider(monkeypatch):
+    monkeypatch.setattr(settings, "ai_hedge_enabled", True)
+    monkeypatch.setattr(settings, "ai_hedge_delay_default", 0.01)
+    slow = FakeProvider("openai", [], delay=1.0)
+    fast = FakeProvider("gigachat", [], delay=0.0)
+    router = ProviderRouter([slow, fast])
+    result = await asyncio.wait_for(router.evaluate_answer(make_question(), "ответ"), timeout=0.5)
+    assert result.feedback == "gigachat"
+    assert router.stats()["hedge_wins"] == 1
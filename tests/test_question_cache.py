@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+import pytest
+from pydantic import ValidationError
+
+from src.domain.entities import QuestionEntity
+from src.infrastructure.repositories import SqlAlchemyQuestionRepository, question_cache
+
+from conftest import new_question
+
+
+@pytest.mark.asyncio
+async def test_reads_hit_cache_and_writes_keep_it_fresh(db):
+    questions = SqlAlchemyQuestionRepository()
+    q = await questions.create(new_question(correct_answer="B-tree"))
+    first = await questions.get_by_id(q.id)
+    assert first is await questions.get_by_id(q.id)  # один неизменяемый экземпляр на всех
+    assert (await questions.get_many_by_ids([q.id]))[q.id] is first
+    with pytest.raises(ValidationError):
+        first.title = "другое"
+
+    # правка обновляет кэш, импорт с изменениями — сбрасывает
+    await questions.update(q.id, {"points": 20})
+    assert (await questions.get_by_id(q.id)).points == 20
+    await questions.upsert_many([QuestionEntity(
+        id=None, title="Индексы", content="...", level="middle", category="databases",
+        question_type="text", points=30, correct_answer="B-tree",
+    )])
+    assert q.id not in question_cache
+    assert (await questions.get_by_id(q.id)).points == 30
+
+    await questions.delete(q.id)
+    assert await questions.get_by_id(q.id) is None
+    stats = question_cache.stats()
+    assert stats["hits"] >= 3 and 0 < stats["hit_ratio"] < 1
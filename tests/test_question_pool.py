@@ -0,0 +1,36 @@
+from __future__ import annotations
+import random
+
+from src.question_pool import QuestionPool
+
+
+def make_pool() -> QuestionPool:
+    pool = QuestionPool(rng=random.Random(7))
+    pool.build([(i, "middle", "databases") for i in range(1, 101)] + [(500, "junior", "backend")])
+    return pool
+
+
+def test_pick_respects_exclusions_and_falls_back_to_scan():
+    pool = make_pool()
+    picks = {pool.pick("middle", "databases") for _ in range(200)}
+    assert len(picks) > 50 and picks <= set(range(1, 101))
+
+    exclude = set(range(1, 100))
+    assert pool.pick("middle", "databases", exclude) == 100
+    assert pool.stats()["scans"] >= 1
+    assert pool.pick("middle", "databases", set(range(1, 101))) is None
+    assert pool.pick("senior", "databases") is None
+
+
+def test_incremental_add_update_remove():
+    pool = make_pool()
+    pool.add(101, "middle", "databases")
+    assert pool.size("middle", "databases") == 101
+
+    pool.update(500, "middle", "databases")  # сменили уровень и категорию
+    assert pool.size("middle", "databases") == 102
+    assert "junior/backend" not in pool.sizes()
+
+    assert pool.remove(50) and not pool.remove(50)
+    assert pool.size("middle", "databases") == 101
+    assert 50 not in {pool.pick("middle", "databases") for _ in range(500)}
@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import insert
+
+from src.config import settings
+from src.database import Question as QuestionORM, database
+from src.infrastructure.question_search import question_search
+from src.infrastructure.repositories import SqlAlchemyQuestionRepository, _question_counts
+
+from conftest import new_question
+
+
+@pytest_asyncio.fixture
+async def questions(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "database_url", f"sqlite+aiosqlite:///{tmp_path / 'search.db'}")
+    engine, session_maker = database.engine, database.session_maker
+    await database.connect()
+    try:
+        yield SqlAlchemyQuestionRepository()
+    finally:
+        await database.disconnect()
+        database.engine, database.session_maker = engine, session_maker
+
+
+@pytest.mark.asyncio
+async def test_fts5_prefix_search_ranks_title_matches_and_highlights(questions):
+    await database.create_tables()
+    assert question_search.backend.name == "sqlite_fts5"
+    await questions.create(new_question("Транзакции", content="Уровни изоляции и индексы под нагрузкой"))
+    await questions.create(new_question("Индексы B-tree", content="Как устроен индекс в PostgreSQL"))
+    await questions.create(new_question("TCP", content="Рукопожатие", category="networking"))
+
+    hits = await questions.search(q="индекс")
+    assert [h.title for h in hits] == ["Индексы B-tree", "Транзакции"]
+    assert "<b>индексы</b>" in hits[0].highlight.lower()
+    assert await questions.count(q="инд") == 2
+    assert await questions.count(category="networking", q="индекс") == 0
+    assert [h.title for h in await questions.search(q="postgres индекс")] == ["Индексы B-tree"]
+
+    # триггеры держат индекс в актуальном состоянии
+    await questions.update(3, {"content": "Рукопожатие и индексы маршрутов"})
+    await questions.delete(1)
+    assert [h.title for h in await questions.search(q="индекс")] == ["Индексы B-tree", "TCP"]
+    # запрос без слов — обычный поиск подстроки, без подсветки
+    assert (await questions.search(q="-"))[0].highlight is None
+
+
+@pytest.mark.asyncio
+async def test_fts_index_is_built_for_existing_rows(questions):
+    async with database.engine.begin() as conn:
+        await conn.run_sync(QuestionORM.metadata.create_all)
+        await conn.execute(insert(QuestionORM), [new_question("Шардирование", content="Ключи шардирования").model_dump()])
+    await database.create_tables()
+    assert [h.title for h in await questions.search(q="шард")] == ["Шардирование"]
+
+
+@pytest.mark.asyncio
+async def test_keyset_pages_cover_everything_once(questions):
+    await database.create_tables()
+    for i in range(7):
+        await questions.create(new_question(f"Индекс {i}", content="индекс " * (i % 3 + 1)))
+
+    async def walk(**filters):
+        seen, cursor, totals = [], None, []
+        while True:
+            page = await questions.search_page(limit=3, cursor=cursor, with_total=True, **filters)
+            seen += [h.id for h in page.items]
+            totals.append(page.total)
+            if page.next_cursor is None:
+                return seen, totals
+            cursor = page.next_cursor
+
+    ids, totals = await walk()
+    assert ids == [7, 6, 5, 4, 3, 2, 1] and totals == [7, 7, 7]
+    # по релевантности: ключ (ранг, id), одинаковые ранги не теряются и не дублируются
+    ranked, totals = await walk(q="индекс")
+    assert sorted(ranked) == list(range(1, 8)) and totals == [7, 7, 7]
+
+    first = await questions.search_page(limit=3, q="индекс")
+    assert first.total is None
+    # итог на второй странице без кэша — подзапросом в том же запросе
+    _question_counts.clear()
+    second = await questions.search_page(limit=3, q="индекс", cursor=first.next_cursor, with_total=True)
+    assert second.total == 7 and len(second.items) == 3
+    with pytest.raises(ValueError):
+        await questions.search_page(limit=3, q="другое", cursor=first.next_cursor)
+    with pytest.raises(ValueError):
+        await questions.search_page(cursor="not-a-cursor")
@@ -4,7 +4,7 @@ from datetime import datetime
 
 from src.application.user_services import QuestionAppService
 from src.domain.ports import UserRepository, QuestionRepository
-from src.models import Question as DTOQuestion
+from src.models import Question as DTOQuestion, QuestionPage, QuestionSearchHit
 
 
 class FakeUserRepo(UserRepository):
@@ -41,12 +41,15 @@ class FakeQuestionRepo(QuestionRepository):
         return True
     async def count(self, level=None, category=None, q=None):
         return len([x for x in self.data if (not level or x.level==level) and (not category or x.category==category)])
+    async def search_page(self, level=None, category=None, q=None, limit=20, cursor=None, with_total=False):
+        items = await self.search(level, category, q, limit)
+        total = await self.count(level, category, q) if with_total else None
+        return QuestionPage(items=[QuestionSearchHit(**x.model_dump()) for x in items], total=total, limit=limit)
 
 
 @pytest.mark.asyncio
 async def test_search_returns_items_and_total():
     qs = QuestionAppService(FakeUserRepo(), FakeQuestionRepo())
-    res = await qs.search(level="middle", category="databases", q=None, limit=10, offset=0)
-    assert "items" in res and "total" in res
-    assert res["total"] == 2
-    assert len(res["items"]) == 2
+    res = await qs.search(level="middle", category="databases", q=None, limit=10, with_total=True)
+    assert res.total == 2
+    assert len(res.items) == 2 and res.next_cursor is None
@@ -0,0 +1,70 @@
+from __future__ import annotations
+import time
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src.config import settings
+from src.database import Base, Question as QuestionORM
+from src.infrastructure.repositories import SqlAlchemyQuestionRepository
+
+from conftest import new_question
+
+
+def question_row(title: str) -> dict:
+    return new_question(title).model_dump()
+
+
+@pytest.fixture(autouse=True)
+def replica_url(tmp_path, monkeypatch):
+    # autouse-фикстуры создаются раньше db: реплика подключается вместе с primary
+    monkeypatch.setattr(settings, "database_replica_urls", f"sqlite+aiosqlite:///{tmp_path / 'replica.db'}")
+
+
+@pytest_asyncio.fixture
+async def db(db):
+    replica = db.replicas[0]
+    async with replica.engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        # на реплике своя версия данных — видно, откуда пришло чтение
+        await conn.execute(insert(QuestionORM), [question_row("с реплики")])
+    yield db
+
+
+@pytest.mark.asyncio
+async def test_reads_go_to_fresh_replica_and_writes_stay_visible(db):
+    questions = SqlAlchemyQuestionRepository()
+    async with db.get_session() as session:
+        await session.execute(insert(QuestionORM), [question_row("с primary"), question_row("только на primary")])
+        await session.commit()
+
+    assert [q.title for q in await questions.search()] == ["с реплики"]
+    assert await questions.count() == 1
+    # промах на реплике (вопрос ещё не доехал) добирается с primary
+    assert (await questions.get_by_id(2)).title == "только на primary"
+
+    async with db.unit_of_work("rw"):
+        assert await questions.count() == 1  # единица работы ещё не писала
+        await db.create_user(1, "u", None, None)
+        assert await questions.count() == 2  # read-your-writes: после записи — primary
+    assert db.read_your_writes == 1
+    assert db.replicas[0].reads == 4
+
+
+@pytest.mark.asyncio
+async def test_lagging_or_broken_replica_falls_back_to_primary(db):
+    questions = SqlAlchemyQuestionRepository()
+    replica = db.replicas[0]
+    replica.lag, replica.checked_at = settings.replica_max_lag_seconds + 1, time.monotonic()
+    assert await questions.count() == 0
+    assert db.replica_fallbacks == 1
+
+    await replica.engine.dispose()
+    replica.url = replica.name = "unreachable"
+    replica.engine = create_async_engine("sqlite+aiosqlite:////nonexistent/dir/replica.db")
+    replica.checked_at = None
+    assert await questions.count() == 0
+    stats = db.replica_stats()["replicas"][0]
+    assert stats["healthy"] is False and stats["error"]
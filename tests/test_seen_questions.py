@@ -0,0 +1,115 @@
+from __future__ import annotations
+import random
+from datetime import datetime
+
+import pytest
+
+from src.models import Question as DTOQuestion
+from src.seen_questions import RunBitmap, SeenQuestionsStore, decode_seen, encode_seen
+
+
+def test_run_bitmap_merges_runs_and_roundtrips():
+    bitmap = RunBitmap()
+    for qid in [5, 7, 6, 1, 2, 100, 3]:
+        assert bitmap.add(qid)
+    assert not bitmap.add(6)
+    assert bitmap.runs == 3  # [1, 4), [5, 8), [100, 101)
+    assert len(bitmap) == 7 and list(bitmap) == [1, 2, 3, 5, 6, 7, 100]
+    assert 4 not in bitmap and 7 in bitmap and 101 not in bitmap
+
+    many = RunBitmap()
+    for qid in range(1, 10_001):
+        many.add(qid)
+    blob = encode_seen({"middle/databases": bitmap, "middle/backend": many, "junior/empty": RunBitmap()})
+    assert len(blob) < 50
+    decoded = decode_seen(blob)
+    assert set(decoded) == {"middle/databases", "middle/backend"}
+    assert list(decoded["middle/databases"]) == list(bitmap) and len(decoded["middle/backend"]) == 10_000
+
+
+class FakeUsers:
+    def __init__(self):
+        self.blobs: dict[int, bytes] = {}
+
+    async def get_seen_questions(self, telegram_id: int, for_update: bool = False):
+        return self.blobs.get(telegram_id)
+
+
+class FakeQuestions:
+    def __init__(self, ids):
+        self.ids = ids
+        self.rng = random.Random(1)
+
+    async def get_random(self, level, category, exclude_ids=None):
+        candidates = [i for i in self.ids if not exclude_ids or i not in exclude_ids]
+        if not candidates:
+            return None
+        qid = self.rng.choice(candidates)
+        return DTOQuestion(
+            id=qid, title="T", content="C", level=level, category=category, question_type="text", points=10,
+            correct_answer="...", explanation=None, hints=None, tags=None,
+            created_at=datetime(2024, 1, 1), updated_at=datetime(2024, 1, 1),
+        )
+
+
+@pytest.mark.asyncio
+async def test_store_serves_each_question_once_then_starts_over():
+    users = FakeUsers()
+    store = SeenQuestionsStore(users, maxsize=10, ttl=60)
+    questions = FakeQuestions(list(range(1, 6)))
+
+    served = []
+    for _ in range(5):
+        question, blob = await store.next_unseen(questions, 42, "middle", "databases")
+        served.append(question.id)
+        users.blobs[42] = blob
+    assert sorted(served) == [1, 2, 3, 4, 5]
+
+    # состояние переживает потерю кэша: читается из blob пользователя
+    fresh = SeenQuestionsStore(users, maxsize=10, ttl=60)
+    assert len(await fresh.exclusions(42, "middle", "databases")) == 5
+    question, _ = await fresh.next_unseen(questions, 42, "middle", "databases")
+    assert question is not None and len(await fresh.exclusions(42, "middle", "databases")) == 1
+
+    users.blobs[42] = await fresh.reset(42, "databases")
+    assert decode_seen(users.blobs[42]) == {}
+
+
+@pytest.mark.asyncio
+async def test_marks_and_resets_from_two_processes_do_not_overwrite_each_other():
+    users = FakeUsers()
+    bot = SeenQuestionsStore(users, maxsize=10, ttl=600)
+    api = SeenQuestionsStore(users, maxsize=10, ttl=600)
+
+    users.blobs[42] = await bot.mark(42, "middle", "databases", 1)
+    assert len(await bot.exclusions(42, "middle", "databases")) == 1  # кэш бота прогрет
+    users.blobs[42] = await api.mark(42, "middle", "databases", 2)
+    users.blobs[42] = await bot.mark(42, "middle", "databases", 3)
+    assert list(decode_seen(users.blobs[42])["middle/databases"]) == [1, 2, 3]
+
+    # сброс в API не отменяется следующей отметкой бота из его кэша
+    users.blobs[42] = await api.reset(42)
+    users.blobs[42] = await bot.mark(42, "middle", "databases", 4)
+    assert list(decode_seen(users.blobs[42])["middle/databases"]) == [4]
+
+
+@pytest.mark.asyncio
+async def test_restart_on_one_level_keeps_progress_on_other_levels():
+    users = FakeUsers()
+    store = SeenQuestionsStore(users, maxsize=10, ttl=60)
+    junior, middle = FakeQuestions([1, 2]), FakeQuestions([10, 11, 12])
+
+    for _ in range(2):
+        _, users.blobs[42] = await store.next_unseen(middle, 42, "middle", "databases")
+    for _ in range(3):  # третий вызов исчерпывает junior и начинает его заново
+        _, users.blobs[42] = await store.next_unseen(junior, 42, "junior", "databases")
+
+    seen = decode_seen(users.blobs[42])
+    assert len(seen["junior/databases"]) == 1 and len(seen["middle/databases"]) == 2
+    question, _ = await store.next_unseen(middle, 42, "middle", "databases")
+    assert question.id not in seen["middle/databases"]
+
+    # ручной сброс категории чистит все её уровни
+    users.blobs[42] = await store.reset(42, "databases")
+    assert decode_seen(users.blobs[42]) == {}
+    assert decode_seen(bytes([1, 1, 9]) + b"databases" + bytes([0])) == {}  # прежний формат без уровня
@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+from src.config import settings
+from src.evaluation_prompt import EvaluationPromptBuilder
+from src.token_budget import (
+    BudgetSection,
+    TRUNCATION_MARK,
+    completion_budget,
+    count_tokens,
+    fit_sections,
+    truncate_to_tokens,
+)
+
+from conftest import make_question
+
+
+def test_lowest_priority_sections_are_cut_first():
+    sections = [
+        BudgetSection("notes", "заметка эксперта\n" * 200, priority=0),
+        BudgetSection("reference", "эталонный ответ " * 50, priority=2, min_tokens=50),
+    ]
+    reference_tokens = count_tokens(sections[1].text)
+    fitted = fit_sections(sections, reference_tokens + 100)
+    assert fitted["reference"] == sections[1].text
+    assert count_tokens(fitted["notes"]) <= 100
+    assert fitted["notes"].startswith("заметка эксперта\n")
+
+
+def test_answer_truncation_keeps_head_and_tail():
+    text = "начало " + "вода " * 5000 + "итоговый вывод"
+    cut = truncate_to_tokens(text, 200, keep_tail=True)
+    assert cut.startswith("начало") and cut.endswith("итоговый вывод")
+    assert TRUNCATION_MARK in cut
+    assert count_tokens(cut) <= 210
+
+
+def test_builder_bounds_prompt_and_keeps_prefix_stable(monkeypatch):
+    monkeypatch.setattr(settings, "eval_prompt_token_budget", 2000)
+    monkeypatch.setattr(settings, "eval_answer_min_tokens", 500)
+    builder = EvaluationPromptBuilder()
+    question = make_question(id=11, title="Индексы", explanation="...", correct_answer="очень длинный эталон " * 2000)
+    huge = builder.build(question, "длинная расшифровка голосового ответа " * 3000, "voice", "n")
+    short = builder.build(question, "короткий ответ", "text", "n")
+
+    assert huge.system == short.system
+    assert huge.estimated_tokens <= 2100
+    assert builder.stats()["truncated_answers"] == 1
+
+
+def test_completion_budget_scales_with_points():
+    assert completion_budget(1) < completion_budget(10) <= settings.eval_completion_tokens_max
+    assert completion_budget(0) == settings.eval_completion_tokens_min
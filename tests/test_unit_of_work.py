@@ -0,0 +1,60 @@
+from __future__ import annotations
+import asyncio
+
+import pytest
+
+from src.application.user_services import AnswerAppService
+from src.infrastructure.repositories import SqlAlchemyAnswerRepository, SqlAlchemyQuestionRepository, SqlAlchemyUserRepository
+
+from conftest import new_question
+
+
+@pytest.mark.asyncio
+async def test_writes_share_one_transaction_and_roll_back_together(db):
+    async with db.unit_of_work("setup") as uow:
+        await db.create_user(1, "a", None, None)
+        await db.increment_user_progress(1, 5)
+        # чтение внутри единицы работы видит ещё не зафиксированные записи
+        assert (await db.get_user_by_telegram_id(1)).score == 5
+        assert uow.dirty and uow.statements >= 3
+        # другая задача получает свою сессию и незафиксированного пользователя не видит
+        assert await asyncio.ensure_future(db.get_user_by_telegram_id(1)) is None
+    assert (await db.get_user_by_telegram_id(1)).score == 5
+
+    with pytest.raises(RuntimeError):
+        async with db.unit_of_work("failing"):
+            await db.increment_user_progress(1, 100)
+            await db.create_user(2, "b", None, None)
+            raise RuntimeError("boom")
+    assert (await db.get_user_by_telegram_id(1)).score == 5
+    assert await db.get_user_by_telegram_id(2) is None
+    assert db.uow_stats.snapshot()["failing"]["count"] == 1
+
+
+class FakeAI:
+    async def evaluate(self, question, user_answer, answer_type="text", multi_agent_notes=None):
+        return {"score": 7, "feedback": "ok", "is_correct": True}
+
+
+class FakeOrch:
+    async def prepare_notes(self, category, telegram_id, level, title):
+        return ""
+
+
+@pytest.mark.asyncio
+async def test_answer_pipeline_uses_two_short_units_of_work(db):
+    users, questions = SqlAlchemyUserRepository(), SqlAlchemyQuestionRepository()
+    await users.create(10, "u", None, None)
+    q = await questions.create(new_question())
+    service = AnswerAppService(users, questions, SqlAlchemyAnswerRepository(), FakeAI(), voice=None, orch=FakeOrch(),
+                               uow=db.unit_of_work)
+
+    answer, evaluation = await service.answer_text(10, q.id, "B-tree")
+    assert answer.score == 7 and answer.feedback == "ok" and evaluation["score"] == 7
+    assert (await users.get_by_telegram_id(10)).score == 7
+
+    stats = db.uow_stats.snapshot()
+    # пользователь и вопрос берутся из кэшей процесса
+    assert stats["answer.load"]["last_statements"] == 0
+    # INSERT ... RETURNING, UPDATE ... RETURNING и upsert итогов, без отдельного set_score
+    assert stats["answer.record"]["last_statements"] == 3
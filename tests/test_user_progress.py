@@ -0,0 +1,24 @@
+from __future__ import annotations
+import asyncio
+
+import pytest
+
+
+@pytest.mark.asyncio
+async def test_concurrent_increments_are_not_lost(db):
+    await db.create_user(555, "u", None, None)
+    results = await asyncio.gather(*[db.increment_user_progress(555, 3) for _ in range(10)])
+    user = await db.get_user_by_telegram_id(555)
+    assert user.score == 30 and user.questions_answered == 10
+    assert sorted(r.score for r in results) == list(range(3, 31, 3))
+    assert await db.increment_user_progress(404, 1) is None
+
+
+@pytest.mark.asyncio
+async def test_update_user_returns_fresh_row_and_rejects_unknown_fields(db):
+    await db.create_user(556, "u", None, None)
+    user = await db.update_user(556, level="senior", category="databases")
+    assert user.level == "senior" and user.category == "databases"
+    assert await db.update_user(404, level="junior") is None
+    with pytest.raises(ValueError):
+        await db.update_user(556, **{"score = 0, level": "x"})
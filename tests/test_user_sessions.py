@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import pytest
+
+from src.user_sessions import user_sessions
+
+
+@pytest.mark.asyncio
+async def test_taps_read_from_cache_and_writes_go_through(db):
+    await db.create_user(1, "u", None, None)
+    await db.update_user(1, level="middle")
+    async with db.unit_of_work("tap") as uow:
+        user = await db.get_user_by_telegram_id(1)
+        assert user.level == "middle" and uow.statements == 0
+
+    # откат единицы работы не попадает в кэш
+    with pytest.raises(RuntimeError):
+        async with db.unit_of_work("answer"):
+            await db.increment_user_progress(1, 5)
+            assert (await db.get_user_by_telegram_id(1)).score == 5
+            raise RuntimeError("LLM failed")
+    assert (await db.get_user_by_telegram_id(1)).score == 0
+    async with db.unit_of_work("answer"):
+        await db.increment_user_progress(1, 5)
+    assert (await db.get_user_by_telegram_id(1)) is user_sessions.get(1)
+    assert user_sessions.get(1).score == 5
+
+
+@pytest.mark.asyncio
+async def test_other_process_notification_drops_entry(db):
+    await db.create_user(1, "u", None, None)
+    assert user_sessions.get(1) is not None
+    user_sessions._on_notify(None, 0, "user_sessions", user_sessions.notify_payload(1))
+    assert user_sessions.get(1) is not None  # своё уведомление — запись уже свежая
+    user_sessions._on_notify(None, 0, "user_sessions", "other-process:1")
+    assert user_sessions.get(1) is None
+    assert user_sessions.stats()["notifications"] == 1
+
+
+@pytest.mark.asyncio
+async def test_notification_during_read_keeps_stale_row_out_of_cache(db):
+    await db.create_user(1, "u", None, None)
+    user_sessions.clear()
+    select_users = db.get_session
+
+    def notify_after_select():
+        # NOTIFY другого процесса приходит, пока SELECT уже прочитал старую строку
+        session = select_users()
+        user_sessions._on_notify(None, 0, "user_sessions", "other-process:1")
+        return session
+
+    db.get_session = notify_after_select
+    try:
+        user = await db.get_user_by_telegram_id(1)
+        users = await db.get_users_by_telegram_ids([1])
+    finally:
+        del db.get_session
+    assert user.telegram_id == 1 and 1 in users
+    assert user_sessions.get(1) is None
+
+    await db.get_user_by_telegram_id(1)
+    assert user_sessions.get(1) is not None  # без сброса во время чтения строка кэшируется
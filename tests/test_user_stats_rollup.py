@@ -0,0 +1,51 @@
+from __future__ import annotations
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import select, update
+
+from src.database import Answer as AnswerORM, UserStatsRollup
+from src.infrastructure.repositories import SqlAlchemyQuestionRepository, SqlAlchemyUserRepository
+
+from conftest import new_question
+
+
+@pytest.mark.asyncio
+async def test_rollup_follows_answer_writes_and_backfill_matches(db):
+    users, questions = SqlAlchemyUserRepository(), SqlAlchemyQuestionRepository()
+    user = await users.create(10, "u", None, None)
+    sql = await questions.create(new_question("Индексы", category="databases"))
+    tcp = await questions.create(new_question("TCP", category="networking", level="junior"))
+
+    for question, score in ((sql, 6), (sql, 8), (tcp, 3)):
+        async with db.unit_of_work("answer.record"):
+            await db.create_answer(user.id, question.id, "...", "text", score=score, feedback="ok")
+            await users.increment_progress(10, score)
+            await users.add_answer_stats(user.id, question.category, question.level, score)
+    # ответ без оценки в итоги не попадает
+    await db.create_answer(user.id, tcp.id, "...", "text")
+
+    stats = await users.get_stats(user.id)
+    assert stats["total_score"] == 17
+    assert stats["categories"] == [
+        {"category": "databases", "level": "middle", "answered": 2, "total_score": 14, "average_score": 7.0},
+        {"category": "networking", "level": "junior", "answered": 1, "total_score": 3, "average_score": 3.0},
+    ]
+    assert [(d["answered"], d["total_score"]) for d in stats["recent_days"]] == [(3, 17)]
+
+    async def rollup():
+        async with db.get_session() as session:
+            rows = await session.scalars(select(UserStatsRollup).order_by(UserStatsRollup.category))
+            return [(r.category, r.level, r.day, r.answered, r.total_score) for r in rows]
+
+    # пересборка из answers даёт те же строки и повторяется без задвоения
+    incremental = await rollup()
+    assert await db.rebuild_user_stats() == 2
+    assert await db.rebuild_user_stats(batch_size=1) == 2
+    assert await rollup() == incremental
+
+    async with db.get_session() as session:
+        await session.execute(update(AnswerORM).where(AnswerORM.score == 3).values(created_at=datetime(2026, 1, 5, 10)))
+        await session.commit()
+    await db.rebuild_user_stats()
+    assert [r[2] for r in await rollup()] == [incremental[0][2], date(2026, 1, 5)]